@@ -114,18 +114,19 @@ export default function Relatorios() {
         })
       })
       
+      if (response.ok && formato === 'csv') {
+        // O servidor já envia o CSV pronto (em streaming)
+        const csvContent = await response.blob()
+        downloadFile(csvContent, `relatorio_denuncias_${new Date().toISOString().split('T')[0]}.csv`, 'text/csv')
+        return
+      }
+      
       const data = await response.json()
       
       if (response.ok) {
-        if (formato === 'csv') {
-          // Converter para CSV e fazer download
-          const csvContent = convertToCSV(data.dados)
-          downloadFile(csvContent, `relatorio_denuncias_${new Date().toISOString().split('T')[0]}.csv`, 'text/csv')
-        } else {
-          // JSON
-          const jsonContent = JSON.stringify(data, null, 2)
-          downloadFile(jsonContent, `relatorio_denuncias_${new Date().toISOString().split('T')[0]}.json`, 'application/json')
-        }
+        // JSON
+        const jsonContent = JSON.stringify(data, null, 2)
+        downloadFile(jsonContent, `relatorio_denuncias_${new Date().toISOString().split('T')[0]}.json`, 'application/json')
       } else {
         setError(data.error || 'Erro ao exportar relatório')
       }
@@ -136,23 +137,6 @@ export default function Relatorios() {
     }
   }
 
-  const convertToCSV = (data) => {
-    if (!data || data.length === 0) return ''
-    
-    const headers = Object.keys(data[0])
-    const csvHeaders = headers.join(',')
-    
-    const csvRows = data.map(row => 
-      headers.map(header => {
-        const value = row[header] || ''
-        // Escapar aspas e vírgulas
-        return `"${value.toString().replace(/"/g, '""')}"`
-      }).join(',')
-    )
-    
-    return [csvHeaders, ...csvRows].join('\n')
-  }
-
   const downloadFile = (content, filename, contentType) => {
     const blob = new Blob([content], { type: contentType })
     const url = window.URL.createObjectURL(blob)
@@ -1,8 +1,10 @@
 from flask import Blueprint, request, jsonify, session
-from werkzeug.security import check_password_hash
 from datetime import datetime
 from src.database import db
 from src.models.usuario import Usuario
+from src.sessao import get_current_user as obter_usuario_atual, invalidar_usuario
+from src.condicional import gerar_etag, resposta_condicional
+from src.senhas import PoolSenhasSaturado
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -30,9 +32,14 @@ def login():
         if not usuario.check_senha(senha):
             return jsonify({'error': 'Credenciais inválidas'}), 401
         
+        # Atualizar hash gerado com parâmetros antigos (senha já verificada)
+        if usuario.senha_precisa_rehash():
+            usuario.set_senha(senha)
+        
         # Atualizar último login
         usuario.ultimo_login = datetime.utcnow()
         db.session.commit()
+        invalidar_usuario(usuario.id)
         
         # Criar sessão
         session['user_id'] = usuario.id
@@ -44,7 +51,13 @@ def login():
             'usuario': usuario.to_dict()
         }), 200
         
+    except PoolSenhasSaturado:
+        db.session.rollback()
+        resposta = jsonify({'error': 'Serviço de autenticação ocupado, tente novamente'})
+        resposta.headers['Retry-After'] = '1'
+        return resposta, 503
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': f'Erro interno: {str(e)}'}), 500
 
 @auth_bp.route('/logout', methods=['POST'])
@@ -63,15 +76,18 @@ def get_current_user():
         if 'user_id' not in session:
             return jsonify({'error': 'Usuário não autenticado'}), 401
         
-        usuario = Usuario.query.get(session['user_id'])
+        usuario = obter_usuario_atual()
         
         if not usuario or not usuario.ativo:
             session.clear()
             return jsonify({'error': 'Usuário não encontrado ou inativo'}), 401
         
-        return jsonify({
-            'usuario': usuario.to_dict()
-        }), 200
+        # Qualquer alteração do usuário (inclusive o login) atualiza data_atualizacao
+        return resposta_condicional(
+            gerar_etag('me', usuario.id, usuario.data_atualizacao),
+            lambda: (jsonify({'usuario': usuario.to_dict()}), 200),
+            ultima_modificacao=usuario.data_atualizacao
+        )
         
     except Exception as e:
         return jsonify({'error': f'Erro interno: {str(e)}'}), 500
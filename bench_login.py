@@ -0,0 +1,80 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from concurrent.futures import ThreadPoolExecutor
+import statistics
+import time
+import uuid
+
+from src.main import create_app
+from src.database import db
+from src.models.usuario import Usuario
+
+app = create_app()
+
+def percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p))] * 1000
+
+def fazer_login(email, senha):
+    cliente = app.test_client()
+    inicio = time.perf_counter()
+    resposta = cliente.post('/api/auth/login', json={'email': email, 'senha': senha})
+    return resposta.status_code, time.perf_counter() - inicio
+
+def checar_sessao():
+    cliente = app.test_client()
+    inicio = time.perf_counter()
+    cliente.get('/api/auth/check-session')
+    return time.perf_counter() - inicio
+
+def bench_login(total=200, concorrencia=16):
+    """Medir vazão de logins e a latência de outra rota durante o pico"""
+    email = f"bench-{uuid.uuid4().hex[:8]}@morpheus.local"
+    senha = uuid.uuid4().hex
+    
+    with app.app_context():
+        usuario = Usuario(email=email, nome='Benchmark de login', perfil='cliente')
+        usuario.set_senha(senha)
+        db.session.add(usuario)
+        db.session.commit()
+        usuario_id = usuario.id
+    
+    try:
+        with ThreadPoolExecutor(max_workers=concorrencia + 1) as executor:
+            inicio = time.perf_counter()
+            logins = [executor.submit(fazer_login, email, senha) for _ in range(total)]
+            
+            # Rota barata disparada durante o pico de logins
+            checagens = []
+            while not all(f.done() for f in logins):
+                checagens.append(checar_sessao())
+                time.sleep(0.01)
+            
+            resultados = [f.result() for f in logins]
+            duracao = time.perf_counter() - inicio
+    finally:
+        with app.app_context():
+            Usuario.query.filter_by(id=usuario_id).delete()
+            db.session.commit()
+    
+    status = {}
+    for codigo, _ in resultados:
+        status[codigo] = status.get(codigo, 0) + 1
+    latencias = [latencia for codigo, latencia in resultados if codigo == 200]
+    
+    print(f"Logins: {total} com concorrência {concorrencia} em {duracao:.2f}s "
+          f"({status.get(200, 0) / duracao:.1f} logins/s)")
+    print(f"Status: {dict(sorted(status.items()))}")
+    if latencias:
+        print(f"Latência do login (ms): p50={percentil(latencias, 0.5):.1f} "
+              f"p95={percentil(latencias, 0.95):.1f} média={statistics.mean(latencias) * 1000:.1f}")
+    if checagens:
+        print(f"Latência de /api/auth/check-session durante o pico (ms): "
+              f"p50={percentil(checagens, 0.5):.1f} p95={percentil(checagens, 0.95):.1f}")
+
+if __name__ == "__main__":
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    concorrencia = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    bench_login(total, concorrencia)
@@ -0,0 +1,125 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import multiprocessing
+import shutil
+import statistics
+import tempfile
+import time
+
+from src.main import create_app
+from src.database import db
+from src.migracoes import aplicar_migracoes
+
+def percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p))] * 1000
+
+def criar_app(arquivo, otimizado):
+    return create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{arquivo}',
+        'SQLITE_OTIMIZADO': otimizado,
+        'PROTOCOLO_CHAVE': 'bench'
+    }, rotas=False)
+
+def escritor(arquivo, otimizado, duracao, resultados):
+    """Mesma sequência de criar_denuncia: leitura da empresa, inserts e contadores"""
+    from src.models.empresa import Empresa
+    from src.models.denuncia import Denuncia, HistoricoDenuncia, ContadorDenuncias, ResumoDiarioDenuncias
+    from src.models.versao import VersaoDados, chave_denuncias_empresa
+
+    app = criar_app(arquivo, otimizado)
+    latencias, erros = [], 0
+    with app.app_context():
+        fim = time.monotonic() + duracao
+        while time.monotonic() < fim:
+            inicio = time.perf_counter()
+            try:
+                empresa = Empresa.query.first()
+                denuncia = Denuncia(
+                    titulo='Benchmark', descricao='Carga concorrente', categoria='Outros',
+                    empresa_id=empresa.id, anonima=True
+                )
+                db.session.add(denuncia)
+                db.session.flush()
+                db.session.add(HistoricoDenuncia(denuncia_id=denuncia.id, acao='criada', status_novo='recebida'))
+                ContadorDenuncias.ajustar(empresa.id, 'recebida', 'Outros', 'media', 1)
+                ResumoDiarioDenuncias.ajustar([denuncia])
+                VersaoDados.incrementar(chave_denuncias_empresa(empresa.id))
+                db.session.commit()
+                latencias.append(time.perf_counter() - inicio)
+            except Exception:
+                db.session.rollback()
+                erros += 1
+    resultados.put(('escrita', latencias, erros))
+
+def leitor(arquivo, otimizado, duracao, resultados):
+    """Listagem paginada da empresa enquanto as escritas acontecem"""
+    from src.models.denuncia import Denuncia
+
+    app = criar_app(arquivo, otimizado)
+    latencias, erros = [], 0
+    with app.app_context():
+        fim = time.monotonic() + duracao
+        while time.monotonic() < fim:
+            inicio = time.perf_counter()
+            try:
+                Denuncia.query.filter_by(empresa_id=1).order_by(Denuncia.data_criacao.desc()).limit(20).all()
+                db.session.rollback()
+                latencias.append(time.perf_counter() - inicio)
+            except Exception:
+                db.session.rollback()
+                erros += 1
+    resultados.put(('leitura', latencias, erros))
+
+def executar(otimizado, escritores, leitores, duracao):
+    pasta = tempfile.mkdtemp()
+    arquivo = os.path.join(pasta, 'bench.db')
+    try:
+        app = criar_app(arquivo, otimizado)
+        with app.app_context():
+            from src.models.empresa import Empresa
+            aplicar_migracoes(db.engine)
+            db.session.add(Empresa(nome='Benchmark', cnpj='00.000.000/0001-00'))
+            db.session.commit()
+            db.engine.dispose()
+
+        contexto = multiprocessing.get_context('spawn')
+        resultados = contexto.Queue()
+        processos = [
+            contexto.Process(target=escritor, args=(arquivo, otimizado, duracao, resultados))
+            for _ in range(escritores)
+        ] + [
+            contexto.Process(target=leitor, args=(arquivo, otimizado, duracao, resultados))
+            for _ in range(leitores)
+        ]
+        for processo in processos:
+            processo.start()
+        medidas = [resultados.get() for _ in processos]
+        for processo in processos:
+            processo.join()
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+
+    print(f"Perfil {'otimizado (WAL + BEGIN IMMEDIATE)' if otimizado else 'padrão do SQLite'}:")
+    for tipo in ('escrita', 'leitura'):
+        latencias = [l for t, valores, _ in medidas if t == tipo for l in valores]
+        erros = sum(e for t, _, e in medidas if t == tipo)
+        if not latencias:
+            print(f"  {tipo}: nenhuma operação concluída, {erros} erro(s)")
+            continue
+        print(f"  {tipo}: {len(latencias) / duracao:.0f} ops/s, {erros} erro(s), "
+              f"p50={percentil(latencias, 0.5):.1f}ms p95={percentil(latencias, 0.95):.1f}ms "
+              f"máx={max(latencias) * 1000:.0f}ms média={statistics.mean(latencias) * 1000:.1f}ms")
+
+def bench_sqlite(escritores=3, leitores=3, duracao=10):
+    """Comparar o perfil padrão com o otimizado sob escritas e leituras concorrentes"""
+    executar(False, escritores, leitores, duracao)
+    executar(True, escritores, leitores, duracao)
+
+if __name__ == "__main__":
+    escritores = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    leitores = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    duracao = float(sys.argv[3]) if len(sys.argv) > 3 else 10
+    bench_sqlite(escritores, leitores, duracao)
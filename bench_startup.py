@@ -0,0 +1,52 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import json
+import statistics
+import subprocess
+
+# Código executado em um interpretador novo, como um worker do gunicorn sem --preload
+WORKER = """
+import json, sys, time
+inicio = time.perf_counter()
+sys.path.insert(0, %(raiz)r)
+from src.main import create_app
+importado = time.perf_counter()
+app = create_app()
+criado = time.perf_counter()
+resposta = app.test_client().get('/api/auth/check-session')
+fim = time.perf_counter()
+print(json.dumps({
+    'status': resposta.status_code,
+    'importacao': importado - inicio,
+    'create_app': criado - importado,
+    'primeira_requisicao': fim - criado,
+    'total': fim - inicio
+}))
+"""
+
+def medir_worker():
+    raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    saida = subprocess.run(
+        [sys.executable, '-c', WORKER % {'raiz': raiz}],
+        check=True, capture_output=True, text=True
+    )
+    return json.loads(saida.stdout.strip().splitlines()[-1])
+
+def bench_startup(workers=5):
+    """Medir o tempo da importação até a primeira resposta em interpretadores novos"""
+    medidas = [medir_worker() for _ in range(workers)]
+
+    for i, medida in enumerate(medidas, 1):
+        print(f"Worker {i}: importação={medida['importacao'] * 1000:.0f}ms "
+              f"create_app={medida['create_app'] * 1000:.0f}ms "
+              f"primeira requisição={medida['primeira_requisicao'] * 1000:.0f}ms "
+              f"total={medida['total'] * 1000:.0f}ms (status {medida['status']})")
+
+    for etapa in ('importacao', 'create_app', 'primeira_requisicao', 'total'):
+        valores = [medida[etapa] * 1000 for medida in medidas]
+        print(f"{etapa}: mediana={statistics.median(valores):.0f}ms máx={max(valores):.0f}ms")
+
+if __name__ == "__main__":
+    bench_startup(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,113 @@
+from sqlalchemy import event, func, literal_column, table, column, text
+from src.database import db
+from src.models.denuncia import Denuncia
+import html
+import re
+
+# Marcadores temporários dos trechos destacados (trocados por <mark> após escapar o HTML)
+INICIO_DESTAQUE = '⟦'
+FIM_DESTAQUE = '⟧'
+
+# Índice FTS5 externo sobre denuncias, sincronizado por triggers
+DDL_SQLITE = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS denuncias_fts USING fts5(
+        titulo, descricao,
+        content='denuncias', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS denuncias_fts_ai AFTER INSERT ON denuncias BEGIN
+        INSERT INTO denuncias_fts(rowid, titulo, descricao) VALUES (new.id, new.titulo, new.descricao);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS denuncias_fts_ad AFTER DELETE ON denuncias BEGIN
+        INSERT INTO denuncias_fts(denuncias_fts, rowid, titulo, descricao) VALUES ('delete', old.id, old.titulo, old.descricao);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS denuncias_fts_au AFTER UPDATE OF titulo, descricao ON denuncias BEGIN
+        INSERT INTO denuncias_fts(denuncias_fts, rowid, titulo, descricao) VALUES ('delete', old.id, old.titulo, old.descricao);
+        INSERT INTO denuncias_fts(rowid, titulo, descricao) VALUES (new.id, new.titulo, new.descricao);
+    END""",
+]
+
+# Coluna tsvector gerada (sempre sincronizada pelo próprio PostgreSQL) com índice GIN
+DDL_POSTGRESQL = [
+    """ALTER TABLE denuncias ADD COLUMN IF NOT EXISTS busca tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('portuguese', coalesce(titulo, '')), 'A') ||
+        setweight(to_tsvector('portuguese', coalesce(descricao, '')), 'B')
+    ) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_denuncias_busca ON denuncias USING GIN (busca)",
+]
+
+def instalar_indice_busca(conexao, recriar=False):
+    """Criar o índice de busca textual (idempotente)"""
+    dialeto = conexao.dialect.name
+    
+    if dialeto == 'postgresql':
+        for ddl in DDL_POSTGRESQL:
+            conexao.exec_driver_sql(ddl)
+    elif dialeto == 'sqlite':
+        if recriar:
+            conexao.exec_driver_sql("DROP TABLE IF EXISTS denuncias_fts")
+        existia = conexao.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'denuncias_fts'"
+        ).first() is not None
+        
+        for ddl in DDL_SQLITE:
+            conexao.exec_driver_sql(ddl)
+        
+        # Indexar denúncias que já existiam antes do índice
+        if not existia:
+            conexao.exec_driver_sql("INSERT INTO denuncias_fts(denuncias_fts) VALUES ('rebuild')")
+
+@event.listens_for(Denuncia.__table__, 'after_create')
+def criar_indice_busca(target, connection, **kw):
+    """Instalar o índice junto com a tabela de denúncias"""
+    instalar_indice_busca(connection, recriar=True)
+
+def termos_fts5(termo):
+    """Converter o texto digitado em consulta FTS5 segura (todas as palavras, com prefixo)"""
+    palavras = re.findall(r'\w+', termo, flags=re.UNICODE)
+    return ' '.join(f'"{palavra}"*' for palavra in palavras)
+
+def destacar(trecho):
+    """Escapar o trecho e converter os marcadores em <mark>"""
+    if trecho is None:
+        return None
+    return html.escape(trecho).replace(INICIO_DESTAQUE, '<mark>').replace(FIM_DESTAQUE, '</mark>')
+
+def consulta_busca(termo):
+    """Montar a consulta ranqueada de denúncias com trechos destacados
+
+    Retorna None se o termo não tiver palavras pesquisáveis. A consulta
+    devolve (Denuncia, relevancia, trecho_titulo, trecho_descricao) e pode
+    receber os mesmos filtros de escopo de listar_denuncias.
+    """
+    if db.session.get_bind().dialect.name == 'postgresql':
+        consulta = func.websearch_to_tsquery('portuguese', termo)
+        vetor = literal_column('denuncias.busca')
+        opcoes = f'StartSel={INICIO_DESTAQUE}, StopSel={FIM_DESTAQUE}'
+        relevancia = func.ts_rank_cd(vetor, consulta)
+        
+        return db.session.query(
+            Denuncia,
+            relevancia.label('relevancia'),
+            func.ts_headline('portuguese', Denuncia.titulo, consulta, opcoes + ', HighlightAll=true'),
+            func.ts_headline('portuguese', Denuncia.descricao, consulta, opcoes + ', MaxWords=35, MinWords=15')
+        ).filter(vetor.op('@@')(consulta)).order_by(relevancia.desc(), Denuncia.id.desc())
+    
+    expressao = termos_fts5(termo)
+    if not expressao:
+        return None
+    
+    fts = table('denuncias_fts', column('rowid'))
+    # bm25 retorna valores menores para documentos mais relevantes; título pesa mais
+    bm25 = func.bm25(literal_column('denuncias_fts'), 10.0, 1.0)
+    
+    return db.session.query(
+        Denuncia,
+        (-bm25).label('relevancia'),
+        func.snippet(literal_column('denuncias_fts'), 0, INICIO_DESTAQUE, FIM_DESTAQUE, '…', 16),
+        func.snippet(literal_column('denuncias_fts'), 1, INICIO_DESTAQUE, FIM_DESTAQUE, '…', 32)
+    ).join(
+        fts, fts.c.rowid == Denuncia.id
+    ).filter(
+        text('denuncias_fts MATCH :expressao').bindparams(expressao=expressao)
+    ).order_by(bm25, Denuncia.id.desc())
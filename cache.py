@@ -0,0 +1,83 @@
+from collections import OrderedDict
+from threading import Lock
+import time
+
+class CacheLRU:
+    """Cache LRU em memória, por processo, com expiração (TTL) dos itens
+
+    O limite é por quantidade de itens e, opcionalmente, pela soma dos
+    tamanhos informados em guardar (max_bytes).
+    """
+    
+    def __init__(self, max_itens=1024, ttl=60, max_bytes=None):
+        self.max_itens = max_itens
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._itens = OrderedDict()
+        self._bytes = 0
+        self._lock = Lock()
+        self.acertos = 0
+        self.faltas = 0
+        self.descartes = 0
+    
+    def obter(self, chave):
+        """Obter o valor em cache, ou None se ausente/expirado"""
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                self.faltas += 1
+                return None
+            
+            expira_em, valor, tamanho = item
+            if expira_em < time.monotonic():
+                del self._itens[chave]
+                self._bytes -= tamanho
+                self.faltas += 1
+                return None
+            
+            self._itens.move_to_end(chave)
+            self.acertos += 1
+            return valor
+    
+    def guardar(self, chave, valor, tamanho=0):
+        """Guardar um valor, descartando os menos usados acima do limite"""
+        with self._lock:
+            anterior = self._itens.pop(chave, None)
+            if anterior is not None:
+                self._bytes -= anterior[2]
+            self._itens[chave] = (time.monotonic() + self.ttl, valor, tamanho)
+            self._bytes += tamanho
+            while len(self._itens) > self.max_itens or (
+                self.max_bytes is not None and self._bytes > self.max_bytes and len(self._itens) > 1
+            ):
+                _, (_, _, tamanho_descartado) = self._itens.popitem(last=False)
+                self._bytes -= tamanho_descartado
+                self.descartes += 1
+    
+    def invalidar(self, chave):
+        """Remover um item do cache"""
+        with self._lock:
+            item = self._itens.pop(chave, None)
+            if item is not None:
+                self._bytes -= item[2]
+    
+    def limpar(self):
+        """Remover todos os itens do cache"""
+        with self._lock:
+            self._itens.clear()
+            self._bytes = 0
+    
+    def metricas(self):
+        """Ocupação e contadores de acertos, faltas e descartes por LRU"""
+        with self._lock:
+            consultas = self.acertos + self.faltas
+            return {
+                'itens': len(self._itens),
+                'max_itens': self.max_itens,
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'acertos': self.acertos,
+                'faltas': self.faltas,
+                'taxa_acerto': round(self.acertos / consultas, 4) if consultas else None,
+                'descartes': self.descartes,
+            }
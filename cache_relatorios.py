@@ -0,0 +1,54 @@
+from flask import Response, current_app
+from src.cache import CacheLRU
+from src.escopo import PERFIS_EMPRESA, AcessoNegado
+from src.models.versao import PREFIXO_VERSAO_DENUNCIAS, VersaoDados, chave_denuncias_empresa
+
+# Corpos JSON dos relatórios por (tipo, escopo, versão dos dados, parâmetros)
+cache_relatorios = CacheLRU(max_itens=256, ttl=600, max_bytes=32 * 1024 * 1024)
+
+def init_app(app):
+    """Limites do cache de relatórios deste worker"""
+    cache_relatorios.max_itens = app.config.get('RELATORIOS_CACHE_MAX_ITENS', 256)
+    cache_relatorios.max_bytes = app.config.get('RELATORIOS_CACHE_MAX_BYTES', 32 * 1024 * 1024)
+    cache_relatorios.ttl = app.config.get('RELATORIOS_CACHE_TTL', 600)
+
+def escopo_relatorio(usuario, empresa_id=None):
+    """Escopo de dados visível ao usuário e a versão atual desses dados
+
+    Usuários com o mesmo escopo compartilham as entradas do cache. A versão
+    muda a cada escrita nas denúncias (ou categorias) da empresa, e a soma
+    das versões de todas as empresas muda com qualquer escrita.
+    """
+    if usuario.perfil == 'super_admin':
+        if empresa_id:
+            try:
+                empresa_id = int(empresa_id)
+            except (TypeError, ValueError):
+                raise ValueError('empresa_id inválido')
+            return ('empresa', empresa_id), VersaoDados.obter(chave_denuncias_empresa(empresa_id))
+        return ('todas',), VersaoDados.somar(PREFIXO_VERSAO_DENUNCIAS)
+
+    if usuario.perfil in PERFIS_EMPRESA:
+        escopo = ('empresa', usuario.empresa_id)
+    elif usuario.perfil == 'cliente':
+        # Cliente vê apenas as próprias denúncias
+        escopo = ('cliente', usuario.id)
+    else:
+        raise AcessoNegado()
+    return escopo, VersaoDados.obter(chave_denuncias_empresa(usuario.empresa_id))
+
+def normalizar_parametros(parametros, aceitos):
+    """Apenas os parâmetros aceitos e preenchidos, em ordem fixa"""
+    return tuple(
+        (nome, parametros.get(nome)) for nome in sorted(aceitos)
+        if parametros.get(nome) not in (None, '')
+    )
+
+def relatorio_em_cache(tipo, escopo, versao, parametros, montar):
+    """Resposta JSON do relatório, chamando montar() apenas na falta do cache"""
+    chave = (tipo, escopo, versao, parametros)
+    corpo = cache_relatorios.obter(chave)
+    if corpo is None:
+        corpo = current_app.json.dumps(montar())
+        cache_relatorios.guardar(chave, corpo, tamanho=len(corpo))
+    return Response(corpo, mimetype='application/json')
@@ -0,0 +1,71 @@
+from flask import Response, current_app
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+from src.database import db
+from src.models.denuncia import CategoriasDenuncia
+from src.models.empresa import Empresa
+from src.models.versao import VersaoDados, chave_denuncias_empresa
+from src.condicional import resposta_condicional
+from threading import Lock
+import hashlib
+
+# Chave do contador de versão da árvore de categorias
+VERSAO_CATEGORIAS = 'categorias'
+
+# Árvores serializadas por worker: apenas_ativas -> (versao, corpo, etag)
+_arvores = {}
+_lock = Lock()
+
+def montar_arvore(apenas_ativas):
+    """Carregar categorias e subcategorias em duas consultas"""
+    query = CategoriasDenuncia.query.options(selectinload(CategoriasDenuncia.subcategorias))
+    if apenas_ativas:
+        query = query.filter_by(ativa=True)
+    
+    resultado = []
+    for categoria in query.order_by(CategoriasDenuncia.ordem).all():
+        categoria_dict = categoria.to_dict()
+        categoria_dict['subcategorias'] = [
+            sub.to_dict() for sub in categoria.subcategorias
+            if sub.ativa or not apenas_ativas
+        ]
+        resultado.append(categoria_dict)
+    return resultado
+
+def obter_arvore(apenas_ativas):
+    """Obter a árvore serializada e seu ETag, reconstruindo só quando a versão muda"""
+    versao = VersaoDados.obter(VERSAO_CATEGORIAS)
+    
+    with _lock:
+        em_cache = _arvores.get(apenas_ativas)
+    if em_cache and em_cache[0] == versao:
+        return em_cache[1], em_cache[2]
+    
+    corpo = current_app.json.dumps({'categorias': montar_arvore(apenas_ativas)})
+    etag = hashlib.sha1(corpo.encode('utf-8')).hexdigest()
+    
+    with _lock:
+        _arvores[apenas_ativas] = (versao, corpo, etag)
+    return corpo, etag
+
+def resposta_arvore(apenas_ativas, privada=False):
+    """Responder com a árvore de categorias, ou 304 se o cliente já tem esta versão"""
+    corpo, etag = obter_arvore(apenas_ativas)
+    return resposta_condicional(
+        etag,
+        lambda: Response(corpo, mimetype='application/json'),
+        privada=privada
+    )
+
+def invalidar_categorias(empresa_id=None):
+    """Marcar a árvore como alterada (chamar antes do commit da escrita)
+
+    Também invalida os relatórios em cache: os da empresa dona da
+    categoria, ou os de todas as empresas para uma categoria global.
+    """
+    VersaoDados.incrementar(VERSAO_CATEGORIAS)
+    if empresa_id:
+        VersaoDados.incrementar(chave_denuncias_empresa(empresa_id))
+    else:
+        for id_empresa in db.session.scalars(select(Empresa.id)):
+            VersaoDados.incrementar(chave_denuncias_empresa(id_empresa))
@@ -0,0 +1,40 @@
+from flask import make_response, request
+from datetime import timezone
+import hashlib
+
+def gerar_etag(*partes):
+    """ETag a partir dos valores que identificam a versão de uma resposta"""
+    return hashlib.sha1(repr(partes).encode('utf-8')).hexdigest()
+
+def resposta_condicional(etag, montar, ultima_modificacao=None, privada=True):
+    """Responder 304 se o cliente já tem esta versão; senão montar a resposta
+
+    montar só é chamada quando o corpo precisa ser enviado e devolve o mesmo
+    que uma view. ultima_modificacao (datetime UTC sem fuso) gera o
+    Last-Modified, usado quando o cliente não envia If-None-Match.
+    Respostas de erro de montar são devolvidas sem validadores.
+    """
+    if ultima_modificacao is not None:
+        ultima_modificacao = ultima_modificacao.replace(tzinfo=timezone.utc, microsecond=0)
+
+    if request.if_none_match:
+        nao_modificado = request.if_none_match.contains(etag)
+    else:
+        nao_modificado = (
+            ultima_modificacao is not None
+            and request.if_modified_since is not None
+            and ultima_modificacao <= request.if_modified_since
+        )
+
+    if nao_modificado:
+        resposta = make_response('', 304)
+    else:
+        resposta = make_response(montar())
+        if resposta.status_code != 200:
+            return resposta
+
+    resposta.set_etag(etag)
+    if ultima_modificacao is not None:
+        resposta.last_modified = ultima_modificacao
+    resposta.headers['Cache-Control'] = 'private, no-cache' if privada else 'public, no-cache'
+    return resposta
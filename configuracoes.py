@@ -1,5 +1,7 @@
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, request, jsonify
 from src.database import db
+from src.sessao import require_auth, get_current_user
+from src.categorias import resposta_arvore, invalidar_categorias
 from src.models.usuario import Usuario
 from src.models.empresa import Empresa
 from src.models.denuncia import CategoriasDenuncia, SubcategoriasDenuncia
@@ -8,18 +10,6 @@ import json
 
 configuracoes_bp = Blueprint('configuracoes', __name__)
 
-def require_auth():
-    """Decorator para verificar autenticação"""
-    if 'user_id' not in session:
-        return jsonify({'error': 'Usuário não autenticado'}), 401
-    return None
-
-def get_current_user():
-    """Obter usuário atual da sessão"""
-    if 'user_id' not in session:
-        return None
-    return Usuario.query.get(session['user_id'])
-
 def require_admin():
     """Verificar se o usuário é admin"""
     usuario = get_current_user()
@@ -128,19 +118,7 @@ def obter_configuracoes_categorias():
         return auth_error
     
     try:
-        categorias = CategoriasDenuncia.query.order_by(CategoriasDenuncia.ordem).all()
-        
-        resultado = []
-        for categoria in categorias:
-            subcategorias = SubcategoriasDenuncia.query.filter_by(
-                categoria_id=categoria.id
-            ).order_by(SubcategoriasDenuncia.ordem).all()
-            
-            categoria_dict = categoria.to_dict()
-            categoria_dict['subcategorias'] = [sub.to_dict() for sub in subcategorias]
-            resultado.append(categoria_dict)
-        
-        return jsonify({'categorias': resultado}), 200
+        return resposta_arvore(apenas_ativas=False, privada=True)
         
     except Exception as e:
         return jsonify({'error': f'Erro interno: {str(e)}'}), 500
@@ -178,6 +156,7 @@ def criar_categoria():
         )
         
         db.session.add(nova_categoria)
+        invalidar_categorias(nova_categoria.empresa_id)
         db.session.commit()
         
         return jsonify({
@@ -226,6 +205,7 @@ def atualizar_categoria(categoria_id):
         if 'ordem' in data:
             categoria.ordem = data['ordem']
         
+        invalidar_categorias(categoria.empresa_id)
         db.session.commit()
         
         return jsonify({
@@ -281,6 +261,7 @@ def criar_subcategoria():
         )
         
         db.session.add(nova_subcategoria)
+        invalidar_categorias(categoria.empresa_id)
         db.session.commit()
         
         return jsonify({
@@ -330,6 +311,7 @@ def atualizar_subcategoria(subcategoria_id):
         if 'ordem' in data:
             subcategoria.ordem = data['ordem']
         
+        invalidar_categorias(subcategoria.categoria.empresa_id)
         db.session.commit()
         
         return jsonify({
@@ -2,15 +2,28 @@ import os
 import sys
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from src.main import app
+from src.main import create_app
 from src.database import db
+from src.migracoes import MIGRACOES, aplicar_migracoes, migracoes_pendentes
 
-def create_database():
-    """Criar todas as tabelas do banco de dados"""
+def create_database(apenas_status=False):
+    """Criar/atualizar o banco aplicando as migrações pendentes"""
+    # Migrações podem reconstruir tabelas e índices: sem timeout por comando
+    app = create_app({'DB_STATEMENT_TIMEOUT': 0}, rotas=False)
     with app.app_context():
-        db.create_all()
+        pendentes = migracoes_pendentes(db.engine)
+        if apenas_status:
+            print(f"{len(MIGRACOES) - len(pendentes)} migração(ões) aplicada(s), {len(pendentes)} pendente(s).")
+            for versao, descricao, _ in pendentes:
+                print(f"  pendente {versao}: {descricao}")
+            return 1 if pendentes else 0
+        
+        aplicadas = aplicar_migracoes(db.engine)
+        for versao in aplicadas:
+            print(f"Migração {versao} aplicada.")
+        
         print("Banco de dados criado com sucesso!")
+        return 0
 
 if __name__ == "__main__":
-    create_database()
-
+    sys.exit(create_database(apenas_status='--status' in sys.argv))
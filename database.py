@@ -1,4 +1,160 @@
+from flask import g, has_app_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
+import os
 
-db = SQLAlchemy()
+# Bind da réplica de leitura (DATABASE_REPLICA_URL)
+BIND_REPLICA = 'replica'
 
+class SessaoRoteada(Session):
+    """Sessão que envia os SELECTs para a réplica nos contextos roteados para ela
+
+    Flush, escritas e qualquer comando que não seja SELECT vão sempre para o
+    primário. O roteamento é decidido por replica.usar_replica (rotas com
+    leitura_replica e tarefas de relatório).
+    """
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing and has_app_context()
+                and g.get('banco_leitura') == BIND_REPLICA
+                and getattr(clause, 'is_select', False)):
+            return self._db.engines[BIND_REPLICA]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+db = SQLAlchemy(session_options={'class_': SessaoRoteada})
+
+def insert_com_conflito():
+    """Construtor de INSERT com suporte a ON CONFLICT para o banco em uso"""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+def configurar_sqlite(engine, config):
+    """PRAGMAs de concorrência e caminho único de escrita para um engine SQLite
+
+    WAL permite leituras durante uma escrita. O driver abre a transação no
+    primeiro comando de escrita com BEGIN IMMEDIATE: o lock de escrita é
+    reservado logo no início, e os escritores de todos os workers esperam em
+    fila (busy_timeout) em vez de falhar com "database is locked" ao
+    promover uma leitura para escrita no meio da transação.
+    """
+    pragmas = [
+        "PRAGMA journal_mode=WAL",
+        f"PRAGMA synchronous={config.get('SQLITE_SYNCHRONOUS', 'NORMAL')}",
+        f"PRAGMA busy_timeout={int(config.get('SQLITE_BUSY_TIMEOUT', 5000))}",
+        f"PRAGMA mmap_size={int(config.get('SQLITE_MMAP_SIZE', 268435456))}",
+        f"PRAGMA cache_size={int(config.get('SQLITE_CACHE_SIZE', -65536))}",
+    ]
+
+    @event.listens_for(engine, 'connect')
+    def ao_conectar(conexao_dbapi, _):
+        cursor = conexao_dbapi.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+        conexao_dbapi.isolation_level = 'IMMEDIATE'
+
+
+def opcoes_engine(config, url=None):
+    """Opções de criação do engine conforme o banco configurado
+
+    No PostgreSQL cada worker do gunicorn tem seu próprio pool: o total de
+    conexões é workers x (DB_POOL_SIZE + DB_MAX_OVERFLOW) e precisa caber em
+    max_connections (ver relatorio_pool).
+    """
+    if make_url(url or config['SQLALCHEMY_DATABASE_URI']).get_backend_name() != 'postgresql':
+        return {}
+    return {
+        'pool_size': int(config.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(config.get('DB_MAX_OVERFLOW', 5)),
+        'pool_timeout': float(config.get('DB_POOL_TIMEOUT', 10)),
+        'pool_recycle': int(config.get('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': bool(config.get('DB_PRE_PING', True)),
+    }
+
+def configurar_postgres(engine, config):
+    """Identificação e timeout por comando em cada conexão PostgreSQL"""
+    nome = config.get('DB_APPLICATION_NAME', 'morpheus')
+    timeout = int(config.get('DB_STATEMENT_TIMEOUT', 30000))
+
+    @event.listens_for(engine, 'do_connect')
+    def ao_conectar(dialeto, registro, cargs, cparams):
+        # Com o pid, cada worker aparece separado em pg_stat_activity
+        cparams['application_name'] = f'{nome}:{os.getpid()}'
+        cparams['options'] = f'-c statement_timeout={timeout}'
+        cparams.setdefault('connect_timeout', int(config.get('DB_CONNECT_TIMEOUT', 5)))
+
+# Uso observado de cada pool (pico de conexões em uso e total de checkouts)
+USO_POOL = {}
+
+def monitorar_pool(engine):
+    uso = USO_POOL.setdefault(engine, {'pico_em_uso': 0, 'checkouts': 0})
+
+    # Eventos no engine valem também para o pool recriado por dispose()
+    @event.listens_for(engine, 'checkout')
+    def ao_retirar(conexao_dbapi, registro, proxy):
+        uso['checkouts'] += 1
+        em_uso = getattr(engine.pool, 'checkedout', lambda: 0)()
+        uso['pico_em_uso'] = max(uso['pico_em_uso'], em_uso)
+
+def configurar_engines(app):
+    """Aplicar o perfil de cada engine conforme o banco (chamar após db.init_app)"""
+    with app.app_context():
+        for engine in db.engines.values():
+            monitorar_pool(engine)
+            if engine.dialect.name == 'postgresql':
+                configurar_postgres(engine, app.config)
+            elif engine.dialect.name == 'sqlite' and app.config.get('SQLITE_OTIMIZADO', True):
+                configurar_sqlite(engine, app.config)
+
+def relatorio_pool(config):
+    """Uso do pool deste worker e capacidade planejada frente ao limite do servidor"""
+    engine = db.engine
+    pool = engine.pool
+    relatorio = {
+        'banco': engine.dialect.name,
+        'pid': os.getpid(),
+        'pool': {'classe': type(pool).__name__, 'status': pool.status()},
+        'uso': dict(USO_POOL.get(engine, {})),
+    }
+    if hasattr(pool, 'size'):
+        relatorio['pool'].update({
+            'tamanho': pool.size(),
+            'overflow_maximo': pool._max_overflow,
+            'em_uso': pool.checkedout(),
+            'ociosas': pool.checkedin(),
+            'overflow_atual': max(pool.overflow(), 0),
+            'timeout': pool.timeout(),
+        })
+
+    if engine.dialect.name != 'postgresql':
+        return relatorio
+
+    workers = int(config.get('DB_WORKERS', 3))
+    por_worker = pool.size() + pool._max_overflow
+    nome = config.get('DB_APPLICATION_NAME', 'morpheus')
+    with engine.connect() as conexao:
+        limite = int(conexao.execute(text("SHOW max_connections")).scalar())
+        reservadas = int(conexao.execute(text("SHOW superuser_reserved_connections")).scalar())
+        abertas, da_aplicacao = conexao.execute(
+            text("""SELECT COUNT(*), COUNT(*) FILTER (WHERE application_name LIKE :nome)
+                    FROM pg_stat_activity WHERE backend_type = 'client backend'"""),
+            {'nome': f'{nome}:%'}
+        ).one()
+
+    disponiveis = limite - reservadas
+    relatorio['capacidade'] = {
+        'workers': workers,
+        'conexoes_por_worker': por_worker,
+        'conexoes_planejadas': workers * por_worker,
+        'max_connections': limite,
+        'reservadas_superusuario': reservadas,
+        'disponiveis': disponiveis,
+        'folga': disponiveis - workers * por_worker,
+        'abertas_no_servidor': abertas,
+        'abertas_pela_aplicacao': da_aplicacao,
+    }
+    return relatorio
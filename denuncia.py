@@ -1,6 +1,6 @@
-from src.database import db
+from src.database import db, insert_com_conflito
+from src.models.versao import VersaoDados, chave_denuncias_empresa
 from datetime import datetime
-import uuid
 
 class Denuncia(db.Model):
     __tablename__ = 'denuncias'
@@ -33,16 +33,89 @@ class Denuncia(db.Model):
     origem = db.Column(db.String(50), default='web')  # web, email, telefone
     ip_origem = db.Column(db.String(45))  # Para auditoria
     
+    # Índices alinhados às consultas de listagem, estatísticas e relatórios
+    __table_args__ = (
+        db.Index('ix_denuncias_empresa_data', 'empresa_id', 'data_criacao'),
+        # Listagem filtrada por status em ordem de data, sem ordenação temporária
+        db.Index('ix_denuncias_empresa_status_data', 'empresa_id', 'status', 'data_criacao'),
+        db.Index('ix_denuncias_empresa_categoria', 'empresa_id', 'categoria'),
+        db.Index('ix_denuncias_empresa_prioridade', 'empresa_id', 'prioridade'),
+        db.Index('ix_denuncias_usuario_data', 'usuario_id', 'data_criacao'),
+        db.Index('ix_denuncias_data_criacao', 'data_criacao'),
+    )
+    
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         if not self.protocolo:
             self.protocolo = self.gerar_protocolo()
     
-    def gerar_protocolo(self):
-        """Gera um protocolo único para a denúncia"""
-        timestamp = datetime.utcnow().strftime('%Y%m%d')
-        unique_id = str(uuid.uuid4())[:8].upper()
-        return f"DEN{timestamp}{unique_id}"
+    @staticmethod
+    def gerar_protocolo():
+        """Gera um protocolo único para a denúncia (sem consulta ao banco)"""
+        from src.protocolo import gerador_protocolo
+        return gerador_protocolo.gerar()
+    
+    @classmethod
+    def inserir_em_lote(cls, linhas, usuario_id=None, descricao_historico='Denúncia criada'):
+        """Inserir denúncias, históricos, contadores e resumos diários em lote na transação atual
+
+        Cada linha é um dicionário de colunas com protocolo já definido.
+        Retorna {protocolo: id}; os ids são associados pelo protocolo porque
+        o SQLite não garante a ordem do RETURNING em inserções múltiplas.
+        """
+        # Data de criação explícita: o dia do resumo precisa ser o mesmo gravado na denúncia
+        agora = datetime.utcnow()
+        for linha in linhas:
+            linha.setdefault('data_criacao', agora)
+        
+        ids_por_protocolo = dict(
+            (protocolo, denuncia_id)
+            for denuncia_id, protocolo in db.session.execute(
+                db.insert(cls).returning(cls.id, cls.protocolo),
+                linhas
+            )
+        )
+        
+        db.session.execute(db.insert(HistoricoDenuncia), [
+            {
+                'denuncia_id': ids_por_protocolo[linha['protocolo']],
+                'usuario_id': usuario_id,
+                'acao': 'criada',
+                'descricao': descricao_historico.format(**linha),
+                'status_novo': linha.get('status') or 'recebida'
+            }
+            for linha in linhas
+        ])
+        
+        # Um ajuste de contador por combinação, não por denúncia
+        incrementos = {}
+        for linha in linhas:
+            chave = (
+                linha['empresa_id'],
+                linha.get('status') or 'recebida',
+                linha['categoria'],
+                linha.get('prioridade') or 'media'
+            )
+            incrementos[chave] = incrementos.get(chave, 0) + 1
+        for (empresa_id, status, categoria, prioridade), quantidade in incrementos.items():
+            ContadorDenuncias.ajustar(empresa_id, status, categoria, prioridade, quantidade)
+        ResumoDiarioDenuncias.ajustar(linhas)
+        
+        # Uma nova versão por empresa afetada
+        for empresa_id in set(linha['empresa_id'] for linha in linhas):
+            VersaoDados.incrementar(chave_denuncias_empresa(empresa_id))
+        
+        return ids_por_protocolo
+    
+    def to_status_publico(self):
+        """Dados que o denunciante pode consultar pelo protocolo, sem autenticação"""
+        return {
+            'protocolo': self.protocolo,
+            'status': self.status,
+            'data_criacao': self.data_criacao.isoformat() if self.data_criacao else None,
+            'data_atualizacao': self.data_atualizacao.isoformat() if self.data_atualizacao else None,
+            'data_resolucao': self.data_resolucao.isoformat() if self.data_resolucao else None
+        }
     
     def to_dict(self):
         return {
@@ -70,7 +143,7 @@ class HistoricoDenuncia(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     denuncia_id = db.Column(db.Integer, db.ForeignKey('denuncias.id'), nullable=False)
-    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=True)  # Null em denúncias anônimas
     
     acao = db.Column(db.String(100), nullable=False)  # criada, atualizada, status_alterado, etc.
     descricao = db.Column(db.Text)
@@ -79,6 +152,11 @@ class HistoricoDenuncia(db.Model):
     
     data_acao = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     
+    # Histórico é sempre consultado por denúncia, ordenado pela data da ação
+    __table_args__ = (
+        db.Index('ix_historico_denuncias_denuncia_data', 'denuncia_id', 'data_acao'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -91,6 +169,280 @@ class HistoricoDenuncia(db.Model):
             'data_acao': self.data_acao.isoformat() if self.data_acao else None
         }
 
+class SequenciaProtocolo(db.Model):
+    """Sequência diária de protocolos, reservada em blocos por processo"""
+    __tablename__ = 'sequencias_protocolo'
+    
+    dia = db.Column(db.String(8), primary_key=True)  # AAAAMMDD
+    proximo = db.Column(db.Integer, nullable=False, default=0)
+
+class ContadorDenuncias(db.Model):
+    """Contagem de denúncias por empresa, status, categoria e prioridade"""
+    __tablename__ = 'contadores_denuncias'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    empresa_id = db.Column(db.Integer, db.ForeignKey('empresas.id'), nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    categoria = db.Column(db.String(100), nullable=False)
+    prioridade = db.Column(db.String(20), nullable=False)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        db.UniqueConstraint('empresa_id', 'status', 'categoria', 'prioridade', name='_contador_denuncias_uc'),
+    )
+    
+    @classmethod
+    def ajustar(cls, empresa_id, status, categoria, prioridade, delta):
+        """Somar delta ao contador (upsert), na transação da sessão atual"""
+        insert = insert_com_conflito()
+        stmt = insert(cls).values(
+            empresa_id=empresa_id,
+            status=status,
+            categoria=categoria,
+            prioridade=prioridade or '',
+            total=delta
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['empresa_id', 'status', 'categoria', 'prioridade'],
+            set_={'total': cls.total + delta}
+        )
+        db.session.execute(stmt)
+    
+    @classmethod
+    def reconstruir(cls, conexao=None):
+        """Regenerar todos os contadores a partir da tabela de denúncias
+
+        Um único INSERT ... SELECT no banco, na sessão atual ou na conexão
+        informada (migrações).
+        """
+        executar = (conexao or db.session).execute
+        executar(db.delete(cls))
+        
+        grupos = db.select(
+            Denuncia.empresa_id,
+            Denuncia.status,
+            Denuncia.categoria,
+            db.func.coalesce(Denuncia.prioridade, ''),
+            db.func.count(Denuncia.id)
+        ).group_by(
+            Denuncia.empresa_id,
+            Denuncia.status,
+            Denuncia.categoria,
+            Denuncia.prioridade
+        )
+        return executar(db.insert(cls).from_select(
+            ['empresa_id', 'status', 'categoria', 'prioridade', 'total'], grupos
+        )).rowcount
+    
+    @classmethod
+    def divergencias(cls):
+        """Listar chaves cujo contador difere da contagem real"""
+        reais = {
+            (empresa_id, status, categoria, prioridade or ''): total
+            for empresa_id, status, categoria, prioridade, total in db.session.query(
+                Denuncia.empresa_id,
+                Denuncia.status,
+                Denuncia.categoria,
+                Denuncia.prioridade,
+                db.func.count(Denuncia.id)
+            ).group_by(
+                Denuncia.empresa_id,
+                Denuncia.status,
+                Denuncia.categoria,
+                Denuncia.prioridade
+            )
+        }
+        contadores = {
+            (c.empresa_id, c.status, c.categoria, c.prioridade): c.total
+            for c in cls.query.all()
+        }
+        
+        return [
+            {'chave': chave, 'contador': contadores.get(chave, 0), 'real': reais.get(chave, 0)}
+            for chave in sorted(set(reais) | set(contadores), key=str)
+            if contadores.get(chave, 0) != reais.get(chave, 0)
+        ]
+
+def horas_resolucao(dialeto=None):
+    """Expressão SQL com as horas entre criação e resolução da denúncia"""
+    if (dialeto or db.session.get_bind().dialect.name) == 'postgresql':
+        return db.func.extract('epoch', Denuncia.data_resolucao - Denuncia.data_criacao) / 3600.0
+    return (db.func.julianday(Denuncia.data_resolucao) - db.func.julianday(Denuncia.data_criacao)) * 24.0
+
+def dimensao_resumo(valor):
+    """Valor de uma dimensão opcional nos resumos diários: nulo vira ''
+
+    Recebe o valor gravado (ResumoDiarioDenuncias.valores) ou a coluna
+    (ResumoDiarioDenuncias.agrupados, via coalesce): os dois caminhos
+    normalizam da mesma forma.
+    """
+    if valor is None or isinstance(valor, str):
+        return valor or ''
+    return db.func.coalesce(valor, '')
+
+class ResumoDiarioDenuncias(db.Model):
+    """Contagem diária de denúncias por data de criação e dimensões dos relatórios
+
+    Mantida na mesma transação das escritas (criação e mudança de status),
+    com a soma das horas de resolução das concluídas. Valores nulos das
+    dimensões ficam como ''.
+    """
+    __tablename__ = 'resumos_diarios_denuncias'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    dia = db.Column(db.Date, nullable=False)
+    empresa_id = db.Column(db.Integer, db.ForeignKey('empresas.id'), nullable=False)
+    categoria = db.Column(db.String(100), nullable=False)
+    subcategoria = db.Column(db.String(100), nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    prioridade = db.Column(db.String(20), nullable=False)
+    origem = db.Column(db.String(50), nullable=False)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    # Concluídas com data de resolução e a soma das horas até a resolução
+    resolvidas = db.Column(db.Integer, nullable=False, default=0)
+    horas_resolucao = db.Column(db.Float, nullable=False, default=0)
+    
+    __table_args__ = (
+        db.UniqueConstraint(
+            'dia', 'empresa_id', 'categoria', 'subcategoria', 'status', 'prioridade', 'origem',
+            name='_resumo_diario_denuncias_uc'
+        ),
+        db.Index('ix_resumos_diarios_empresa_dia', 'empresa_id', 'dia'),
+        db.Index('ix_resumos_diarios_dia', 'dia'),
+    )
+    
+    DIMENSOES = ('dia', 'empresa_id', 'categoria', 'subcategoria', 'status', 'prioridade', 'origem')
+    METRICAS = ('total', 'resolvidas', 'horas_resolucao')
+    
+    @staticmethod
+    def valor_gravado(denuncia, campo):
+        """Valor da coluna como está (ou ficará) gravado na denúncia
+
+        Em dicionários de inserção em lote, colunas vazias recebem o
+        default do modelo, como na própria inserção.
+        """
+        if not isinstance(denuncia, dict):
+            return getattr(denuncia, campo)
+        valor = denuncia.get(campo)
+        padrao = Denuncia.__table__.c[campo].default
+        if valor is None and padrao is not None and padrao.is_scalar:
+            return padrao.arg
+        return valor
+    
+    @classmethod
+    def valores(cls, denuncia):
+        """Dimensões e métricas de uma denúncia (objeto ou dicionário de colunas)"""
+        obter = lambda campo: cls.valor_gravado(denuncia, campo)
+        data_criacao = obter('data_criacao')
+        status = obter('status')
+        data_resolucao = obter('data_resolucao')
+        resolvida = status == 'concluida' and data_resolucao is not None
+        return {
+            'dia': data_criacao.date(),
+            'empresa_id': obter('empresa_id'),
+            'categoria': obter('categoria'),
+            'subcategoria': dimensao_resumo(obter('subcategoria')),
+            'status': dimensao_resumo(status),
+            'prioridade': dimensao_resumo(obter('prioridade')),
+            'origem': dimensao_resumo(obter('origem')),
+            'total': 1,
+            'resolvidas': 1 if resolvida else 0,
+            'horas_resolucao': (data_resolucao - data_criacao).total_seconds() / 3600.0 if resolvida else 0.0,
+        }
+    
+    @classmethod
+    def ajustar(cls, denuncias, delta=1):
+        """Somar (delta=1) ou subtrair (delta=-1) denúncias dos resumos (upsert), na transação atual
+
+        Para mover uma denúncia, subtrair antes de alterá-la e somar depois.
+        """
+        # Um upsert por combinação de dimensões, não por denúncia
+        grupos = {}
+        for denuncia in denuncias:
+            valores = cls.valores(denuncia)
+            chave = tuple(valores[dimensao] for dimensao in cls.DIMENSOES)
+            grupo = grupos.setdefault(chave, dict.fromkeys(cls.METRICAS, 0))
+            for metrica in cls.METRICAS:
+                grupo[metrica] += valores[metrica] * delta
+        
+        insert = insert_com_conflito()
+        for chave, metricas in grupos.items():
+            stmt = insert(cls).values(**dict(zip(cls.DIMENSOES, chave)), **metricas)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=list(cls.DIMENSOES),
+                set_={metrica: getattr(cls, metrica) + valor for metrica, valor in metricas.items()}
+            )
+            db.session.execute(stmt)
+    
+    @classmethod
+    def agrupados(cls, data_inicio=None, data_fim=None, dialeto=None):
+        """SELECT dos resumos calculados das denúncias criadas nos dias [data_inicio, data_fim)"""
+        resolvida = db.and_(Denuncia.status == 'concluida', Denuncia.data_resolucao.isnot(None))
+        dimensoes = [
+            db.func.date(Denuncia.data_criacao),
+            Denuncia.empresa_id,
+            Denuncia.categoria,
+            dimensao_resumo(Denuncia.subcategoria),
+            dimensao_resumo(Denuncia.status),
+            dimensao_resumo(Denuncia.prioridade),
+            dimensao_resumo(Denuncia.origem),
+        ]
+        query = db.select(
+            *dimensoes,
+            db.func.count(Denuncia.id),
+            db.func.coalesce(db.func.sum(db.case((resolvida, 1), else_=0)), 0),
+            db.func.coalesce(db.func.sum(db.case((resolvida, horas_resolucao(dialeto)), else_=0.0)), 0.0)
+        )
+        if data_inicio:
+            query = query.where(Denuncia.data_criacao >= datetime.combine(data_inicio, datetime.min.time()))
+        if data_fim:
+            query = query.where(Denuncia.data_criacao < datetime.combine(data_fim, datetime.min.time()))
+        return query.group_by(*dimensoes)
+    
+    @classmethod
+    def reconstruir(cls, data_inicio=None, data_fim=None, conexao=None):
+        """Regenerar os resumos dos dias [data_inicio, data_fim) a partir das denúncias
+
+        Um único INSERT ... SELECT no banco; sem datas, regenera todos os dias.
+        Executa na sessão atual ou na conexão informada (migrações).
+        """
+        executar = (conexao or db.session).execute
+        dialeto = conexao.dialect.name if conexao is not None else None
+        
+        remover = db.delete(cls)
+        if data_inicio:
+            remover = remover.where(cls.dia >= data_inicio)
+        if data_fim:
+            remover = remover.where(cls.dia < data_fim)
+        executar(remover)
+        
+        return executar(db.insert(cls).from_select(
+            list(cls.DIMENSOES + cls.METRICAS), cls.agrupados(data_inicio, data_fim, dialeto)
+        )).rowcount
+    
+    @classmethod
+    def divergencias(cls, data_inicio=None, data_fim=None):
+        """Listar combinações cujo total no resumo difere da contagem real"""
+        reais = {
+            (str(linha[0]),) + tuple(linha[1:7]): linha[7]
+            for linha in db.session.execute(cls.agrupados(data_inicio, data_fim))
+        }
+        query = db.select(*[getattr(cls, dimensao) for dimensao in cls.DIMENSOES], cls.total)
+        if data_inicio:
+            query = query.where(cls.dia >= data_inicio)
+        if data_fim:
+            query = query.where(cls.dia < data_fim)
+        resumos = {
+            (str(linha[0]),) + tuple(linha[1:7]): linha[7]
+            for linha in db.session.execute(query)
+        }
+        
+        return [
+            {'chave': chave, 'resumo': resumos.get(chave, 0), 'real': reais.get(chave, 0)}
+            for chave in sorted(set(reais) | set(resumos), key=str)
+            if resumos.get(chave, 0) != reais.get(chave, 0)
+        ]
+
 class CategoriasDenuncia(db.Model):
     __tablename__ = 'categorias_denuncia'
     
@@ -98,16 +450,26 @@ class CategoriasDenuncia(db.Model):
     nome = db.Column(db.String(100), nullable=False)
     descricao = db.Column(db.Text)
     ativa = db.Column(db.Boolean, default=True)
+    ordem = db.Column(db.Integer, default=0)
     empresa_id = db.Column(db.Integer, db.ForeignKey('empresas.id'), nullable=True)  # Null = global
     
     data_criacao = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Relacionamentos
+    subcategorias = db.relationship(
+        'SubcategoriasDenuncia',
+        backref='categoria',
+        lazy=True,
+        order_by='SubcategoriasDenuncia.ordem'
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
             'nome': self.nome,
             'descricao': self.descricao,
             'ativa': self.ativa,
+            'ordem': self.ordem,
             'empresa_id': self.empresa_id,
             'data_criacao': self.data_criacao.isoformat() if self.data_criacao else None
         }
@@ -120,6 +482,7 @@ class SubcategoriasDenuncia(db.Model):
     nome = db.Column(db.String(100), nullable=False)
     descricao = db.Column(db.Text)
     ativa = db.Column(db.Boolean, default=True)
+    ordem = db.Column(db.Integer, default=0)
     
     data_criacao = db.Column(db.DateTime, default=datetime.utcnow)
     
@@ -130,6 +493,7 @@ class SubcategoriasDenuncia(db.Model):
             'nome': self.nome,
             'descricao': self.descricao,
             'ativa': self.ativa,
+            'ordem': self.ordem,
             'data_criacao': self.data_criacao.isoformat() if self.data_criacao else None
         }
 
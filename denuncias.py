@@ -1,24 +1,61 @@
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, current_app, request, jsonify
 from src.database import db
-from src.models.usuario import Usuario
+from src.sessao import require_auth, get_current_user
+from src.categorias import resposta_arvore
+from src.busca import consulta_busca, destacar
+from src.cache import CacheLRU
+from src.limite import LimiteRequisicoes
+from src.escopo import AcessoNegado, consulta_escopo, criterio_escopo
+from src.projecao import campos_solicitados, colunas, serializar
+from src.fila_denuncias import fila_denuncias
+from src.replica import leitura_replica
 from src.models.empresa import Empresa
-from src.models.denuncia import Denuncia, HistoricoDenuncia, CategoriasDenuncia, SubcategoriasDenuncia
+from src.models.denuncia import Denuncia, HistoricoDenuncia, ContadorDenuncias, ResumoDiarioDenuncias
+from src.models.versao import VersaoDados, chave_denuncias_empresa
 from datetime import datetime
-import os
+from sqlalchemy import and_, or_, func, select
+import base64
+import json
 
 denuncias_bp = Blueprint('denuncias', __name__)
 
-def require_auth():
-    """Decorator para verificar autenticação"""
-    if 'user_id' not in session:
-        return jsonify({'error': 'Usuário não autenticado'}), 401
-    return None
+# Cache curto da consulta pública por protocolo (segundos)
+TTL_CONSULTA_PROTOCOLO = 30
+cache_protocolos = CacheLRU(max_itens=4096, ttl=TTL_CONSULTA_PROTOCOLO)
 
-def get_current_user():
-    """Obter usuário atual da sessão"""
-    if 'user_id' not in session:
-        return None
-    return Usuario.query.get(session['user_id'])
+# Consultas públicas por protocolo, por IP do cliente
+limite_protocolos = LimiteRequisicoes()
+
+# Limites e valores aceitos na ingestão em lote
+TAMANHO_MAXIMO_LOTE = 1000
+ORIGENS_VALIDAS = ['web', 'email', 'telefone']
+PRIORIDADES_VALIDAS = ['baixa', 'media', 'alta', 'critica']
+
+# Status de denúncias ainda em tratamento (voltar a um deles reabre a denúncia)
+STATUS_ABERTOS = ['recebida', 'em_analise']
+
+# Limite de itens por página nas listagens
+MAX_POR_PAGINA = 100
+
+def parametros_paginacao(args, per_page_padrao=20):
+    """page (>= 1) e per_page (1 a MAX_POR_PAGINA) da query string; ValueError se não forem inteiros"""
+    try:
+        page = int(args.get('page', 1))
+        per_page = int(args.get('per_page', per_page_padrao))
+    except (TypeError, ValueError):
+        raise ValueError('page e per_page devem ser inteiros')
+    return max(page, 1), min(max(per_page, 1), MAX_POR_PAGINA)
+
+def codificar_cursor(denuncia):
+    """Gerar cursor opaco a partir da chave (data_criacao, id) da denúncia"""
+    chave = json.dumps([denuncia.data_criacao.isoformat(), denuncia.id])
+    return base64.urlsafe_b64encode(chave.encode('utf-8')).decode('ascii')
+
+def decodificar_cursor(cursor):
+    """Obter a chave (data_criacao, id) de um cursor opaco"""
+    chave = base64.urlsafe_b64decode(cursor.encode('ascii'))
+    data_criacao, denuncia_id = json.loads(chave.decode('utf-8'))
+    return datetime.fromisoformat(data_criacao), int(denuncia_id)
 
 @denuncias_bp.route('/denuncias', methods=['GET'])
 def listar_denuncias():
@@ -36,51 +73,149 @@ def listar_denuncias():
         status = request.args.get('status')
         categoria = request.args.get('categoria')
         prioridade = request.args.get('prioridade')
-        page = int(request.args.get('page', 1))
-        per_page = int(request.args.get('per_page', 20))
-        
-        # Construir query baseada no perfil
-        query = Denuncia.query
-        
-        if usuario_atual.perfil == 'super_admin':
-            # Super Admin pode ver todas as denúncias
-            pass
-        elif usuario_atual.perfil in ['admin_cliente', 'auditoria']:
-            # Admin do Cliente e Auditoria veem denúncias de sua empresa
-            query = query.filter_by(empresa_id=usuario_atual.empresa_id)
-        elif usuario_atual.perfil == 'gerente':
-            # Gerente vê denúncias de sua empresa
-            query = query.filter_by(empresa_id=usuario_atual.empresa_id)
-        elif usuario_atual.perfil == 'cliente':
-            # Cliente vê apenas suas próprias denúncias
-            query = query.filter_by(usuario_id=usuario_atual.id)
-        else:
+        try:
+            page, per_page = parametros_paginacao(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Paginação por cursor (keyset): ?paginacao=cursor ou ?cursor=<next_cursor>
+        cursor = request.args.get('cursor')
+        modo_cursor = cursor is not None or request.args.get('paginacao') == 'cursor'
+        incluir_total = request.args.get('incluir_total', 'false').lower() == 'true'
+        
+        # Campos devolvidos (?fields=); o cursor precisa sempre de data_criacao e id
+        try:
+            campos = campos_solicitados(Denuncia, request.args.get('fields'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        selecionados = campos
+        if modo_cursor:
+            selecionados += tuple(campo for campo in ('data_criacao', 'id') if campo not in campos)
+        projecao = colunas(Denuncia, selecionados)
+        
+        # Consulta em cache restrita ao escopo do perfil, com os filtros da listagem
+        filtros = {'status': status, 'categoria': categoria, 'prioridade': prioridade}
+        try:
+            query = consulta_escopo(lambda: select(*projecao), usuario_atual, track_on=[projecao], **filtros)
+        except AcessoNegado:
+            return jsonify({'error': 'Acesso negado'}), 403
+        
+        if incluir_total or not modo_cursor:
+            total = db.session.execute(
+                consulta_escopo(lambda: select(func.count(Denuncia.id)), usuario_atual, **filtros)
+            ).scalar()
+        
+        if modo_cursor:
+            if cursor:
+                try:
+                    cursor_data, cursor_id = decodificar_cursor(cursor)
+                except (ValueError, TypeError, UnicodeDecodeError):
+                    return jsonify({'error': 'Cursor inválido'}), 400
+                
+                # Continuar logo após a última denúncia da página anterior
+                query += lambda s: s.where(
+                    or_(
+                        Denuncia.data_criacao < cursor_data,
+                        and_(Denuncia.data_criacao == cursor_data, Denuncia.id < cursor_id)
+                    )
+                )
+            
+            # Buscar um registro extra para saber se existe próxima página
+            limite = per_page + 1
+            query += lambda s: s.order_by(Denuncia.data_criacao.desc(), Denuncia.id.desc()).limit(limite)
+            denuncias = db.session.execute(query).all()
+            
+            possui_proxima = len(denuncias) > per_page
+            denuncias = denuncias[:per_page]
+            
+            resposta = {
+                'denuncias': [serializar(denuncia, campos) for denuncia in denuncias],
+                'next_cursor': codificar_cursor(denuncias[-1]) if possui_proxima else None,
+                'per_page': per_page
+            }
+            if incluir_total:
+                resposta['total'] = total
+            
+            return jsonify(resposta), 200
+        
+        # Ordenar por data de criação (mais recentes primeiro) e paginar
+        deslocamento = (page - 1) * per_page
+        query += lambda s: s.order_by(Denuncia.data_criacao.desc()).limit(per_page).offset(deslocamento)
+        denuncias = db.session.execute(query).all()
+        
+        return jsonify({
+            'denuncias': [serializar(denuncia, campos) for denuncia in denuncias],
+            'total': total,
+            'pages': -(-total // per_page),
+            'current_page': page,
+            'per_page': per_page
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Erro interno: {str(e)}'}), 500
+
+@denuncias_bp.route('/denuncias/busca', methods=['GET'])
+def buscar_denuncias():
+    """Busca textual em título e descrição, com o mesmo escopo de listar_denuncias"""
+    auth_error = require_auth()
+    if auth_error:
+        return auth_error
+    
+    try:
+        usuario_atual = get_current_user()
+        if not usuario_atual:
+            return jsonify({'error': 'Usuário não encontrado'}), 404
+        
+        termo = request.args.get('q', '').strip()
+        if not termo:
+            return jsonify({'error': 'Parâmetro q é obrigatório'}), 400
+        
+        status = request.args.get('status')
+        categoria = request.args.get('categoria')
+        prioridade = request.args.get('prioridade')
+        try:
+            page, per_page = parametros_paginacao(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        query = consulta_busca(termo)
+        if query is None:
+            return jsonify({'resultados': [], 'current_page': page, 'per_page': per_page, 'has_next': False}), 200
+        
+        # Mesmo escopo por perfil de listar_denuncias
+        try:
+            criterio = criterio_escopo(usuario_atual)
+        except AcessoNegado:
             return jsonify({'error': 'Acesso negado'}), 403
+        if criterio is not None:
+            query = query.filter(criterio)
         
-        # Aplicar filtros
         if status:
-            query = query.filter_by(status=status)
+            query = query.filter(Denuncia.status == status)
         if categoria:
-            query = query.filter_by(categoria=categoria)
+            query = query.filter(Denuncia.categoria == categoria)
         if prioridade:
-            query = query.filter_by(prioridade=prioridade)
-        
-        # Ordenar por data de criação (mais recentes primeiro)
-        query = query.order_by(Denuncia.data_criacao.desc())
-        
-        # Paginação
-        denuncias_paginadas = query.paginate(
-            page=page, 
-            per_page=per_page, 
-            error_out=False
-        )
+            query = query.filter(Denuncia.prioridade == prioridade)
+        
+        # Buscar um registro extra para saber se existe próxima página
+        linhas = query.limit(per_page + 1).offset((page - 1) * per_page).all()
+        
+        resultados = []
+        for denuncia, relevancia, trecho_titulo, trecho_descricao in linhas[:per_page]:
+            resultados.append({
+                'denuncia': denuncia.to_dict(),
+                'relevancia': float(relevancia),
+                'destaques': {
+                    'titulo': destacar(trecho_titulo),
+                    'descricao': destacar(trecho_descricao)
+                }
+            })
         
         return jsonify({
-            'denuncias': [denuncia.to_dict() for denuncia in denuncias_paginadas.items],
-            'total': denuncias_paginadas.total,
-            'pages': denuncias_paginadas.pages,
+            'resultados': resultados,
             'current_page': page,
-            'per_page': per_page
+            'per_page': per_page,
+            'has_next': len(linhas) > per_page
         }), 200
         
     except Exception as e:
@@ -120,14 +255,33 @@ def criar_denuncia():
         if not empresa:
             return jsonify({'error': 'Empresa não encontrada'}), 404
         
-        # Gerar protocolo único
-        protocolo = Denuncia.gerar_protocolo()
-        while Denuncia.query.filter_by(protocolo=protocolo).first():
+        # Modo fila: denúncias anônimas são gravadas na fila durável e confirmadas
+        # antes de chegarem ao banco principal
+        if not usuario_atual and current_app.config.get('FILA_DENUNCIAS_ATIVA'):
             protocolo = Denuncia.gerar_protocolo()
+            fila_denuncias.enfileirar({
+                'protocolo': protocolo,
+                'titulo': data['titulo'],
+                'descricao': data['descricao'],
+                'categoria': data['categoria'],
+                'subcategoria': data.get('subcategoria'),
+                'status': 'recebida',
+                'prioridade': data.get('prioridade', 'media'),
+                'anonima': True,
+                'usuario_id': None,
+                'empresa_id': empresa.id,
+                'origem': data.get('origem', 'web'),
+                'ip_origem': request.remote_addr,
+                'data_criacao': datetime.utcnow()
+            })
+            
+            return jsonify({
+                'message': 'Denúncia recebida e em processamento',
+                'protocolo': protocolo
+            }), 202
         
-        # Criar nova denúncia
+        # Criar nova denúncia (o protocolo é gerado sem consulta ao banco)
         nova_denuncia = Denuncia(
-            protocolo=protocolo,
             titulo=data['titulo'],
             descricao=data['descricao'],
             categoria=data['categoria'],
@@ -153,18 +307,211 @@ def criar_denuncia():
         )
         db.session.add(historico)
         
+        # Atualizar contadores de estatísticas na mesma transação
+        ContadorDenuncias.ajustar(
+            nova_denuncia.empresa_id,
+            nova_denuncia.status,
+            nova_denuncia.categoria,
+            nova_denuncia.prioridade,
+            1
+        )
+        ResumoDiarioDenuncias.ajustar([nova_denuncia])
+        VersaoDados.incrementar(chave_denuncias_empresa(nova_denuncia.empresa_id))
+        
         db.session.commit()
         
         return jsonify({
             'message': 'Denúncia criada com sucesso',
             'denuncia': nova_denuncia.to_dict(),
-            'protocolo': protocolo
+            'protocolo': nova_denuncia.protocolo
         }), 201
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': f'Erro interno: {str(e)}'}), 500
 
+@denuncias_bp.route('/denuncias/batch', methods=['POST'])
+def criar_denuncias_lote():
+    """Criar denúncias em lote (central telefônica, gateway de email)"""
+    auth_error = require_auth()
+    if auth_error:
+        return auth_error
+    
+    try:
+        usuario_atual = get_current_user()
+        if not usuario_atual:
+            return jsonify({'error': 'Usuário não encontrado'}), 404
+        
+        # Apenas Super Admin e Admin Cliente podem ingerir lotes
+        if usuario_atual.perfil not in ['super_admin', 'admin_cliente']:
+            return jsonify({'error': 'Acesso negado'}), 403
+        
+        data = request.get_json()
+        itens = data.get('denuncias') if isinstance(data, dict) else None
+        if not isinstance(itens, list) or not itens:
+            return jsonify({'error': 'Campo denuncias deve ser uma lista não vazia'}), 400
+        if len(itens) > TAMANHO_MAXIMO_LOTE:
+            return jsonify({'error': f'Máximo de {TAMANHO_MAXIMO_LOTE} denúncias por lote'}), 400
+        
+        # Resolver todas as empresas do lote em uma única consulta
+        ids_empresas = set()
+        for item in itens:
+            if isinstance(item, dict):
+                ids_empresas.add(item.get('empresa_id') or usuario_atual.empresa_id)
+        ids_empresas.discard(None)
+        empresas_existentes = {
+            empresa_id for (empresa_id,) in db.session.query(Empresa.id).filter(Empresa.id.in_(ids_empresas))
+        } if ids_empresas else set()
+        
+        # Validar cada item, guardando o erro na posição correspondente
+        resultados = [None] * len(itens)
+        validas = []
+        for indice, item in enumerate(itens):
+            if not isinstance(item, dict):
+                resultados[indice] = {'indice': indice, 'error': 'Item inválido'}
+                continue
+            
+            campo_faltante = next(
+                (campo for campo in ['titulo', 'descricao', 'categoria'] if not item.get(campo)),
+                None
+            )
+            empresa_id = item.get('empresa_id') or usuario_atual.empresa_id
+            origem = item.get('origem', 'web')
+            prioridade = item.get('prioridade', 'media')
+            
+            if campo_faltante:
+                erro = f'Campo {campo_faltante} é obrigatório'
+            elif not empresa_id:
+                erro = 'Empresa deve ser especificada'
+            elif usuario_atual.perfil != 'super_admin' and empresa_id != usuario_atual.empresa_id:
+                erro = 'Acesso negado para esta empresa'
+            elif empresa_id not in empresas_existentes:
+                erro = 'Empresa não encontrada'
+            elif origem not in ORIGENS_VALIDAS:
+                erro = 'Origem inválida'
+            elif prioridade not in PRIORIDADES_VALIDAS:
+                erro = 'Prioridade inválida'
+            else:
+                erro = None
+            
+            if erro:
+                resultados[indice] = {'indice': indice, 'error': erro}
+                continue
+            
+            # Denúncias recebidas por canais externos não pertencem ao usuário integrador
+            validas.append((indice, {
+                'protocolo': Denuncia.gerar_protocolo(),
+                'titulo': item['titulo'],
+                'descricao': item['descricao'],
+                'categoria': item['categoria'],
+                'subcategoria': item.get('subcategoria'),
+                'status': 'recebida',
+                'prioridade': prioridade,
+                'anonima': item.get('anonima', True),
+                'usuario_id': None,
+                'empresa_id': empresa_id,
+                'origem': origem,
+                'ip_origem': request.remote_addr
+            }))
+        
+        if not validas:
+            return jsonify({'error': 'Nenhuma denúncia válida no lote', 'resultados': resultados}), 400
+        
+        # Inserir denúncias, históricos e contadores em lote, em uma única transação
+        ids_por_protocolo = Denuncia.inserir_em_lote(
+            [linha for _, linha in validas],
+            usuario_id=usuario_atual.id,
+            descricao_historico='Denúncia criada via {origem} (lote)'
+        )
+        
+        db.session.commit()
+        
+        for indice, linha in validas:
+            resultados[indice] = {
+                'indice': indice,
+                'id': ids_por_protocolo[linha['protocolo']],
+                'protocolo': linha['protocolo']
+            }
+        
+        return jsonify({
+            'message': 'Lote processado',
+            'total_criadas': len(validas),
+            'total_erros': len(itens) - len(validas),
+            'resultados': resultados
+        }), 201
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Erro interno: {str(e)}'}), 500
+
+@denuncias_bp.route('/denuncias/fila', methods=['GET'])
+def metricas_fila_denuncias():
+    """Profundidade da fila de entrada de denúncias anônimas (apenas Super Admin)"""
+    auth_error = require_auth()
+    if auth_error:
+        return auth_error
+    
+    try:
+        usuario_atual = get_current_user()
+        if not usuario_atual or usuario_atual.perfil != 'super_admin':
+            return jsonify({'error': 'Acesso negado - apenas Super Admin'}), 403
+        
+        if not current_app.config.get('FILA_DENUNCIAS_ATIVA'):
+            return jsonify({'ativa': False}), 200
+        
+        return jsonify(dict(fila_denuncias.metricas(), ativa=True)), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Erro interno: {str(e)}'}), 500
+
+@denuncias_bp.route('/protocolo/<protocolo>', methods=['GET'])
+def consultar_protocolo(protocolo):
+    """Consulta pública do status de uma denúncia pelo protocolo"""
+    try:
+        espera = limite_protocolos.registrar(
+            request.remote_addr,
+            current_app.config['PROTOCOLO_LIMITE_REQUISICOES'],
+            current_app.config['PROTOCOLO_LIMITE_JANELA']
+        )
+        if espera:
+            resposta = jsonify({'error': 'Muitas consultas de protocolo. Tente novamente em instantes'})
+            resposta.headers['Retry-After'] = str(espera)
+            return resposta, 429
+        
+        protocolo = protocolo.strip().upper()
+        
+        status_publico = cache_protocolos.obter(protocolo)
+        if status_publico is None:
+            denuncia = Denuncia.query.filter_by(protocolo=protocolo).first()
+            if denuncia:
+                status_publico = denuncia.to_status_publico()
+            else:
+                # A denúncia pode ainda estar na fila de entrada
+                pendente = None
+                if current_app.config.get('FILA_DENUNCIAS_ATIVA'):
+                    pendente = fila_denuncias.buscar(protocolo)
+                if not pendente:
+                    return jsonify({'error': 'Protocolo não encontrado'}), 404
+                
+                resposta = jsonify({'denuncia': {
+                    'protocolo': protocolo,
+                    'status': pendente['status'],
+                    'data_criacao': pendente['data_criacao'],
+                    'data_atualizacao': pendente['data_criacao'],
+                    'data_resolucao': None
+                }})
+                resposta.headers['Cache-Control'] = 'no-cache'
+                return resposta, 200
+
+            cache_protocolos.guardar(protocolo, status_publico)
+        
+        resposta = jsonify({'denuncia': status_publico})
+        resposta.headers['Cache-Control'] = f'private, max-age={TTL_CONSULTA_PROTOCOLO}'
+        return resposta, 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Erro interno: {str(e)}'}), 500
+
 @denuncias_bp.route('/denuncias/<int:denuncia_id>', methods=['GET'])
 def obter_denuncia(denuncia_id):
     """Obter detalhes de uma denúncia específica"""
@@ -232,11 +579,19 @@ def atualizar_status_denuncia(denuncia_id):
             return jsonify({'error': 'Status inválido'}), 400
         
         status_anterior = denuncia.status
+        
+        # Retirar dos resumos diários a contribuição atual (status e resolução) antes de alterá-la
+        if status_anterior != novo_status:
+            ResumoDiarioDenuncias.ajustar([denuncia], -1)
+        
         denuncia.status = novo_status
         denuncia.responsavel_id = usuario_atual.id
         
-        if novo_status == 'concluida':
-            denuncia.data_conclusao = datetime.utcnow()
+        if novo_status == 'concluida' and status_anterior != 'concluida':
+            denuncia.data_resolucao = datetime.utcnow()
+        elif status_anterior == 'concluida' and novo_status in STATUS_ABERTOS:
+            # Denúncia reaberta: deixa de contar como resolvida
+            denuncia.data_resolucao = None
         
         # Criar histórico
         historico = HistoricoDenuncia(
@@ -249,7 +604,19 @@ def atualizar_status_denuncia(denuncia_id):
         )
         db.session.add(historico)
         
+        # Mover a denúncia entre contadores e resumos diários na mesma transação
+        if status_anterior != novo_status:
+            ContadorDenuncias.ajustar(
+                denuncia.empresa_id, status_anterior, denuncia.categoria, denuncia.prioridade, -1
+            )
+            ContadorDenuncias.ajustar(
+                denuncia.empresa_id, novo_status, denuncia.categoria, denuncia.prioridade, 1
+            )
+            ResumoDiarioDenuncias.ajustar([denuncia])
+        VersaoDados.incrementar(chave_denuncias_empresa(denuncia.empresa_id))
+        
         db.session.commit()
+        cache_protocolos.invalidar(denuncia.protocolo)
         
         return jsonify({
             'message': 'Status atualizado com sucesso',
@@ -264,25 +631,13 @@ def atualizar_status_denuncia(denuncia_id):
 def listar_categorias():
     """Listar categorias de denúncias"""
     try:
-        categorias = CategoriasDenuncia.query.filter_by(ativa=True).order_by(CategoriasDenuncia.ordem).all()
-        
-        resultado = []
-        for categoria in categorias:
-            subcategorias = SubcategoriasDenuncia.query.filter_by(
-                categoria_id=categoria.id, 
-                ativa=True
-            ).order_by(SubcategoriasDenuncia.ordem).all()
-            
-            categoria_dict = categoria.to_dict()
-            categoria_dict['subcategorias'] = [sub.to_dict() for sub in subcategorias]
-            resultado.append(categoria_dict)
-        
-        return jsonify({'categorias': resultado}), 200
+        return resposta_arvore(apenas_ativas=True)
         
     except Exception as e:
         return jsonify({'error': f'Erro interno: {str(e)}'}), 500
 
 @denuncias_bp.route('/denuncias/estatisticas', methods=['GET'])
+@leitura_replica
 def obter_estatisticas():
     """Obter estatísticas de denúncias"""
     auth_error = require_auth()
@@ -294,35 +649,43 @@ def obter_estatisticas():
         if not usuario_atual:
             return jsonify({'error': 'Usuário não encontrado'}), 404
         
-        # Construir query baseada no perfil
-        query = Denuncia.query
-        
-        if usuario_atual.perfil == 'super_admin':
-            # Super Admin pode ver todas as denúncias
-            pass
-        elif usuario_atual.perfil in ['admin_cliente', 'auditoria', 'gerente']:
-            # Admin do Cliente, Auditoria e Gerente veem denúncias de sua empresa
-            query = query.filter_by(empresa_id=usuario_atual.empresa_id)
-        elif usuario_atual.perfil == 'cliente':
-            # Cliente vê apenas suas próprias denúncias
-            query = query.filter_by(usuario_id=usuario_atual.id)
+        if usuario_atual.perfil == 'cliente':
+            # Cliente vê apenas suas próprias denúncias: contagem direta na tabela
+            query = consulta_escopo(
+                lambda: select(Denuncia.status, Denuncia.categoria, func.count(Denuncia.id)),
+                usuario_atual
+            )
+            query += lambda s: s.group_by(Denuncia.status, Denuncia.categoria)
+            contagens = db.session.execute(query).all()
+        elif usuario_atual.perfil in ['super_admin', 'admin_cliente', 'auditoria', 'gerente']:
+            # Demais perfis leem os contadores mantidos incrementalmente
+            query = db.session.query(
+                ContadorDenuncias.status,
+                ContadorDenuncias.categoria,
+                db.func.sum(ContadorDenuncias.total)
+            )
+            if usuario_atual.perfil != 'super_admin':
+                query = query.filter(ContadorDenuncias.empresa_id == usuario_atual.empresa_id)
+            contagens = query.group_by(ContadorDenuncias.status, ContadorDenuncias.categoria).all()
         else:
             return jsonify({'error': 'Acesso negado'}), 403
         
-        # Calcular estatísticas
-        total = query.count()
-        recebidas = query.filter_by(status='recebida').count()
-        em_analise = query.filter_by(status='em_analise').count()
-        concluidas = query.filter_by(status='concluida').count()
-        arquivadas = query.filter_by(status='arquivada').count()
-        
-        # Estatísticas por categoria
-        categorias_stats = db.session.query(
-            Denuncia.categoria,
-            db.func.count(Denuncia.id).label('total')
-        ).filter(
-            query.whereclause if query.whereclause is not None else True
-        ).group_by(Denuncia.categoria).all()
+        # Consolidar totais por status e por categoria
+        por_status = {}
+        por_categoria = {}
+        for status, categoria, quantidade in contagens:
+            if not quantidade:
+                continue
+            por_status[status] = por_status.get(status, 0) + quantidade
+            por_categoria[categoria] = por_categoria.get(categoria, 0) + quantidade
+        
+        total = sum(por_status.values())
+        recebidas = por_status.get('recebida', 0)
+        em_analise = por_status.get('em_analise', 0)
+        concluidas = por_status.get('concluida', 0)
+        arquivadas = por_status.get('arquivada', 0)
+        
+        categorias_stats = sorted(por_categoria.items())
         
         return jsonify({
             'total': total,
@@ -0,0 +1,32 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from src.main import create_app
+from src.fila_denuncias import fila_denuncias
+# Sem os blueprints, as tabelas referenciadas pelas denúncias precisam ser carregadas aqui
+from src.models import empresa, usuario
+import logging
+import signal
+
+app = create_app(rotas=False)
+
+def drenar_fila_denuncias():
+    """Drenar a fila de entrada em um único processo, até receber SIGTERM ou SIGINT
+
+    Usado com FILA_DENUNCIAS_ESCRITOR=dedicado: os workers só enfileiram e
+    este processo grava as denúncias no banco principal, inclusive as que
+    ficaram na fila antes de um reinício.
+    """
+    fila_denuncias.init_app(app, escritor=False)
+    for sinal in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sinal, lambda *_: fila_denuncias.parar())
+
+    print(f"Drenando {fila_denuncias.arquivo}: {fila_denuncias.metricas()}")
+    fila_denuncias.executar_escritor()
+    print(f"Escritor encerrado: {fila_denuncias.metricas()}")
+    return 0
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(drenar_fila_denuncias())
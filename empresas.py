@@ -1,23 +1,14 @@
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, request, jsonify
 from src.database import db
-from src.models.usuario import Usuario
+from src.sessao import require_auth, get_current_user
+from src.projecao import campos_solicitados, colunas, serializar
+from src.condicional import gerar_etag, resposta_condicional
 from src.models.empresa import Empresa
 from datetime import datetime
+from sqlalchemy import select
 
 empresas_bp = Blueprint('empresas', __name__)
 
-def require_auth():
-    """Decorator para verificar autenticação"""
-    if 'user_id' not in session:
-        return jsonify({'error': 'Usuário não autenticado'}), 401
-    return None
-
-def get_current_user():
-    """Obter usuário atual da sessão"""
-    if 'user_id' not in session:
-        return None
-    return Usuario.query.get(session['user_id'])
-
 @empresas_bp.route('/empresas', methods=['GET'])
 def listar_empresas():
     """Listar empresas baseado no perfil do usuário logado"""
@@ -30,17 +21,26 @@ def listar_empresas():
         if not usuario_atual:
             return jsonify({'error': 'Usuário não encontrado'}), 404
         
+        # Campos devolvidos (?fields=), lidos como linhas simples sem instanciar o modelo
+        try:
+            campos = campos_solicitados(Empresa, request.args.get('fields'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        query = select(*colunas(Empresa, campos))
+        
         # Super Admin pode ver todas as empresas
         if usuario_atual.perfil == 'super_admin':
-            empresas = Empresa.query.all()
+            pass
         # Admin do Cliente pode ver apenas sua empresa
         elif usuario_atual.perfil == 'admin_cliente':
-            empresas = [usuario_atual.empresa] if usuario_atual.empresa else []
+            query = query.where(Empresa.id == usuario_atual.empresa_id)
         else:
             return jsonify({'error': 'Acesso negado'}), 403
         
+        empresas = db.session.execute(query).all()
+        
         return jsonify({
-            'empresas': [empresa.to_dict() for empresa in empresas]
+            'empresas': [serializar(empresa, campos) for empresa in empresas]
         }), 200
         
     except Exception as e:
@@ -206,20 +206,29 @@ def obter_customizacao_empresa(empresa_id):
         if not usuario_atual:
             return jsonify({'error': 'Usuário não encontrado'}), 404
         
-        empresa = Empresa.query.get(empresa_id)
-        if not empresa:
-            return jsonify({'error': 'Empresa não encontrada'}), 404
-        
         # Verificar se usuário pode acessar esta empresa
         if usuario_atual.perfil != 'super_admin' and usuario_atual.empresa_id != empresa_id:
             return jsonify({'error': 'Acesso negado'}), 403
         
-        return jsonify({
-            'customizacao': {
-                'logo_url': empresa.logo_url,
-                'cores_personalizadas': empresa.cores_personalizadas or {}
-            }
-        }), 200
+        # Validador a partir de data_atualizacao, sem carregar a empresa
+        versao = db.session.query(Empresa.data_atualizacao).filter(Empresa.id == empresa_id).first()
+        if not versao:
+            return jsonify({'error': 'Empresa não encontrada'}), 404
+        
+        def montar():
+            empresa = Empresa.query.get(empresa_id)
+            return jsonify({
+                'customizacao': {
+                    'logo_url': empresa.logo_url,
+                    'cores_personalizadas': empresa.cores_personalizadas or {}
+                }
+            }), 200
+        
+        return resposta_condicional(
+            gerar_etag('customizacao', empresa_id, versao.data_atualizacao),
+            montar,
+            ultima_modificacao=versao.data_atualizacao
+        )
         
     except Exception as e:
         return jsonify({'error': f'Erro interno: {str(e)}'}), 500
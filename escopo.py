@@ -0,0 +1,70 @@
+from sqlalchemy import lambda_stmt
+from src.models.denuncia import Denuncia
+
+# Perfis que enxergam todas as denúncias da própria empresa
+PERFIS_EMPRESA = ('admin_cliente', 'auditoria', 'gerente')
+
+class AcessoNegado(Exception):
+    """Perfil sem acesso à listagem de denúncias"""
+
+def criterio_escopo(usuario, empresa_id=None):
+    """Condição SQL com as denúncias visíveis ao usuário (None = sem restrição)
+
+    Super Admin vê todas (ou as da empresa_id informada); admin_cliente,
+    auditoria e gerente veem as da própria empresa; cliente vê apenas as
+    próprias denúncias.
+    """
+    if usuario.perfil == 'super_admin':
+        return Denuncia.empresa_id == empresa_id if empresa_id else None
+    if usuario.perfil in PERFIS_EMPRESA:
+        return Denuncia.empresa_id == usuario.empresa_id
+    if usuario.perfil == 'cliente':
+        return Denuncia.usuario_id == usuario.id
+    raise AcessoNegado()
+
+def aplicar_escopo(stmt, usuario, empresa_id=None):
+    """Acrescentar o escopo do perfil a uma consulta lambda_stmt
+
+    Mesma regra de criterio_escopo, mas em lambdas: o SQL de cada combinação
+    é montado e compilado uma única vez e os valores entram como parâmetros.
+    """
+    if usuario.perfil == 'super_admin':
+        if empresa_id:
+            stmt += lambda s: s.where(Denuncia.empresa_id == empresa_id)
+    elif usuario.perfil in PERFIS_EMPRESA:
+        empresa_usuario = usuario.empresa_id
+        stmt += lambda s: s.where(Denuncia.empresa_id == empresa_usuario)
+    elif usuario.perfil == 'cliente':
+        usuario_id = usuario.id
+        stmt += lambda s: s.where(Denuncia.usuario_id == usuario_id)
+    else:
+        raise AcessoNegado()
+    return stmt
+
+def aplicar_filtros(stmt, status=None, categoria=None, prioridade=None, data_inicio=None, data_fim=None):
+    """Acrescentar os filtros opcionais de listagens e relatórios a uma consulta lambda_stmt"""
+    if status:
+        stmt += lambda s: s.where(Denuncia.status == status)
+    if categoria:
+        stmt += lambda s: s.where(Denuncia.categoria == categoria)
+    if prioridade:
+        stmt += lambda s: s.where(Denuncia.prioridade == prioridade)
+    if data_inicio:
+        stmt += lambda s: s.where(Denuncia.data_criacao >= data_inicio)
+    if data_fim:
+        stmt += lambda s: s.where(Denuncia.data_criacao <= data_fim)
+    return stmt
+
+def consulta_escopo(base, usuario, empresa_id=None, track_on=None, **filtros):
+    """Consulta em cache (lambda_stmt) a partir de base, restrita ao escopo do usuário
+
+    base é uma lambda sem argumentos que devolve o select, por exemplo
+    ``lambda: select(Denuncia)``; o resultado aceita novos trechos com
+    ``stmt += lambda s: s.order_by(...)`` e é executado por db.session.execute.
+    Se base usar uma sequência de colunas variável, ela deve ser informada
+    em track_on para fazer parte da chave do cache.
+    Gera AcessoNegado para perfis sem acesso.
+    """
+    stmt = lambda_stmt(base, track_on=track_on)
+    stmt = aplicar_escopo(stmt, usuario, empresa_id)
+    return aplicar_filtros(stmt, **filtros)
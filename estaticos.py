@@ -0,0 +1,120 @@
+from flask import Response, request
+from werkzeug.wsgi import wrap_file
+from datetime import datetime, timezone
+import hashlib
+import mimetypes
+import os
+import re
+
+# Variantes pré-comprimidas, na ordem de preferência
+CODIFICACOES = (('br', '.br'), ('gzip', '.gz'))
+
+# Arquivos gerados pelo Vite com hash no nome (ex.: assets/index-BqK3x9Zz.js)
+PADRAO_FINGERPRINT = re.compile(r'^assets/.+-[A-Za-z0-9_-]{8,}\.[A-Za-z0-9]+$')
+
+CACHE_IMUTAVEL = 'public, max-age=31536000, immutable'
+CACHE_REVALIDAR = 'public, no-cache'
+
+class ArquivosEstaticos:
+    """Servir o build do frontend a partir de um índice montado na inicialização
+
+    A pasta é percorrida uma única vez: cada requisição só consulta um
+    dicionário, escolhe a variante .br/.gz aceita pelo cliente e abre o
+    arquivo. O index.html (e suas variantes) fica em memória com ETag.
+    Um novo build exige reiniciar os workers (ou chamar indexar()).
+    """
+
+    def __init__(self):
+        self.pasta = None
+        self.arquivos = {}
+        self.index = None
+
+    def init_app(self, app):
+        self.pasta = app.static_folder
+        self.indexar()
+
+    def indexar(self):
+        """Montar o índice de arquivos (caminho relativo -> metadados e variantes)"""
+        arquivos = {}
+        if self.pasta and os.path.isdir(self.pasta):
+            for raiz, _, nomes in os.walk(self.pasta):
+                for nome in nomes:
+                    caminho = os.path.join(raiz, nome)
+                    relativo = os.path.relpath(caminho, self.pasta).replace(os.sep, '/')
+                    if relativo.endswith(tuple(sufixo for _, sufixo in CODIFICACOES)):
+                        continue
+                    arquivos[relativo] = self.descrever(caminho, relativo)
+
+        index = arquivos.pop('index.html', None)
+        self.arquivos = arquivos
+        self.index = self.carregar_index(index) if index else None
+
+    def descrever(self, caminho, relativo):
+        """Metadados de um arquivo e de suas variantes pré-comprimidas"""
+        estado = os.stat(caminho)
+        variantes = {None: (caminho, estado.st_size)}
+        for codificacao, sufixo in CODIFICACOES:
+            if os.path.isfile(caminho + sufixo):
+                variantes[codificacao] = (caminho + sufixo, os.path.getsize(caminho + sufixo))
+
+        return {
+            'variantes': variantes,
+            'mimetype': mimetypes.guess_type(relativo)[0] or 'application/octet-stream',
+            'etag': f'{int(estado.st_mtime)}-{estado.st_size}',
+            'modificado': datetime.fromtimestamp(int(estado.st_mtime), timezone.utc),
+            'cache': CACHE_IMUTAVEL if PADRAO_FINGERPRINT.match(relativo) else CACHE_REVALIDAR
+        }
+
+    def carregar_index(self, index):
+        """Ler o index.html e suas variantes para a memória"""
+        conteudos = {}
+        for codificacao, (caminho, _) in index['variantes'].items():
+            with open(caminho, 'rb') as arquivo:
+                conteudos[codificacao] = arquivo.read()
+
+        index['conteudos'] = conteudos
+        index['etag'] = hashlib.sha1(conteudos[None]).hexdigest()
+        index['cache'] = CACHE_REVALIDAR
+        return index
+
+    def codificacao_aceita(self, arquivo):
+        """Melhor variante disponível que o cliente aceita (None = sem compressão)"""
+        for codificacao, _ in CODIFICACOES:
+            if codificacao in arquivo['variantes'] and codificacao in request.accept_encodings:
+                return codificacao
+        return None
+
+    def responder(self, path):
+        """Responder com o arquivo do índice ou, para rotas do SPA, com o index.html"""
+        arquivo = self.arquivos.get(path) if path else None
+        if arquivo is None:
+            if self.index is None:
+                return "index.html not found", 404
+            arquivo = self.index
+
+        codificacao = self.codificacao_aceita(arquivo)
+        etag = f"{arquivo['etag']}-{codificacao}" if codificacao else arquivo['etag']
+
+        if request.if_none_match.contains(etag):
+            resposta = Response(status=304)
+        elif arquivo is self.index:
+            resposta = Response(arquivo['conteudos'][codificacao], mimetype=arquivo['mimetype'])
+        else:
+            caminho, tamanho = arquivo['variantes'][codificacao]
+            resposta = Response(
+                wrap_file(request.environ, open(caminho, 'rb')),
+                mimetype=arquivo['mimetype'],
+                direct_passthrough=True
+            )
+            resposta.content_length = tamanho
+
+        if codificacao:
+            resposta.content_encoding = codificacao
+        if len(arquivo['variantes']) > 1:
+            resposta.vary.add('Accept-Encoding')
+        resposta.set_etag(etag)
+        resposta.last_modified = arquivo['modificado']
+        resposta.headers['Cache-Control'] = arquivo['cache']
+        return resposta
+
+arquivos_estaticos = ArquivosEstaticos()
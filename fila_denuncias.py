@@ -0,0 +1,324 @@
+from src.database import db
+from src.models.denuncia import Denuncia
+from datetime import datetime
+from threading import Event, Lock, Thread
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Denúncias gravadas por transação no banco principal
+TAMANHO_LOTE_FILA = 200
+# Intervalo máximo entre verificações da fila vazia (segundos)
+INTERVALO_FILA = 0.5
+# Reservas mais antigas que isto são consideradas de um processo que caiu
+TIMEOUT_RESERVA = 60
+# Tentativas antes de um item ser marcado como falho (reenfileirar com requeue_denuncias.py)
+MAX_TENTATIVAS = 10
+# Espera antes de tentar de novo um item que falhou: dobra a cada tentativa até o máximo (segundos)
+ATRASO_INICIAL_FILA = 2
+ATRASO_MAXIMO_FILA = 300
+
+DDL_FILA = """CREATE TABLE IF NOT EXISTS fila_denuncias (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    protocolo TEXT NOT NULL UNIQUE,
+    dados TEXT NOT NULL,
+    criado_em REAL NOT NULL,
+    reservado_por TEXT,
+    reservado_em REAL,
+    tentativas INTEGER NOT NULL DEFAULT 0,
+    proxima_tentativa REAL NOT NULL DEFAULT 0,
+    ultimo_erro TEXT
+)"""
+
+def atraso_tentativa(tentativas):
+    """Segundos até a próxima tentativa de um item que já falhou tentativas vezes"""
+    return min(ATRASO_INICIAL_FILA * 2 ** (tentativas - 1), ATRASO_MAXIMO_FILA)
+
+class FilaDenuncias:
+    """Fila durável local (SQLite em modo WAL) para denúncias anônimas
+
+    A requisição grava a denúncia na fila e responde; um escritor em
+    segundo plano drena a fila para o banco principal em commits agrupados.
+    Itens reservados por um processo que caiu voltam à fila após
+    TIMEOUT_RESERVA, e protocolos já gravados não são inseridos de novo.
+    Itens que falham são tentados de novo com espera crescente, até
+    MAX_TENTATIVAS.
+    """
+    
+    def __init__(self):
+        self.arquivo = None
+        self.app = None
+        self._pid = None
+        self._lock = Lock()
+        self._acordar = Event()
+        self._parar = Event()
+    
+    def conectar(self):
+        """Abrir conexão com a fila (uma por operação; o SQLite cuida da concorrência)"""
+        conexao = sqlite3.connect(self.arquivo, timeout=30, isolation_level=None)
+        conexao.execute("PRAGMA journal_mode=WAL")
+        conexao.execute("PRAGMA synchronous=FULL")
+        return conexao
+    
+    def init_app(self, app, escritor=None):
+        """Preparar o arquivo da fila e iniciar o escritor já na inicialização
+
+        Com FILA_DENUNCIAS_ESCRITOR=dedicado (ou escritor=False) este processo
+        não drena a fila: um único processo (drenar_fila_denuncias.py) faz isso
+        para todos os workers.
+        """
+        self.app = app
+        self.arquivo = app.config['FILA_DENUNCIAS_ARQUIVO']
+        os.makedirs(os.path.dirname(self.arquivo), exist_ok=True)
+        
+        conexao = self.conectar()
+        try:
+            conexao.execute(DDL_FILA)
+            # Arquivos de fila criados antes da espera entre tentativas
+            colunas = [coluna[1] for coluna in conexao.execute("PRAGMA table_info(fila_denuncias)")]
+            if 'proxima_tentativa' not in colunas:
+                try:
+                    conexao.execute("ALTER TABLE fila_denuncias ADD COLUMN proxima_tentativa REAL NOT NULL DEFAULT 0")
+                except sqlite3.OperationalError as e:
+                    # Outro worker acrescentou a coluna ao mesmo tempo
+                    if 'duplicate column' not in str(e):
+                        raise
+        finally:
+            conexao.close()
+        
+        if escritor is None:
+            escritor = app.config.get('FILA_DENUNCIAS_ESCRITOR', 'worker') == 'worker'
+        if escritor:
+            self.garantir_escritor()
+            # Processos criados por fork depois da inicialização (ex.: gunicorn --preload)
+            app.before_request(self.garantir_escritor)
+    
+    def garantir_escritor(self):
+        """Iniciar a thread escritora neste processo (threads não sobrevivem ao fork)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                Thread(target=self.executar_escritor, name='escritor-fila-denuncias', daemon=True).start()
+    
+    def enfileirar(self, linha):
+        """Gravar a denúncia na fila de forma durável"""
+        dados = dict(linha)
+        dados['data_criacao'] = dados['data_criacao'].isoformat()
+        
+        conexao = self.conectar()
+        try:
+            conexao.execute(
+                "INSERT INTO fila_denuncias (protocolo, dados, criado_em) VALUES (?, ?, ?)",
+                (linha['protocolo'], json.dumps(dados), time.time())
+            )
+        finally:
+            conexao.close()
+        self._acordar.set()
+    
+    def buscar(self, protocolo):
+        """Dados de uma denúncia ainda pendente na fila, ou None"""
+        conexao = self.conectar()
+        try:
+            linha = conexao.execute(
+                "SELECT dados FROM fila_denuncias WHERE protocolo = ?", (protocolo,)
+            ).fetchone()
+        finally:
+            conexao.close()
+        return json.loads(linha[0]) if linha else None
+    
+    def reservar(self, dono):
+        """Reservar o próximo lote para este processo (itens em espera ficam de fora)"""
+        agora = time.time()
+        conexao = self.conectar()
+        try:
+            conexao.execute("BEGIN IMMEDIATE")
+            conexao.execute(
+                """UPDATE fila_denuncias SET reservado_por = ?, reservado_em = ?
+                   WHERE id IN (
+                       SELECT id FROM fila_denuncias
+                       WHERE tentativas < ? AND proxima_tentativa <= ?
+                         AND (reservado_por IS NULL OR reservado_em < ?)
+                       ORDER BY id LIMIT ?
+                   )""",
+                (dono, agora, MAX_TENTATIVAS, agora, agora - TIMEOUT_RESERVA, TAMANHO_LOTE_FILA)
+            )
+            itens = conexao.execute(
+                "SELECT id, dados, tentativas FROM fila_denuncias WHERE reservado_por = ? ORDER BY id", (dono,)
+            ).fetchall()
+            conexao.execute("COMMIT")
+        finally:
+            conexao.close()
+        return [(item_id, json.loads(dados), tentativas) for item_id, dados, tentativas in itens]
+    
+    def gravar_lote(self, itens):
+        """Gravar um lote no banco principal em uma transação (idempotente por protocolo)"""
+        linhas = []
+        for _, dados, _ in itens:
+            linha = dict(dados)
+            linha['data_criacao'] = datetime.fromisoformat(linha['data_criacao'])
+            linhas.append(linha)
+        
+        # Protocolos já gravados antes de uma queda não são inseridos de novo
+        existentes = {
+            protocolo for (protocolo,) in db.session.query(Denuncia.protocolo).filter(
+                Denuncia.protocolo.in_([linha['protocolo'] for linha in linhas])
+            )
+        }
+        novas = [linha for linha in linhas if linha['protocolo'] not in existentes]
+        
+        if novas:
+            Denuncia.inserir_em_lote(novas, descricao_historico='Denúncia criada')
+        db.session.commit()
+    
+    def concluir(self, ids):
+        """Remover da fila os itens já gravados no banco principal"""
+        conexao = self.conectar()
+        try:
+            conexao.executemany("DELETE FROM fila_denuncias WHERE id = ?", [(item_id,) for item_id in ids])
+        finally:
+            conexao.close()
+    
+    def registrar_falha(self, itens, erro):
+        """Liberar a reserva, contar a tentativa que falhou e agendar a próxima"""
+        agora = time.time()
+        conexao = self.conectar()
+        try:
+            conexao.executemany(
+                """UPDATE fila_denuncias
+                   SET reservado_por = NULL, reservado_em = NULL, tentativas = tentativas + 1,
+                       proxima_tentativa = ?, ultimo_erro = ?
+                   WHERE id = ?""",
+                [
+                    (agora + atraso_tentativa(tentativas + 1), str(erro)[:500], item_id)
+                    for item_id, _, tentativas in itens
+                ]
+            )
+        finally:
+            conexao.close()
+    
+    def gravar(self, itens):
+        """Gravar itens no banco principal; None em caso de sucesso, senão a exceção"""
+        try:
+            with self.app.app_context():
+                try:
+                    self.gravar_lote(itens)
+                except Exception:
+                    db.session.rollback()
+                    raise
+        except Exception as e:
+            return e
+        return None
+    
+    def drenar(self, dono):
+        """Processar um lote; retorna quantos itens foram reservados
+
+        Se o lote falhar, os itens são gravados um a um: apenas os que
+        falharem sozinhos contam uma tentativa.
+        """
+        itens = self.reservar(dono)
+        if not itens:
+            return 0
+        
+        erro = self.gravar(itens)
+        if erro is None:
+            self.concluir([item_id for item_id, _, _ in itens])
+            return len(itens)
+        
+        if len(itens) == 1:
+            logger.error("Falha ao gravar item da fila de denúncias: %s", erro)
+            self.registrar_falha(itens, erro)
+            return len(itens)
+        
+        logger.warning("Falha ao gravar lote da fila de denúncias (%s); gravando item a item", erro)
+        gravados, falhas = [], []
+        for item in itens:
+            erro = self.gravar([item])
+            if erro is None:
+                gravados.append(item[0])
+            else:
+                logger.error("Falha ao gravar item %s da fila de denúncias: %s", item[0], erro)
+                falhas.append((item, erro))
+        self.concluir(gravados)
+        for item, erro in falhas:
+            self.registrar_falha([item], erro)
+        return len(itens)
+    
+    def listar_falhas(self):
+        """Itens que esgotaram as tentativas: (id, protocolo, tentativas, último erro)"""
+        conexao = self.conectar()
+        try:
+            return conexao.execute(
+                "SELECT id, protocolo, tentativas, ultimo_erro FROM fila_denuncias WHERE tentativas >= ? ORDER BY id",
+                (MAX_TENTATIVAS,)
+            ).fetchall()
+        finally:
+            conexao.close()
+    
+    def reenfileirar_falhas(self, ids=None):
+        """Devolver à fila os itens que esgotaram as tentativas (todos ou os ids informados)"""
+        condicao, parametros = "tentativas >= ?", [MAX_TENTATIVAS]
+        if ids:
+            condicao += f" AND id IN ({', '.join('?' for _ in ids)})"
+            parametros += list(ids)
+        
+        conexao = self.conectar()
+        try:
+            cursor = conexao.execute(
+                f"""UPDATE fila_denuncias
+                    SET tentativas = 0, proxima_tentativa = 0, reservado_por = NULL, reservado_em = NULL
+                    WHERE {condicao}""",
+                parametros
+            )
+        finally:
+            conexao.close()
+        self._acordar.set()
+        return cursor.rowcount
+    
+    def executar_escritor(self):
+        """Laço da thread escritora"""
+        dono = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        while not self._parar.is_set():
+            try:
+                if self.drenar(dono):
+                    continue
+            except Exception:
+                logger.exception("Erro no escritor da fila de denúncias")
+            self._acordar.wait(INTERVALO_FILA)
+            self._acordar.clear()
+    
+    def parar(self):
+        """Encerrar o laço do escritor após o lote atual"""
+        self._parar.set()
+        self._acordar.set()
+    
+    def metricas(self):
+        """Profundidade da fila, itens em espera após falha, falhas e idade do item mais antigo"""
+        conexao = self.conectar()
+        try:
+            pendentes, aguardando, falhas, mais_antigo = conexao.execute(
+                """SELECT
+                       SUM(CASE WHEN tentativas < ? THEN 1 ELSE 0 END),
+                       SUM(CASE WHEN tentativas > 0 AND tentativas < ? THEN 1 ELSE 0 END),
+                       SUM(CASE WHEN tentativas >= ? THEN 1 ELSE 0 END),
+                       MIN(criado_em)
+                   FROM fila_denuncias""",
+                (MAX_TENTATIVAS, MAX_TENTATIVAS, MAX_TENTATIVAS)
+            ).fetchone()
+        finally:
+            conexao.close()
+        
+        return {
+            'profundidade': pendentes or 0,
+            'aguardando_nova_tentativa': aguardando or 0,
+            'falhas': falhas or 0,
+            'idade_mais_antigo_segundos': round(time.time() - mais_antigo, 3) if mais_antigo is not None else 0
+        }
+
+fila_denuncias = FilaDenuncias()
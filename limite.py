@@ -0,0 +1,35 @@
+from collections import OrderedDict
+from threading import Lock
+import math
+import time
+
+class LimiteRequisicoes:
+    """Limite de requisições por chave (ex.: IP) em janelas fixas, em memória e por processo
+
+    Cada chave pode fazer até max_requisicoes a cada janela (segundos). Com
+    vários workers o limite vale para cada um. As chaves menos recentes
+    são descartadas acima de max_chaves.
+    """
+
+    def __init__(self, max_chaves=10000):
+        self.max_chaves = max_chaves
+        self._janelas = OrderedDict()
+        self._lock = Lock()
+        self.bloqueios = 0
+
+    def registrar(self, chave, max_requisicoes, janela):
+        """Contar uma requisição: 0 se permitida, senão os segundos até a próxima janela"""
+        agora = time.monotonic()
+        with self._lock:
+            inicio, contagem = self._janelas.pop(chave, (agora, 0))
+            if agora - inicio >= janela:
+                inicio, contagem = agora, 0
+            contagem += 1
+            self._janelas[chave] = (inicio, contagem)
+            while len(self._janelas) > self.max_chaves:
+                self._janelas.popitem(last=False)
+
+            if contagem > max_requisicoes:
+                self.bloqueios += 1
+                return max(1, math.ceil(inicio + janela - agora))
+            return 0
@@ -3,64 +3,187 @@ import sys
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from flask import Flask, send_from_directory
+from flask import Flask
 from flask_cors import CORS
-from src.database import db
-
-# Importar modelos após inicializar db
-from src.models.usuario import Usuario
-from src.models.empresa import Empresa
-from src.models.denuncia import Denuncia, HistoricoDenuncia, CategoriasDenuncia, SubcategoriasDenuncia
-from src.routes.user import user_bp
-from src.routes.auth import auth_bp
-from src.routes.usuarios import usuarios_bp
-from src.routes.empresas import empresas_bp
-from src.routes.denuncias import denuncias_bp
-from src.routes.configuracoes import configuracoes_bp
-from src.routes.relatorios import relatorios_bp
-
-app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
-app.config['SECRET_KEY'] = 'morpheus_secret_key_2025'
-
-# Configurar CORS
-CORS(app, supports_credentials=True)
-
-# Configuração do banco de dados
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-# Inicializar db com app
-db.init_app(app)
-
-# Registrar blueprints
-app.register_blueprint(user_bp, url_prefix='/api')
-app.register_blueprint(auth_bp, url_prefix='/api/auth')
-app.register_blueprint(usuarios_bp, url_prefix='/api')
-app.register_blueprint(empresas_bp, url_prefix='/api')
-app.register_blueprint(denuncias_bp, url_prefix='/api')
-app.register_blueprint(configuracoes_bp, url_prefix='/api')
-app.register_blueprint(relatorios_bp, url_prefix='/api')
-
-# Criar tabelas
-with app.app_context():
-    db.create_all()
-
-@app.route('/', defaults={'path': ''})
-@app.route('/<path:path>')
-def serve(path):
-    static_folder_path = app.static_folder
-    if static_folder_path is None:
-            return "Static folder not configured", 404
-
-    if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
-        return send_from_directory(static_folder_path, path)
-    else:
-        index_path = os.path.join(static_folder_path, 'index.html')
-        if os.path.exists(index_path):
-            return send_from_directory(static_folder_path, 'index.html')
-        else:
-            return "index.html not found", 404
+from werkzeug.middleware.proxy_fix import ProxyFix
+from src.database import db, BIND_REPLICA, configurar_engines, opcoes_engine
+
+def configurar(app):
+    """Configuração a partir das variáveis de ambiente"""
+    app.config['SECRET_KEY'] = 'morpheus_secret_key_2025'
+
+    # Chave secreta da permutação dos protocolos (obrigatória para a aplicação web).
+    # Deve ser a mesma em todos os workers; trocá-la no meio de um dia pode repetir
+    # protocolos já emitidos naquele dia
+    app.config['PROTOCOLO_CHAVE'] = os.environ.get('PROTOCOLO_CHAVE')
+    # Consulta pública por protocolo: requisições por IP a cada janela (s), por worker
+    app.config['PROTOCOLO_LIMITE_REQUISICOES'] = int(os.environ.get('PROTOCOLO_LIMITE_REQUISICOES', 30))
+    app.config['PROTOCOLO_LIMITE_JANELA'] = int(os.environ.get('PROTOCOLO_LIMITE_JANELA', 60))
+    # Proxies reversos confiáveis à frente da aplicação (X-Forwarded-For), ex.: 1 com o nginx
+    app.config['PROXIES_CONFIAVEIS'] = int(os.environ.get('PROXIES_CONFIAVEIS', 0))
+
+    # Configuração do banco de dados
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get(
+        'DATABASE_URL',
+        f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
+    )
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+    # Perfil do PostgreSQL: pool por worker, reciclagem (s), timeouts (s / ms por comando)
+    app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', 5))
+    app.config['DB_MAX_OVERFLOW'] = int(os.environ.get('DB_MAX_OVERFLOW', 5))
+    app.config['DB_POOL_TIMEOUT'] = float(os.environ.get('DB_POOL_TIMEOUT', 10))
+    app.config['DB_POOL_RECYCLE'] = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+    app.config['DB_PRE_PING'] = os.environ.get('DB_PRE_PING', '1') == '1'
+    app.config['DB_STATEMENT_TIMEOUT'] = int(os.environ.get('DB_STATEMENT_TIMEOUT', 30000))
+    app.config['DB_APPLICATION_NAME'] = os.environ.get('DB_APPLICATION_NAME', 'morpheus')
+    app.config['DB_CONNECT_TIMEOUT'] = int(os.environ.get('DB_CONNECT_TIMEOUT', 5))
+    # Mesma variável que o gunicorn usa para o número de workers
+    app.config['DB_WORKERS'] = int(os.environ.get('WEB_CONCURRENCY', 3))
+
+    # Perfil do SQLite: WAL, espera por lock (ms), mmap (bytes) e cache (negativo = KiB)
+    app.config['SQLITE_OTIMIZADO'] = os.environ.get('SQLITE_OTIMIZADO', '1') == '1'
+    app.config['SQLITE_SYNCHRONOUS'] = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    app.config['SQLITE_BUSY_TIMEOUT'] = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))
+    app.config['SQLITE_MMAP_SIZE'] = int(os.environ.get('SQLITE_MMAP_SIZE', 268435456))
+    app.config['SQLITE_CACHE_SIZE'] = int(os.environ.get('SQLITE_CACHE_SIZE', -65536))
+
+    # Réplica de leitura para relatórios e estatísticas: atraso máximo aceito (s),
+    # intervalo entre verificações (s) e janela após uma escrita do usuário em que
+    # as leituras dele continuam no primário (s)
+    app.config['DATABASE_REPLICA_URL'] = os.environ.get('DATABASE_REPLICA_URL')
+    app.config['REPLICA_ATRASO_MAXIMO'] = float(os.environ.get('REPLICA_ATRASO_MAXIMO', 10))
+    app.config['REPLICA_INTERVALO_VERIFICACAO'] = float(os.environ.get('REPLICA_INTERVALO_VERIFICACAO', 5))
+    app.config['REPLICA_JANELA_ESCRITA'] = float(os.environ.get('REPLICA_JANELA_ESCRITA', 30))
+
+    # Relatórios em segundo plano: pasta dos resultados (gzip), threads por worker,
+    # validade dos resultados (s), tempo até uma tarefa parada ser descartada (s)
+    # e timeout por comando das consultas das tarefas no PostgreSQL (ms, 0 = sem limite)
+    app.config['RELATORIOS_TAREFAS_DIR'] = os.environ.get(
+        'RELATORIOS_TAREFAS_DIR',
+        os.path.join(os.path.dirname(__file__), 'database', 'relatorios')
+    )
+    app.config['RELATORIOS_TAREFAS_THREADS'] = int(os.environ.get('RELATORIOS_TAREFAS_THREADS', 2))
+    app.config['RELATORIOS_TAREFAS_TTL'] = int(os.environ.get('RELATORIOS_TAREFAS_TTL', 86400))
+    app.config['RELATORIOS_TAREFAS_TIMEOUT'] = int(os.environ.get('RELATORIOS_TAREFAS_TIMEOUT', 1800))
+    app.config['RELATORIOS_TAREFAS_STATEMENT_TIMEOUT'] = int(os.environ.get('RELATORIOS_TAREFAS_STATEMENT_TIMEOUT', 0))
+
+    # Cache dos relatórios por worker: itens, memória total (bytes) e validade (s)
+    app.config['RELATORIOS_CACHE_MAX_ITENS'] = int(os.environ.get('RELATORIOS_CACHE_MAX_ITENS', 256))
+    app.config['RELATORIOS_CACHE_MAX_BYTES'] = int(os.environ.get('RELATORIOS_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+    app.config['RELATORIOS_CACHE_TTL'] = int(os.environ.get('RELATORIOS_CACHE_TTL', 600))
+
+    # Hash de senhas em processos dedicados (SENHA_METODO segue o formato do Werkzeug,
+    # ex.: scrypt ou pbkdf2:sha256:600000)
+    app.config['SENHA_METODO'] = os.environ.get('SENHA_METODO', 'scrypt')
+    app.config['SENHA_PROCESSOS'] = int(os.environ.get('SENHA_PROCESSOS', 2))
+    app.config['SENHA_CONCORRENCIA_MAXIMA'] = int(os.environ.get('SENHA_CONCORRENCIA_MAXIMA', 8))
+    app.config['SENHA_TIMEOUT'] = float(os.environ.get('SENHA_TIMEOUT', 10))
+
+    # Fila durável para denúncias anônimas (gravadas no banco por um escritor em segundo plano)
+    app.config['FILA_DENUNCIAS_ATIVA'] = os.environ.get('FILA_DENUNCIAS_ATIVA', '0') == '1'
+    app.config['FILA_DENUNCIAS_ARQUIVO'] = os.environ.get(
+        'FILA_DENUNCIAS_ARQUIVO',
+        os.path.join(os.path.dirname(__file__), 'database', 'fila_denuncias.db')
+    )
+    # Quem drena a fila: 'worker' (uma thread em cada worker, desde a inicialização)
+    # ou 'dedicado' (só o processo drenar_fila_denuncias.py)
+    app.config['FILA_DENUNCIAS_ESCRITOR'] = os.environ.get('FILA_DENUNCIAS_ESCRITOR', 'worker')
+
+def registrar_rotas(app):
+    """Importar e registrar os blueprints (e, com eles, os modelos)"""
+    from src import sessao
+    from src.replica import monitor_replica
+    from src.tarefas import tarefas_relatorio
+    from src import cache_relatorios
+    from src.fila_denuncias import fila_denuncias
+    from src.protocolo import gerador_protocolo
+    from src.estaticos import arquivos_estaticos
+    from src.routes.user import user_bp
+    from src.routes.auth import auth_bp
+    from src.routes.usuarios import usuarios_bp
+    from src.routes.empresas import empresas_bp
+    from src.routes.denuncias import denuncias_bp
+    from src.routes.configuracoes import configuracoes_bp
+    from src.routes.relatorios import relatorios_bp
+
+    # Sem PROTOCOLO_CHAVE a aplicação não sobe
+    gerador_protocolo.init_app(app)
+
+    # Carregar usuário autenticado uma vez por requisição (com cache entre requisições)
+    sessao.init_app(app)
+
+    # Rotas de relatório leem da réplica quando ela está configurada e em dia
+    monitor_replica.init_app(app)
+
+    # Índice e pasta de resultados dos relatórios em segundo plano
+    tarefas_relatorio.init_app(app)
+    cache_relatorios.init_app(app)
+
+    if app.config['FILA_DENUNCIAS_ATIVA']:
+        fila_denuncias.init_app(app)
+
+    app.register_blueprint(user_bp, url_prefix='/api')
+    app.register_blueprint(auth_bp, url_prefix='/api/auth')
+    app.register_blueprint(usuarios_bp, url_prefix='/api')
+    app.register_blueprint(empresas_bp, url_prefix='/api')
+    app.register_blueprint(denuncias_bp, url_prefix='/api')
+    app.register_blueprint(configuracoes_bp, url_prefix='/api')
+    app.register_blueprint(relatorios_bp, url_prefix='/api')
+
+    # Índice do build do frontend (montado uma vez; index.html fica em memória)
+    arquivos_estaticos.init_app(app)
+
+    @app.route('/', defaults={'path': ''})
+    @app.route('/<path:path>')
+    def serve(path):
+        return arquivos_estaticos.responder(path)
+
+def create_app(config=None, rotas=True):
+    """Criar a aplicação
+
+    Não executa DDL: o esquema é mantido pelas migrações (create_db.py),
+    executadas uma vez fora dos workers. Scripts que só precisam do banco
+    podem usar rotas=False e não carregam blueprints nem o frontend.
+    """
+    app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
+    configurar(app)
+    if config:
+        app.config.update(config)
+
+    # Configurar CORS
+    CORS(app, supports_credentials=True)
+
+    # IP real do cliente atrás do proxy reverso (usado nos limites por IP)
+    if app.config['PROXIES_CONFIAVEIS']:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXIES_CONFIAVEIS'])
+
+    # Inicializar db com app
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = dict(
+        opcoes_engine(app.config), **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+    )
+    replica = app.config.get('DATABASE_REPLICA_URL')
+    if replica:
+        app.config['SQLALCHEMY_BINDS'] = dict(
+            app.config.get('SQLALCHEMY_BINDS') or {},
+            **{BIND_REPLICA: dict(opcoes_engine(app.config, replica), url=replica)}
+        )
+    db.init_app(app)
+    configurar_engines(app)
+
+    if rotas:
+        registrar_rotas(app)
+
+    return app
 
 
 if __name__ == '__main__':
+    from src.migracoes import aplicar_migracoes
+
+    app = create_app()
+
+    # Em desenvolvimento o banco local é atualizado antes de subir o servidor
+    with app.app_context():
+        aplicar_migracoes(db.engine)
+
     app.run(host='0.0.0.0', port=5000, debug=True)
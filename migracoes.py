@@ -0,0 +1,248 @@
+from sqlalchemy import (
+    JSON, Boolean, Column, Date, DateTime, Float, ForeignKey, Index, Integer, MetaData, String, Table, Text,
+    UniqueConstraint, inspect, text
+)
+from src.models.denuncia import ContadorDenuncias, ResumoDiarioDenuncias
+from src.busca import instalar_indice_busca
+from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+DDL_VERSAO_ESQUEMA = """CREATE TABLE IF NOT EXISTS versao_esquema (
+    versao INTEGER PRIMARY KEY,
+    descricao VARCHAR(255) NOT NULL,
+    aplicada_em TIMESTAMP NOT NULL
+)"""
+
+# Esquema das migrações 1 e 2, congelado como estava quando elas foram criadas.
+# Não usa os modelos: mudanças neles entram em novas migrações numeradas
+ESQUEMA_INICIAL = MetaData()
+
+Table(
+    'empresas', ESQUEMA_INICIAL,
+    Column('id', Integer, primary_key=True),
+    Column('nome', String(255), nullable=False),
+    Column('cnpj', String(18), unique=True, nullable=False),
+    Column('status', String(20)),
+    Column('logo_url', String(500)),
+    Column('cores_personalizadas', JSON),
+    Column('data_criacao', DateTime),
+    Column('data_atualizacao', DateTime),
+)
+
+Table(
+    'usuarios', ESQUEMA_INICIAL,
+    Column('id', Integer, primary_key=True),
+    Column('email', String(255), unique=True, nullable=False),
+    Column('nome', String(255), nullable=False),
+    Column('senha_hash', String(255), nullable=False),
+    Column('perfil', String(50), nullable=False),
+    Column('empresa_id', Integer, ForeignKey('empresas.id'), nullable=True),
+    Column('ativo', Boolean),
+    Column('data_criacao', DateTime),
+    Column('data_atualizacao', DateTime),
+    Column('ultimo_login', DateTime),
+)
+
+Table(
+    'denuncias', ESQUEMA_INICIAL,
+    Column('id', Integer, primary_key=True),
+    Column('protocolo', String(20), unique=True, nullable=False),
+    Column('titulo', String(200), nullable=False),
+    Column('descricao', Text, nullable=False),
+    Column('categoria', String(100), nullable=False),
+    Column('subcategoria', String(100)),
+    Column('status', String(20)),
+    Column('prioridade', String(20)),
+    Column('anonima', Boolean),
+    Column('usuario_id', Integer, ForeignKey('usuarios.id'), nullable=True),
+    Column('empresa_id', Integer, ForeignKey('empresas.id'), nullable=False),
+    Column('responsavel_id', Integer, ForeignKey('usuarios.id'), nullable=True),
+    Column('data_criacao', DateTime, nullable=False),
+    Column('data_atualizacao', DateTime),
+    Column('data_resolucao', DateTime, nullable=True),
+    Column('origem', String(50)),
+    Column('ip_origem', String(45)),
+    Index('ix_denuncias_empresa_data', 'empresa_id', 'data_criacao'),
+    Index('ix_denuncias_empresa_status', 'empresa_id', 'status'),
+    Index('ix_denuncias_empresa_categoria', 'empresa_id', 'categoria'),
+    Index('ix_denuncias_empresa_prioridade', 'empresa_id', 'prioridade'),
+    Index('ix_denuncias_usuario_data', 'usuario_id', 'data_criacao'),
+    Index('ix_denuncias_data_criacao', 'data_criacao'),
+)
+
+Table(
+    'historico_denuncias', ESQUEMA_INICIAL,
+    Column('id', Integer, primary_key=True),
+    Column('denuncia_id', Integer, ForeignKey('denuncias.id'), nullable=False),
+    Column('usuario_id', Integer, ForeignKey('usuarios.id'), nullable=True),
+    Column('acao', String(100), nullable=False),
+    Column('descricao', Text),
+    Column('status_anterior', String(20)),
+    Column('status_novo', String(20)),
+    Column('data_acao', DateTime, nullable=False),
+    Index('ix_historico_denuncias_denuncia_data', 'denuncia_id', 'data_acao'),
+)
+
+Table(
+    'sequencias_protocolo', ESQUEMA_INICIAL,
+    Column('dia', String(8), primary_key=True),
+    Column('proximo', Integer, nullable=False),
+)
+
+Table(
+    'contadores_denuncias', ESQUEMA_INICIAL,
+    Column('id', Integer, primary_key=True),
+    Column('empresa_id', Integer, ForeignKey('empresas.id'), nullable=False),
+    Column('status', String(20), nullable=False),
+    Column('categoria', String(100), nullable=False),
+    Column('prioridade', String(20), nullable=False),
+    Column('total', Integer, nullable=False),
+    UniqueConstraint('empresa_id', 'status', 'categoria', 'prioridade', name='_contador_denuncias_uc'),
+)
+
+Table(
+    'versoes_dados', ESQUEMA_INICIAL,
+    Column('chave', String(100), primary_key=True),
+    Column('versao', Integer, nullable=False),
+)
+
+Table(
+    'categorias_denuncia', ESQUEMA_INICIAL,
+    Column('id', Integer, primary_key=True),
+    Column('nome', String(100), nullable=False),
+    Column('descricao', Text),
+    Column('ativa', Boolean),
+    Column('ordem', Integer),
+    Column('empresa_id', Integer, ForeignKey('empresas.id'), nullable=True),
+    Column('data_criacao', DateTime),
+)
+
+Table(
+    'subcategorias_denuncia', ESQUEMA_INICIAL,
+    Column('id', Integer, primary_key=True),
+    Column('categoria_id', Integer, ForeignKey('categorias_denuncia.id'), nullable=False),
+    Column('nome', String(100), nullable=False),
+    Column('descricao', Text),
+    Column('ativa', Boolean),
+    Column('ordem', Integer),
+    Column('data_criacao', DateTime),
+)
+
+# Tabela da migração 6, também congelada
+RESUMOS_DIARIOS = Table(
+    'resumos_diarios_denuncias', MetaData(),
+    Column('id', Integer, primary_key=True),
+    Column('dia', Date, nullable=False),
+    Column('empresa_id', Integer, ForeignKey(ESQUEMA_INICIAL.tables['empresas'].c.id), nullable=False),
+    Column('categoria', String(100), nullable=False),
+    Column('subcategoria', String(100), nullable=False),
+    Column('status', String(20), nullable=False),
+    Column('prioridade', String(20), nullable=False),
+    Column('origem', String(50), nullable=False),
+    Column('total', Integer, nullable=False),
+    Column('resolvidas', Integer, nullable=False),
+    Column('horas_resolucao', Float, nullable=False),
+    UniqueConstraint(
+        'dia', 'empresa_id', 'categoria', 'subcategoria', 'status', 'prioridade', 'origem',
+        name='_resumo_diario_denuncias_uc'
+    ),
+    Index('ix_resumos_diarios_empresa_dia', 'empresa_id', 'dia'),
+    Index('ix_resumos_diarios_dia', 'dia'),
+)
+
+def criar_tabelas(conexao):
+    """Criar as tabelas ausentes do esquema inicial (com seus índices)"""
+    ESQUEMA_INICIAL.create_all(conexao)
+
+def criar_indices_denuncias(conexao):
+    """Índices compostos de denúncias e histórico em tabelas criadas antes deles"""
+    for nome in ('denuncias', 'historico_denuncias'):
+        for indice in ESQUEMA_INICIAL.tables[nome].indexes:
+            indice.create(bind=conexao, checkfirst=True)
+
+def adicionar_ordem_categorias(conexao):
+    """Coluna ordem em categorias e subcategorias"""
+    for tabela in ('categorias_denuncia', 'subcategorias_denuncia'):
+        colunas = [coluna['name'] for coluna in inspect(conexao).get_columns(tabela)]
+        if 'ordem' not in colunas:
+            conexao.execute(text(f"ALTER TABLE {tabela} ADD COLUMN ordem INTEGER DEFAULT 0"))
+
+def historico_usuario_opcional(conexao):
+    """Permitir histórico sem usuário (denúncias anônimas)"""
+    tabela = ESQUEMA_INICIAL.tables['historico_denuncias']
+    coluna = next(c for c in inspect(conexao).get_columns(tabela.name) if c['name'] == 'usuario_id')
+    if coluna['nullable']:
+        return
+
+    if conexao.dialect.name == 'postgresql':
+        conexao.execute(text(f"ALTER TABLE {tabela.name} ALTER COLUMN usuario_id DROP NOT NULL"))
+        return
+
+    # SQLite não altera restrições de colunas: recriar a tabela e copiar as linhas
+    for indice in tabela.indexes:
+        indice.drop(bind=conexao, checkfirst=True)
+    conexao.execute(text(f"ALTER TABLE {tabela.name} RENAME TO {tabela.name}_antiga"))
+    tabela.create(bind=conexao)
+    colunas = ', '.join(coluna.name for coluna in tabela.columns)
+    conexao.execute(text(
+        f"INSERT INTO {tabela.name} ({colunas}) SELECT {colunas} FROM {tabela.name}_antiga"
+    ))
+    conexao.execute(text(f"DROP TABLE {tabela.name}_antiga"))
+
+def criar_resumos_diarios(conexao):
+    """Tabela de resumos diários de denúncias, preenchida a partir das existentes"""
+    RESUMOS_DIARIOS.create(bind=conexao, checkfirst=True)
+    ResumoDiarioDenuncias.reconstruir(conexao=conexao)
+
+def preencher_contadores(conexao):
+    """Contadores de estatísticas a partir das denúncias existentes"""
+    ContadorDenuncias.reconstruir(conexao=conexao)
+
+def indice_status_data(conexao):
+    """Índice (empresa_id, status, data_criacao), que substitui o de (empresa_id, status)"""
+    conexao.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_denuncias_empresa_status_data ON denuncias (empresa_id, status, data_criacao)"
+    ))
+    conexao.execute(text("DROP INDEX IF EXISTS ix_denuncias_empresa_status"))
+
+# Migrações em ordem; uma versão aplicada nunca é reexecutada nem alterada
+MIGRACOES = [
+    (1, 'Tabelas iniciais', criar_tabelas),
+    (2, 'Índices compostos de denúncias e histórico', criar_indices_denuncias),
+    (3, 'Coluna ordem em categorias e subcategorias', adicionar_ordem_categorias),
+    (4, 'Histórico sem usuário em denúncias anônimas', historico_usuario_opcional),
+    (5, 'Índice de busca textual', instalar_indice_busca),
+    (6, 'Resumos diários de denúncias', criar_resumos_diarios),
+    (7, 'Contadores de estatísticas das denúncias existentes', preencher_contadores),
+    (8, 'Índice de denúncias por empresa, status e data', indice_status_data),
+]
+
+def versoes_aplicadas(engine):
+    """Versões já registradas em versao_esquema"""
+    with engine.begin() as conexao:
+        conexao.execute(text(DDL_VERSAO_ESQUEMA))
+        return set(conexao.execute(text("SELECT versao FROM versao_esquema")).scalars())
+
+def migracoes_pendentes(engine):
+    aplicadas = versoes_aplicadas(engine)
+    return [migracao for migracao in MIGRACOES if migracao[0] not in aplicadas]
+
+def aplicar_migracoes(engine):
+    """Aplicar as migrações pendentes, cada uma em sua própria transação
+
+    Deve ser executada uma única vez por deploy (create_db.py), antes de
+    iniciar os workers. Retorna as versões aplicadas.
+    """
+    aplicadas = []
+    for versao, descricao, migracao in migracoes_pendentes(engine):
+        logger.info("Aplicando migração %s: %s", versao, descricao)
+        with engine.begin() as conexao:
+            migracao(conexao)
+            conexao.execute(
+                text("INSERT INTO versao_esquema (versao, descricao, aplicada_em) VALUES (:versao, :descricao, :agora)"),
+                {'versao': versao, 'descricao': descricao, 'agora': datetime.utcnow()}
+            )
+        aplicadas.append(versao)
+    return aplicadas
@@ -0,0 +1,52 @@
+from datetime import datetime
+from functools import lru_cache
+from src.models.usuario import Usuario
+from src.models.empresa import Empresa
+from src.models.denuncia import Denuncia
+
+# Campos devolvidos por padrão em cada listagem (mesma ordem do to_dict do modelo)
+CAMPOS_DENUNCIA = (
+    'id', 'protocolo', 'titulo', 'descricao', 'categoria', 'subcategoria', 'status',
+    'prioridade', 'anonima', 'usuario_id', 'empresa_id', 'responsavel_id', 'data_criacao',
+    'data_atualizacao', 'data_resolucao', 'origem', 'ip_origem'
+)
+CAMPOS_USUARIO = ('id', 'email', 'nome', 'perfil', 'empresa_id', 'ativo', 'data_criacao', 'ultimo_login')
+CAMPOS_EMPRESA = (
+    'id', 'nome', 'cnpj', 'status', 'logo_url', 'cores_personalizadas', 'data_criacao', 'data_atualizacao'
+)
+
+CAMPOS_POR_MODELO = {
+    Denuncia: CAMPOS_DENUNCIA,
+    Usuario: CAMPOS_USUARIO,
+    Empresa: CAMPOS_EMPRESA,
+}
+
+def campos_solicitados(modelo, parametro):
+    """Campos pedidos em ?fields=a,b,c (todos os campos padrão se ausente)
+
+    Gera ValueError para campos desconhecidos.
+    """
+    disponiveis = CAMPOS_POR_MODELO[modelo]
+    if not parametro:
+        return disponiveis
+
+    if isinstance(parametro, str):
+        parametro = parametro.split(',')
+    campos = tuple(dict.fromkeys(campo.strip() for campo in parametro if campo.strip()))
+
+    invalidos = [campo for campo in campos if campo not in disponiveis]
+    if invalidos:
+        raise ValueError(f"Campos inválidos em fields: {', '.join(invalidos)}")
+    return campos or disponiveis
+
+@lru_cache(maxsize=256)
+def colunas(modelo, campos):
+    """Colunas rotuladas com o nome de cada campo (mesmos objetos a cada chamada)"""
+    return tuple(getattr(modelo, campo).label(campo) for campo in campos)
+
+def serializar(linha, campos):
+    """Converter uma linha da projeção em dicionário pronto para JSON"""
+    return {
+        campo: valor.isoformat() if isinstance(valor, datetime) else valor
+        for campo, valor in zip(campos, linha)
+    }
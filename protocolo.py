@@ -0,0 +1,96 @@
+from flask import current_app
+from src.database import db, insert_com_conflito
+from src.models.denuncia import SequenciaProtocolo
+from datetime import datetime
+from threading import Lock
+import hashlib
+import hmac
+
+# Alfabeto Base32 de Crockford (sem I, L, O e U, evitando confusão na leitura)
+ALFABETO = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+
+# Sufixo de 9 caracteres Base32 (45 bits); a permutação usa 44 bits em duas metades
+BITS_METADE = 22
+MASCARA_METADE = (1 << BITS_METADE) - 1
+RODADAS = 4
+TAMANHO_SUFIXO = 9
+
+class GeradorProtocolo:
+    """Gera protocolos únicos sem consultar o banco a cada denúncia
+
+    Cada processo reserva blocos da sequência diária (um UPDATE por bloco).
+    O número sequencial passa por uma permutação Feistel com chave secreta,
+    então protocolos distintos nunca colidem e não são previsíveis a partir
+    de um protocolo conhecido.
+    """
+    
+    def __init__(self, tamanho_bloco=100):
+        self.tamanho_bloco = tamanho_bloco
+        self._dia = None
+        self._proximo = 0
+        self._limite = 0
+        self._lock = Lock()
+    
+    def init_app(self, app):
+        """Exigir a chave da permutação já na inicialização"""
+        chave_protocolo(app.config)
+    
+    def reservar_bloco(self, dia):
+        """Reservar o próximo bloco da sequência do dia, fora da transação da requisição"""
+        insert = insert_com_conflito()
+        stmt = insert(SequenciaProtocolo).values(dia=dia, proximo=self.tamanho_bloco)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['dia'],
+            set_={'proximo': SequenciaProtocolo.proximo + self.tamanho_bloco}
+        ).returning(SequenciaProtocolo.proximo)
+        
+        with db.engine.begin() as conexao:
+            limite = conexao.execute(stmt).scalar()
+        return limite - self.tamanho_bloco, limite
+    
+    def proximo_numero(self, dia):
+        """Próximo número livre da sequência do dia"""
+        with self._lock:
+            if self._dia != dia or self._proximo >= self._limite:
+                self._proximo, self._limite = self.reservar_bloco(dia)
+                self._dia = dia
+            
+            numero = self._proximo
+            self._proximo += 1
+            return numero
+    
+    def gerar(self):
+        """Gerar um novo protocolo no formato DEN<AAAAMMDD><9 caracteres>"""
+        dia = datetime.utcnow().strftime('%Y%m%d')
+        numero = self.proximo_numero(dia)
+        chave = chave_protocolo(current_app.config) + dia.encode('ascii')
+        return f"DEN{dia}{codificar(permutar(numero, chave))}"
+
+def chave_protocolo(config):
+    """Chave secreta da permutação (PROTOCOLO_CHAVE); RuntimeError se não estiver configurada"""
+    chave = config.get('PROTOCOLO_CHAVE')
+    if not chave:
+        raise RuntimeError('PROTOCOLO_CHAVE não configurada: defina a variável de ambiente com um valor secreto')
+    return chave.encode('utf-8')
+
+def permutar(numero, chave):
+    """Permutação Feistel de 44 bits (bijetora: números distintos geram valores distintos)"""
+    esquerda = (numero >> BITS_METADE) & MASCARA_METADE
+    direita = numero & MASCARA_METADE
+    
+    for rodada in range(RODADAS):
+        mensagem = bytes([rodada]) + direita.to_bytes(4, 'big')
+        f = int.from_bytes(hmac.new(chave, mensagem, hashlib.sha256).digest()[:4], 'big') & MASCARA_METADE
+        esquerda, direita = direita, esquerda ^ f
+    
+    return (esquerda << BITS_METADE) | direita
+
+def codificar(valor):
+    """Codificar em Base32 de Crockford com tamanho fixo"""
+    caracteres = []
+    for _ in range(TAMANHO_SUFIXO):
+        caracteres.append(ALFABETO[valor & 31])
+        valor >>= 5
+    return ''.join(reversed(caracteres))
+
+gerador_protocolo = GeradorProtocolo()
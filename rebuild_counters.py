@@ -0,0 +1,30 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from src.main import create_app
+from src.database import db
+from src.models.denuncia import ContadorDenuncias
+
+app = create_app(rotas=False)
+
+def rebuild_counters(apenas_verificar=False):
+    """Reconciliar os contadores de estatísticas com a tabela de denúncias"""
+    with app.app_context():
+        divergencias = ContadorDenuncias.divergencias()
+        for item in divergencias:
+            empresa_id, status, categoria, prioridade = item['chave']
+            print(f"Empresa {empresa_id} / {status} / {categoria} / {prioridade}: "
+                  f"contador={item['contador']} real={item['real']}")
+        
+        if apenas_verificar:
+            print(f"{len(divergencias)} divergência(s) encontrada(s).")
+            return 1 if divergencias else 0
+        
+        grupos = ContadorDenuncias.reconstruir()
+        db.session.commit()
+        print(f"Contadores reconstruídos com sucesso! ({grupos} grupo(s))")
+        return 0
+
+if __name__ == "__main__":
+    sys.exit(rebuild_counters(apenas_verificar='--verificar' in sys.argv))
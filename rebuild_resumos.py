@@ -0,0 +1,66 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from src.main import create_app
+from src.database import db
+from src.models.denuncia import Denuncia, ResumoDiarioDenuncias
+from datetime import date, timedelta
+import argparse
+
+app = create_app(rotas=False)
+
+def proximo_mes(dia):
+    return (dia.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+def rebuild_resumos(inicio=None, fim=None, apenas_verificar=False):
+    """Reconciliar os resumos diários com a tabela de denúncias nos dias [inicio, fim)
+
+    O preenchimento é feito um mês por transação, para não manter uma
+    transação longa aberta em bases grandes.
+    """
+    with app.app_context():
+        divergencias = ResumoDiarioDenuncias.divergencias(inicio, fim)
+        for item in divergencias:
+            dia, empresa_id, categoria, subcategoria, status, prioridade, origem = item['chave']
+            print(f"{dia} / Empresa {empresa_id} / {categoria} / {subcategoria} / {status} / "
+                  f"{prioridade} / {origem}: resumo={item['resumo']} real={item['real']}")
+        
+        if apenas_verificar:
+            print(f"{len(divergencias)} divergência(s) encontrada(s).")
+            return 1 if divergencias else 0
+        
+        primeira, ultima = db.session.query(
+            db.func.min(Denuncia.data_criacao), db.func.max(Denuncia.data_criacao)
+        ).one()
+        if primeira is None:
+            ResumoDiarioDenuncias.reconstruir(inicio, fim)
+            db.session.commit()
+            print("Nenhuma denúncia encontrada; resumos do período removidos.")
+            return 0
+        
+        # Resumos fora do intervalo das denúncias (ex.: denúncias removidas) também são refeitos
+        primeiro_resumo, ultimo_resumo = db.session.query(
+            db.func.min(ResumoDiarioDenuncias.dia), db.func.max(ResumoDiarioDenuncias.dia)
+        ).one()
+        inicio = inicio or min(filter(None, [primeira.date(), primeiro_resumo]))
+        fim = fim or max(filter(None, [ultima.date(), ultimo_resumo])) + timedelta(days=1)
+        grupos = 0
+        trecho = inicio
+        while trecho < fim:
+            fim_trecho = min(proximo_mes(trecho), fim)
+            grupos += ResumoDiarioDenuncias.reconstruir(trecho, fim_trecho)
+            db.session.commit()
+            print(f"{trecho} a {fim_trecho - timedelta(days=1)}: resumos reconstruídos")
+            trecho = fim_trecho
+        print(f"Resumos diários reconstruídos com sucesso! ({grupos} grupo(s))")
+        return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Reconstruir ou verificar os resumos diários de denúncias')
+    parser.add_argument('--inicio', type=date.fromisoformat, help='Primeiro dia (AAAA-MM-DD)')
+    parser.add_argument('--fim', type=date.fromisoformat, help='Último dia, inclusive (AAAA-MM-DD)')
+    parser.add_argument('--verificar', action='store_true', help='Apenas listar as divergências')
+    args = parser.parse_args()
+    fim = args.fim + timedelta(days=1) if args.fim else None
+    sys.exit(rebuild_resumos(args.inicio, fim, args.verificar))
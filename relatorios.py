@@ -1,27 +1,96 @@
-from flask import Blueprint, request, jsonify, session
-from src.database import db
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context, url_for
+from src.database import db, relatorio_pool
+from src.sessao import require_auth, get_current_user
+from src.escopo import AcessoNegado, consulta_escopo
+from src.condicional import gerar_etag, resposta_condicional
+from src.replica import leitura_replica, monitor_replica
+from src.tarefas import tarefas_relatorio
+from src.cache_relatorios import cache_relatorios, escopo_relatorio, normalizar_parametros, relatorio_em_cache
+from src.projecao import campos_solicitados, colunas, serializar
+from src.resumos import agregados_periodo
+from src.routes.denuncias import parametros_paginacao
 from src.models.usuario import Usuario
 from src.models.empresa import Empresa
-from src.models.denuncia import Denuncia, CategoriasDenuncia
+from src.models.denuncia import Denuncia
 from datetime import datetime, timedelta
-from sqlalchemy import func, and_, or_
+from sqlalchemy import func, case, select
+import csv
+import io
 import json
 
 relatorios_bp = Blueprint('relatorios', __name__)
 
-def require_auth():
-    """Decorator para verificar autenticação"""
-    if 'user_id' not in session:
-        return jsonify({'error': 'Usuário não autenticado'}), 401
-    return None
+# Janelas aceitas para a tendência diária do dashboard
+JANELAS_TENDENCIA = (7, 30, 90, 365)
+
+# Quantidade de linhas lidas do cursor do banco por vez nas exportações
+TAMANHO_LOTE_EXPORTACAO = 1000
+
+# Colunas da exportação CSV
+COLUNAS_CSV = [
+    ('Protocolo', lambda d: d.protocolo),
+    ('Título', lambda d: d.titulo),
+    ('Categoria', lambda d: d.categoria),
+    ('Subcategoria', lambda d: d.subcategoria),
+    ('Status', lambda d: d.status),
+    ('Prioridade', lambda d: d.prioridade),
+    ('Data Criação', lambda d: d.data_criacao.strftime('%d/%m/%Y %H:%M') if d.data_criacao else ''),
+    ('Anônima', lambda d: 'Sim' if d.anonima else 'Não'),
+    ('Origem', lambda d: d.origem),
+]
+
+# Campos lidos do banco para a exportação CSV
+CAMPOS_CSV = ('protocolo', 'titulo', 'categoria', 'subcategoria', 'status', 'prioridade', 'data_criacao', 'anonima', 'origem')
+
+# Status possíveis de uma denúncia
+STATUS_DENUNCIA = ['recebida', 'em_analise', 'concluida', 'arquivada']
+
+# Campos aceitos para ordenar as métricas por empresa
+ORDENACOES_METRICAS = ['nome', 'total_denuncias', 'total_usuarios', 'denuncias_30_dias'] + STATUS_DENUNCIA
 
-def get_current_user():
-    """Obter usuário atual da sessão"""
-    if 'user_id' not in session:
-        return None
-    return Usuario.query.get(session['user_id'])
+# Filtros aceitos pelos relatórios (os dois últimos são datas)
+FILTROS_RELATORIO = ('empresa_id', 'status', 'categoria', 'prioridade', 'data_inicio', 'data_fim')
+
+# Parâmetros de paginação e ordenação das métricas por empresa
+PARAMETROS_METRICAS = ('page', 'per_page', 'ordenar_por', 'ordem')
+
+# Formatos aceitos pela exportação e seus tipos de conteúdo
+FORMATOS_EXPORTACAO = {'json': 'application/json', 'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+# Quantidade máxima de denúncias devolvidas pelo relatório detalhado
+LIMITE_AMOSTRA_DETALHADO = 100
+
+def gerar_csv(query):
+    """Gerar o CSV em blocos, lendo as denúncias do cursor em lotes fixos"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    
+    writer.writerow([nome for nome, _ in COLUNAS_CSV])
+    linhas = 0
+    for denuncia in db.session.execute(query, execution_options={'yield_per': TAMANHO_LOTE_EXPORTACAO}):
+        writer.writerow([valor(denuncia) for _, valor in COLUNAS_CSV])
+        linhas += 1
+        if linhas % TAMANHO_LOTE_EXPORTACAO == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+    
+    yield buffer.getvalue()
+
+def gerar_ndjson(query, campos):
+    """Gerar uma denúncia JSON por linha, em blocos de tamanho fixo"""
+    bloco = []
+    for denuncia in db.session.execute(query, execution_options={'yield_per': TAMANHO_LOTE_EXPORTACAO}):
+        bloco.append(json.dumps(serializar(denuncia, campos), ensure_ascii=False))
+        if len(bloco) == TAMANHO_LOTE_EXPORTACAO:
+            yield '\n'.join(bloco) + '\n'
+            bloco = []
+    
+    if bloco:
+        yield '\n'.join(bloco) + '\n'
 
 @relatorios_bp.route('/relatorios/dashboard', methods=['GET'])
+@leitura_replica
 def relatorio_dashboard():
     """Relatório para o dashboard principal"""
     auth_error = require_auth()
@@ -33,92 +102,152 @@ def relatorio_dashboard():
         if not usuario_atual:
             return jsonify({'error': 'Usuário não encontrado'}), 404
         
-        # Filtrar denúncias baseado no perfil do usuário
-        query_base = Denuncia.query
-        
-        if usuario_atual.perfil == 'super_admin':
-            # Super Admin vê todas as denúncias
-            pass
-        elif usuario_atual.perfil in ['admin_cliente', 'auditoria', 'gerente']:
-            # Usuários da empresa veem apenas denúncias da própria empresa
-            query_base = query_base.filter(Denuncia.empresa_id == usuario_atual.empresa_id)
-        elif usuario_atual.perfil == 'cliente':
-            # Cliente vê apenas suas próprias denúncias ou anônimas
-            query_base = query_base.filter(
-                or_(
-                    Denuncia.usuario_id == usuario_atual.id,
-                    and_(Denuncia.anonima == True, Denuncia.empresa_id == usuario_atual.empresa_id)
-                )
+        # Janela da tendência diária (em dias)
+        try:
+            dias = int(request.args.get('dias', 30))
+        except ValueError:
+            return jsonify({'error': 'Parâmetro dias inválido'}), 400
+        if dias not in JANELAS_TENDENCIA:
+            return jsonify({'error': f'Parâmetro dias deve ser um de {list(JANELAS_TENDENCIA)}'}), 400
+        
+        # Versão dos dados visíveis: soma de todas as empresas (Super Admin) ou a da empresa do usuário
+        try:
+            escopo, versao = escopo_relatorio(usuario_atual)
+        except AcessoNegado:
+            return jsonify({'error': 'Acesso negado'}), 403
+        
+        agora = datetime.utcnow()
+        hoje = agora.replace(hour=0, minute=0, second=0, microsecond=0)
+        
+        def montar():
+            # Contagens agrupadas, todas restritas ao escopo do perfil do usuário
+            def contar_por(coluna):
+                query = consulta_escopo(lambda: select(coluna, func.count(Denuncia.id)), usuario_atual)
+                query += lambda s: s.group_by(coluna)
+                return dict(db.session.execute(query).all())
+            
+            # Por status (o total geral é a soma dos grupos)
+            stats_status = contar_por(Denuncia.status)
+            
+            total_denuncias = sum(stats_status.values())
+            
+            # Por prioridade
+            stats_prioridade = contar_por(Denuncia.prioridade)
+            
+            # Por categoria
+            stats_categoria = contar_por(Denuncia.categoria)
+            
+            # Tendência diária em uma única consulta agrupada por dia
+            data_limite = hoje - timedelta(days=dias - 1)
+            
+            dia = func.date(Denuncia.data_criacao)
+            query = consulta_escopo(
+                lambda: select(dia, func.count(Denuncia.id)),
+                usuario_atual,
+                data_inicio=data_limite
+            )
+            query += lambda s: s.group_by(dia)
+            contagens_diarias = dict(
+                (str(data), count)
+                for data, count in db.session.execute(query).all()
             )
-        
-        # Estatísticas gerais
-        total_denuncias = query_base.count()
-        
-        # Por status
-        stats_status = {}
-        status_counts = query_base.with_entities(
-            Denuncia.status, 
-            func.count(Denuncia.id)
-        ).group_by(Denuncia.status).all()
-        
-        for status, count in status_counts:
-            stats_status[status] = count
-        
-        # Por prioridade
-        stats_prioridade = {}
-        prioridade_counts = query_base.with_entities(
-            Denuncia.prioridade, 
-            func.count(Denuncia.id)
-        ).group_by(Denuncia.prioridade).all()
-        
-        for prioridade, count in prioridade_counts:
-            stats_prioridade[prioridade] = count
-        
-        # Por categoria
-        stats_categoria = {}
-        categoria_counts = query_base.with_entities(
-            Denuncia.categoria, 
-            func.count(Denuncia.id)
-        ).group_by(Denuncia.categoria).all()
-        
-        for categoria, count in categoria_counts:
-            stats_categoria[categoria] = count
-        
-        # Tendência dos últimos 30 dias
-        data_limite = datetime.utcnow() - timedelta(days=30)
-        tendencia_query = query_base.filter(Denuncia.data_criacao >= data_limite)
-        
-        tendencia_diaria = {}
-        for i in range(30):
-            data = datetime.utcnow() - timedelta(days=i)
-            data_inicio = data.replace(hour=0, minute=0, second=0, microsecond=0)
-            data_fim = data_inicio + timedelta(days=1)
             
-            count = tendencia_query.filter(
-                and_(
-                    Denuncia.data_criacao >= data_inicio,
-                    Denuncia.data_criacao < data_fim
-                )
-            ).count()
+            # Preencher com zero os dias sem denúncias (mais recente primeiro)
+            tendencia_diaria = {}
+            for i in range(dias):
+                data = (hoje - timedelta(days=i)).strftime('%Y-%m-%d')
+                tendencia_diaria[data] = contagens_diarias.get(data, 0)
             
-            tendencia_diaria[data.strftime('%Y-%m-%d')] = count
-        
-        return jsonify({
-            'total_denuncias': total_denuncias,
-            'por_status': stats_status,
-            'por_prioridade': stats_prioridade,
-            'por_categoria': stats_categoria,
-            'tendencia_30_dias': tendencia_diaria,
-            'periodo_analise': {
-                'inicio': (datetime.utcnow() - timedelta(days=30)).isoformat(),
-                'fim': datetime.utcnow().isoformat()
+            return {
+                'total_denuncias': total_denuncias,
+                'por_status': stats_status,
+                'por_prioridade': stats_prioridade,
+                'por_categoria': stats_categoria,
+                'tendencia_diaria': tendencia_diaria,
+                'tendencia_30_dias': tendencia_diaria if dias == 30 else None,
+                'periodo_analise': {
+                    'dias': dias,
+                    'inicio': data_limite.isoformat(),
+                    'fim': agora.isoformat()
+                }
             }
-        }), 200
+        
+        # O dia entra no ETag e no cache para a tendência avançar mesmo sem novas denúncias
+        return resposta_condicional(
+            gerar_etag('dashboard', usuario_atual.id, versao, dias, hoje.date()),
+            lambda: relatorio_em_cache('dashboard', escopo, versao, (dias, hoje.date()), montar)
+        )
         
     except Exception as e:
         return jsonify({'error': f'Erro interno: {str(e)}'}), 500
 
+def filtros_escopo(filtros):
+    """Escopo e filtros dos relatórios a partir dos parâmetros (datas em ISO 8601)"""
+    escopo = {campo: filtros.get(campo) for campo in FILTROS_RELATORIO[:4]}
+    for campo in FILTROS_RELATORIO[4:]:
+        escopo[campo] = None
+        if filtros.get(campo):
+            try:
+                escopo[campo] = datetime.fromisoformat(filtros[campo].replace('Z', '+00:00'))
+            except ValueError:
+                raise ValueError(f'Formato de {campo} inválido')
+    return escopo
+
+def dados_detalhado(usuario, filtros):
+    """Estatísticas agregadas e amostra das denúncias do relatório detalhado"""
+    escopo = filtros_escopo(filtros)
+    
+    # Agregados por status, categoria e prioridade: resumos diários nos dias inteiros
+    # do período e consulta às denúncias apenas nos dias de borda
+    total = 0
+    resolvidas = 0
+    horas_resolvidas = 0.0
+    status_stats = {}
+    categoria_stats = {}
+    prioridade_stats = {}
+    grupos = agregados_periodo(usuario, **escopo)
+    for status_grupo, categoria_grupo, prioridade_grupo, count, resolvidas_grupo, horas_grupo in grupos:
+        total += count
+        resolvidas += resolvidas_grupo
+        horas_resolvidas += horas_grupo
+        status_stats[status_grupo] = status_stats.get(status_grupo, 0) + count
+        categoria_stats[categoria_grupo] = categoria_stats.get(categoria_grupo, 0) + count
+        prioridade_stats[prioridade_grupo] = prioridade_stats.get(prioridade_grupo, 0) + count
+    
+    # Tempo médio de resolução em horas (apenas para denúncias concluídas)
+    tempo_medio_resolucao_horas = horas_resolvidas / resolvidas if resolvidas else None
+    
+    tempo_medio_resolucao = None
+    if tempo_medio_resolucao_horas is not None:
+        tempo_medio_resolucao = tempo_medio_resolucao_horas / 24
+    
+    # Amostra de denúncias em consulta separada e limitada
+    query = consulta_escopo(lambda: select(Denuncia), usuario, **escopo)
+    query += lambda s: s.order_by(Denuncia.data_criacao.desc()).limit(LIMITE_AMOSTRA_DETALHADO)
+    denuncias = db.session.scalars(query).all()
+    
+    return {
+        'filtros_aplicados': {
+            'data_inicio': filtros.get('data_inicio'),
+            'data_fim': filtros.get('data_fim'),
+            'categoria': filtros.get('categoria'),
+            'status': filtros.get('status'),
+            'prioridade': filtros.get('prioridade'),
+            'empresa_id': filtros.get('empresa_id') if usuario.perfil == 'super_admin' else None
+        },
+        'estatisticas': {
+            'total_denuncias': total,
+            'por_status': status_stats,
+            'por_categoria': categoria_stats,
+            'por_prioridade': prioridade_stats,
+            'tempo_medio_resolucao_dias': tempo_medio_resolucao,
+            'tempo_medio_resolucao_horas': tempo_medio_resolucao_horas
+        },
+        'denuncias': [d.to_dict() for d in denuncias]
+    }
+
 @relatorios_bp.route('/relatorios/detalhado', methods=['GET'])
+@leitura_replica
 def relatorio_detalhado():
     """Relatório detalhado com filtros avançados"""
     auth_error = require_auth()
@@ -130,113 +259,51 @@ def relatorio_detalhado():
         if not usuario_atual:
             return jsonify({'error': 'Usuário não encontrado'}), 404
         
-        # Parâmetros de filtro
-        data_inicio = request.args.get('data_inicio')
-        data_fim = request.args.get('data_fim')
-        categoria = request.args.get('categoria')
-        status = request.args.get('status')
-        prioridade = request.args.get('prioridade')
-        empresa_id = request.args.get('empresa_id')
-        
-        # Query base com filtros de permissão
-        query = Denuncia.query
-        
-        if usuario_atual.perfil == 'super_admin':
-            # Super Admin pode filtrar por empresa específica
-            if empresa_id:
-                query = query.filter(Denuncia.empresa_id == empresa_id)
-        elif usuario_atual.perfil in ['admin_cliente', 'auditoria', 'gerente']:
-            # Usuários da empresa veem apenas da própria empresa
-            query = query.filter(Denuncia.empresa_id == usuario_atual.empresa_id)
-        elif usuario_atual.perfil == 'cliente':
-            # Cliente vê apenas suas próprias denúncias ou anônimas
-            query = query.filter(
-                or_(
-                    Denuncia.usuario_id == usuario_atual.id,
-                    and_(Denuncia.anonima == True, Denuncia.empresa_id == usuario_atual.empresa_id)
-                )
-            )
-        
-        # Aplicar filtros de data
-        if data_inicio:
-            try:
-                data_inicio_dt = datetime.fromisoformat(data_inicio.replace('Z', '+00:00'))
-                query = query.filter(Denuncia.data_criacao >= data_inicio_dt)
-            except ValueError:
-                return jsonify({'error': 'Formato de data_inicio inválido'}), 400
-        
-        if data_fim:
-            try:
-                data_fim_dt = datetime.fromisoformat(data_fim.replace('Z', '+00:00'))
-                query = query.filter(Denuncia.data_criacao <= data_fim_dt)
-            except ValueError:
-                return jsonify({'error': 'Formato de data_fim inválido'}), 400
-        
-        # Aplicar outros filtros
-        if categoria:
-            query = query.filter(Denuncia.categoria == categoria)
-        
-        if status:
-            query = query.filter(Denuncia.status == status)
-        
-        if prioridade:
-            query = query.filter(Denuncia.prioridade == prioridade)
-        
-        # Obter denúncias
-        denuncias = query.order_by(Denuncia.data_criacao.desc()).all()
-        
-        # Estatísticas do período filtrado
-        total = len(denuncias)
-        
-        # Agrupar por status
-        status_stats = {}
-        for denuncia in denuncias:
-            status_stats[denuncia.status] = status_stats.get(denuncia.status, 0) + 1
-        
-        # Agrupar por categoria
-        categoria_stats = {}
-        for denuncia in denuncias:
-            categoria_stats[denuncia.categoria] = categoria_stats.get(denuncia.categoria, 0) + 1
-        
-        # Agrupar por prioridade
-        prioridade_stats = {}
-        for denuncia in denuncias:
-            prioridade_stats[denuncia.prioridade] = prioridade_stats.get(denuncia.prioridade, 0) + 1
-        
-        # Tempo médio de resolução (apenas para denúncias concluídas)
-        denuncias_concluidas = [d for d in denuncias if d.status == 'concluida' and d.data_resolucao]
-        tempo_medio_resolucao = None
-        
-        if denuncias_concluidas:
-            total_dias = sum([
-                (d.data_resolucao - d.data_criacao).days 
-                for d in denuncias_concluidas
-            ])
-            tempo_medio_resolucao = total_dias / len(denuncias_concluidas)
-        
-        return jsonify({
-            'filtros_aplicados': {
-                'data_inicio': data_inicio,
-                'data_fim': data_fim,
-                'categoria': categoria,
-                'status': status,
-                'prioridade': prioridade,
-                'empresa_id': empresa_id if usuario_atual.perfil == 'super_admin' else None
-            },
-            'estatisticas': {
-                'total_denuncias': total,
-                'por_status': status_stats,
-                'por_categoria': categoria_stats,
-                'por_prioridade': prioridade_stats,
-                'tempo_medio_resolucao_dias': tempo_medio_resolucao
-            },
-            'denuncias': [d.to_dict() for d in denuncias[:100]]  # Limitar a 100 para performance
-        }), 200
+        # Escopo do perfil (Super Admin pode filtrar por empresa específica) e demais filtros
+        try:
+            escopo, versao = escopo_relatorio(usuario_atual, request.args.get('empresa_id'))
+            # O perfil entra na chave: filtros_aplicados no corpo depende dele
+            return relatorio_em_cache(
+                'detalhado', escopo, versao,
+                normalizar_parametros(request.args, FILTROS_RELATORIO) + (('perfil', usuario_atual.perfil),),
+                lambda: dados_detalhado(usuario_atual, request.args)
+            ), 200
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except AcessoNegado:
+            return jsonify({'error': 'Acesso negado'}), 403
         
     except Exception as e:
         return jsonify({'error': f'Erro interno: {str(e)}'}), 500
 
+def consulta_exportacao(usuario, formato, filtros, fields=None):
+    """Consulta da exportação e campos exportados (CSV tem colunas fixas; JSON aceita fields)"""
+    if formato not in FORMATOS_EXPORTACAO:
+        raise ValueError('Formato não suportado')
+    
+    # Mesma lógica de escopo e filtros do relatório detalhado
+    escopo = filtros_escopo(filtros)
+    
+    # Apenas as colunas exportadas
+    campos = CAMPOS_CSV if formato == 'csv' else campos_solicitados(Denuncia, fields)
+    projecao = colunas(Denuncia, campos)
+    
+    query = consulta_escopo(lambda: select(*projecao), usuario, track_on=[projecao], **escopo)
+    query += lambda s: s.order_by(Denuncia.data_criacao.desc())
+    return query, campos
+
+def gerar_json(query, campos):
+    """Gerar o documento JSON da exportação em blocos (o total vem ao final)"""
+    yield '{"denuncias": ['
+    total = 0
+    for bloco in gerar_ndjson(query, campos):
+        linhas = bloco.rstrip('\n').split('\n')
+        yield (',' if total else '') + ','.join(linhas)
+        total += len(linhas)
+    yield f'], "total": {total}, "data_exportacao": {json.dumps(datetime.utcnow().isoformat())}}}'
+
 @relatorios_bp.route('/relatorios/exportar', methods=['POST'])
+@leitura_replica
 def exportar_relatorio():
     """Exportar relatório em diferentes formatos"""
     auth_error = require_auth()
@@ -249,84 +316,315 @@ def exportar_relatorio():
             return jsonify({'error': 'Usuário não encontrado'}), 404
         
         data = request.get_json()
-        formato = data.get('formato', 'json')  # json, csv, pdf
-        filtros = data.get('filtros', {})
-        
-        # Aplicar mesma lógica de filtros do relatório detalhado
-        query = Denuncia.query
+        formato = data.get('formato', 'json')  # json, csv, ndjson
         
-        if usuario_atual.perfil == 'super_admin':
-            if filtros.get('empresa_id'):
-                query = query.filter(Denuncia.empresa_id == filtros['empresa_id'])
-        elif usuario_atual.perfil in ['admin_cliente', 'auditoria', 'gerente']:
-            query = query.filter(Denuncia.empresa_id == usuario_atual.empresa_id)
-        elif usuario_atual.perfil == 'cliente':
-            query = query.filter(
-                or_(
-                    Denuncia.usuario_id == usuario_atual.id,
-                    and_(Denuncia.anonima == True, Denuncia.empresa_id == usuario_atual.empresa_id)
-                )
+        try:
+            query, campos = consulta_exportacao(
+                usuario_atual, formato, data.get('filtros', {}),
+                request.args.get('fields') or data.get('fields')
             )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except AcessoNegado:
+            return jsonify({'error': 'Acesso negado'}), 403
+        
+        if formato in ('csv', 'ndjson'):
+            # Resposta em streaming: a memória não cresce com o número de linhas
+            if formato == 'csv':
+                gerador, mimetype = gerar_csv(query), 'text/csv'
+            else:
+                gerador, mimetype = gerar_ndjson(query, campos), 'application/x-ndjson'
+            nome_arquivo = f"relatorio_denuncias_{datetime.utcnow().strftime('%Y-%m-%d')}.{formato}"
+            
+            return Response(
+                stream_with_context(gerador),
+                mimetype=mimetype,
+                headers={'Content-Disposition': f'attachment; filename="{nome_arquivo}"'}
+            )
+        
+        denuncias = db.session.execute(query).all()
+        return jsonify({
+            'denuncias': [serializar(d, campos) for d in denuncias],
+            'total': len(denuncias),
+            'data_exportacao': datetime.utcnow().isoformat()
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Erro interno: {str(e)}'}), 500
+
+def parametros_metricas(page=1, per_page=50, ordenar_por='total_denuncias', ordem='desc'):
+    """Validar paginação e ordenação das métricas por empresa"""
+    page, per_page = parametros_paginacao({'page': page, 'per_page': per_page})
+    if ordenar_por not in ORDENACOES_METRICAS:
+        raise ValueError(f'ordenar_por deve ser um de {list(ORDENACOES_METRICAS)}')
+    if ordem not in ['asc', 'desc']:
+        raise ValueError('ordem deve ser asc ou desc')
+    return page, per_page, ordenar_por, ordem
+
+def dados_metricas_empresa(**parametros):
+    """Métricas das empresas ativas, paginadas e ordenadas"""
+    page, per_page, ordenar_por, ordem = parametros_metricas(**parametros)
+    
+    # Métricas de denúncias por empresa em uma única consulta agrupada
+    data_limite = datetime.utcnow() - timedelta(days=30)
+    denuncias_por_empresa = db.session.query(
+        Denuncia.empresa_id.label('empresa_id'),
+        func.count(Denuncia.id).label('total_denuncias'),
+        func.sum(case((Denuncia.data_criacao >= data_limite, 1), else_=0)).label('denuncias_30_dias'),
+        *[
+            func.sum(case((Denuncia.status == status, 1), else_=0)).label(status)
+            for status in STATUS_DENUNCIA
+        ]
+    ).group_by(Denuncia.empresa_id).subquery()
+    
+    # Usuários ativos por empresa
+    usuarios_por_empresa = db.session.query(
+        Usuario.empresa_id.label('empresa_id'),
+        func.count(Usuario.id).label('total_usuarios')
+    ).filter(Usuario.ativo == True).group_by(Usuario.empresa_id).subquery()
+    
+    colunas = {
+        'total_denuncias': func.coalesce(denuncias_por_empresa.c.total_denuncias, 0),
+        'total_usuarios': func.coalesce(usuarios_por_empresa.c.total_usuarios, 0),
+        'denuncias_30_dias': func.coalesce(denuncias_por_empresa.c.denuncias_30_dias, 0),
+    }
+    for status in STATUS_DENUNCIA:
+        colunas[status] = func.coalesce(denuncias_por_empresa.c[status], 0)
+    
+    query = db.session.query(
+        Empresa,
+        *[coluna.label(nome) for nome, coluna in colunas.items()]
+    ).outerjoin(
+        denuncias_por_empresa, denuncias_por_empresa.c.empresa_id == Empresa.id
+    ).outerjoin(
+        usuarios_por_empresa, usuarios_por_empresa.c.empresa_id == Empresa.id
+    ).filter(Empresa.status == 'ativa')
+    
+    coluna_ordem = Empresa.nome if ordenar_por == 'nome' else colunas[ordenar_por]
+    coluna_ordem = coluna_ordem.desc() if ordem == 'desc' else coluna_ordem.asc()
+    
+    total_empresas = Empresa.query.filter_by(status='ativa').count()
+    linhas = query.order_by(coluna_ordem, Empresa.id).limit(per_page).offset((page - 1) * per_page).all()
+    
+    metricas = []
+    for linha in linhas:
+        metricas.append({
+            'empresa': linha.Empresa.to_dict(),
+            'estatisticas': {
+                'total_denuncias': linha.total_denuncias,
+                'total_usuarios': linha.total_usuarios,
+                'denuncias_30_dias': linha.denuncias_30_dias,
+                'por_status': {
+                    status: getattr(linha, status)
+                    for status in STATUS_DENUNCIA
+                    if getattr(linha, status)
+                }
+            }
+        })
+    
+    return {
+        'metricas_empresas': metricas,
+        'total_empresas': total_empresas,
+        'pages': (total_empresas + per_page - 1) // per_page,
+        'current_page': page,
+        'per_page': per_page,
+        'ordenar_por': ordenar_por,
+        'ordem': ordem,
+        'data_consulta': datetime.utcnow().isoformat()
+    }
+
+@relatorios_bp.route('/relatorios/metricas-empresa', methods=['GET'])
+@leitura_replica
+def metricas_empresa():
+    """Métricas específicas por empresa (apenas Super Admin)"""
+    auth_error = require_auth()
+    if auth_error:
+        return auth_error
+    
+    try:
+        usuario_atual = get_current_user()
+        if not usuario_atual or usuario_atual.perfil != 'super_admin':
+            return jsonify({'error': 'Acesso negado - apenas Super Admin'}), 403
         
-        # Aplicar filtros de data
-        if filtros.get('data_inicio'):
-            data_inicio_dt = datetime.fromisoformat(filtros['data_inicio'].replace('Z', '+00:00'))
-            query = query.filter(Denuncia.data_criacao >= data_inicio_dt)
+        # Paginação e ordenação
+        try:
+            return jsonify(dados_metricas_empresa(**{
+                parametro: request.args[parametro]
+                for parametro in PARAMETROS_METRICAS if parametro in request.args
+            })), 200
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        if filtros.get('data_fim'):
-            data_fim_dt = datetime.fromisoformat(filtros['data_fim'].replace('Z', '+00:00'))
-            query = query.filter(Denuncia.data_criacao <= data_fim_dt)
+    except Exception as e:
+        return jsonify({'error': f'Erro interno: {str(e)}'}), 500
+
+def tarefa_detalhado(usuario, parametros, saida):
+    json.dump(dados_detalhado(usuario, parametros.get('filtros', {})), saida, ensure_ascii=False)
+    return 'json', 'application/json'
+
+def tarefa_exportar(usuario, parametros, saida):
+    formato = parametros.get('formato', 'json')
+    query, campos = consulta_exportacao(usuario, formato, parametros.get('filtros', {}), parametros.get('fields'))
+    if formato == 'csv':
+        blocos = gerar_csv(query)
+    elif formato == 'ndjson':
+        blocos = gerar_ndjson(query, campos)
+    else:
+        blocos = gerar_json(query, campos)
+    for bloco in blocos:
+        saida.write(bloco)
+    return formato, FORMATOS_EXPORTACAO[formato]
+
+def tarefa_metricas_empresa(usuario, parametros, saida):
+    if usuario.perfil != 'super_admin':
+        raise AcessoNegado()
+    json.dump(dados_metricas_empresa(**parametros), saida, ensure_ascii=False)
+    return 'json', 'application/json'
+
+tarefas_relatorio.registrar('detalhado', tarefa_detalhado)
+tarefas_relatorio.registrar('exportar', tarefa_exportar)
+tarefas_relatorio.registrar('metricas_empresa', tarefa_metricas_empresa)
+
+def validar_tarefa(usuario, tipo, parametros):
+    """Rejeitar na criação as tarefas que falhariam por parâmetros ou permissão"""
+    if tipo not in tarefas_relatorio.tipos:
+        raise ValueError(f'tipo deve ser um de {list(tarefas_relatorio.tipos)}')
+    if not isinstance(parametros, dict):
+        raise ValueError('parametros deve ser um objeto')
+    
+    if tipo == 'metricas_empresa':
+        if usuario.perfil != 'super_admin':
+            raise AcessoNegado()
+        desconhecidos = set(parametros) - set(PARAMETROS_METRICAS)
+        if desconhecidos:
+            raise ValueError(f'Parâmetros desconhecidos: {sorted(desconhecidos)}')
+        parametros_metricas(**parametros)
+    elif tipo == 'exportar':
+        consulta_exportacao(usuario, parametros.get('formato', 'json'), parametros.get('filtros', {}), parametros.get('fields'))
+    else:
+        consulta_escopo(lambda: select(Denuncia.id), usuario, **filtros_escopo(parametros.get('filtros', {})))
+
+def descrever_tarefa(tarefa):
+    descricao = tarefas_relatorio.descrever(tarefa)
+    descricao['url'] = url_for('relatorios.obter_tarefa', tarefa_id=tarefa['id'])
+    if tarefa['status'] == 'concluida':
+        descricao['url_resultado'] = url_for('relatorios.baixar_resultado_tarefa', tarefa_id=tarefa['id'])
+    return descricao
+
+def escopo_tarefa(usuario, parametros=None):
+    """Escopo dos dados da tarefa, com o perfil (como no cache do detalhado), e a versão atual deles"""
+    filtros = (parametros or {}).get('filtros') or {}
+    escopo, versao = escopo_relatorio(usuario, filtros.get('empresa_id'))
+    return json.dumps([usuario.perfil, *escopo]), versao
+
+def tarefa_do_usuario(tarefa_id, usuario):
+    """Tarefa visível para o usuário (a própria ou do mesmo escopo; Super Admin vê todas), ou None"""
+    tarefa = tarefas_relatorio.obter(tarefa_id)
+    if tarefa and (
+        tarefa['usuario_id'] == usuario.id or usuario.perfil == 'super_admin'
+        or tarefa['escopo'] == escopo_tarefa(usuario)[0]
+    ):
+        return tarefa
+    return None
+
+@relatorios_bp.route('/relatorios/tarefas', methods=['POST'])
+def criar_tarefa():
+    """Enfileirar um relatório longo (detalhado, exportar, metricas_empresa) para execução em segundo plano"""
+    auth_error = require_auth()
+    if auth_error:
+        return auth_error
+    
+    try:
+        usuario_atual = get_current_user()
+        if not usuario_atual:
+            return jsonify({'error': 'Usuário não encontrado'}), 404
         
-        if filtros.get('categoria'):
-            query = query.filter(Denuncia.categoria == filtros['categoria'])
+        data = request.get_json() or {}
+        tipo = data.get('tipo')
+        parametros = data.get('parametros', {})
         
-        if filtros.get('status'):
-            query = query.filter(Denuncia.status == filtros['status'])
+        try:
+            validar_tarefa(usuario_atual, tipo, parametros)
+            escopo, versao = escopo_tarefa(usuario_atual, parametros)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except AcessoNegado:
+            return jsonify({'error': 'Acesso negado'}), 403
         
-        if filtros.get('prioridade'):
-            query = query.filter(Denuncia.prioridade == filtros['prioridade'])
+        # Especificação idêntica no mesmo escopo e versão dos dados: devolver a mesma tarefa
+        tarefa, nova = tarefas_relatorio.enviar(tipo, usuario_atual.id, parametros, escopo, versao)
+        resposta = jsonify(dict(descrever_tarefa(tarefa), nova=nova))
+        resposta.headers['Location'] = url_for('relatorios.obter_tarefa', tarefa_id=tarefa['id'])
+        return resposta, 202
         
-        denuncias = query.order_by(Denuncia.data_criacao.desc()).all()
+    except Exception as e:
+        return jsonify({'error': f'Erro interno: {str(e)}'}), 500
+
+@relatorios_bp.route('/relatorios/tarefas', methods=['GET'])
+def listar_tarefas():
+    """Tarefas de relatório do usuário, mais recentes primeiro"""
+    auth_error = require_auth()
+    if auth_error:
+        return auth_error
+    
+    try:
+        usuario_atual = get_current_user()
+        if not usuario_atual:
+            return jsonify({'error': 'Usuário não encontrado'}), 404
         
-        if formato == 'json':
-            return jsonify({
-                'denuncias': [d.to_dict() for d in denuncias],
-                'total': len(denuncias),
-                'data_exportacao': datetime.utcnow().isoformat()
-            }), 200
+        return jsonify({
+            'tarefas': [
+                descrever_tarefa(tarefa)
+                for tarefa in tarefas_relatorio.listar(usuario_atual.id, escopo_tarefa(usuario_atual)[0])
+            ]
+        }), 200
         
-        elif formato == 'csv':
-            # Para CSV, retornar dados estruturados que o frontend pode processar
-            csv_data = []
-            for d in denuncias:
-                csv_data.append({
-                    'Protocolo': d.protocolo,
-                    'Título': d.titulo,
-                    'Categoria': d.categoria,
-                    'Subcategoria': d.subcategoria,
-                    'Status': d.status,
-                    'Prioridade': d.prioridade,
-                    'Data Criação': d.data_criacao.strftime('%d/%m/%Y %H:%M') if d.data_criacao else '',
-                    'Anônima': 'Sim' if d.anonima else 'Não',
-                    'Origem': d.origem
-                })
-            
-            return jsonify({
-                'formato': 'csv',
-                'dados': csv_data,
-                'total': len(csv_data),
-                'data_exportacao': datetime.utcnow().isoformat()
-            }), 200
+    except Exception as e:
+        return jsonify({'error': f'Erro interno: {str(e)}'}), 500
+
+@relatorios_bp.route('/relatorios/tarefas/<tarefa_id>', methods=['GET'])
+def obter_tarefa(tarefa_id):
+    """Status de uma tarefa de relatório"""
+    auth_error = require_auth()
+    if auth_error:
+        return auth_error
+    
+    try:
+        usuario_atual = get_current_user()
+        tarefa = tarefa_do_usuario(tarefa_id, usuario_atual) if usuario_atual else None
+        if not tarefa:
+            return jsonify({'error': 'Tarefa não encontrada'}), 404
         
-        else:
-            return jsonify({'error': 'Formato não suportado'}), 400
+        return jsonify(descrever_tarefa(tarefa)), 200
         
     except Exception as e:
         return jsonify({'error': f'Erro interno: {str(e)}'}), 500
 
-@relatorios_bp.route('/relatorios/metricas-empresa', methods=['GET'])
-def metricas_empresa():
-    """Métricas específicas por empresa (apenas Super Admin)"""
+@relatorios_bp.route('/relatorios/tarefas/<tarefa_id>/resultado', methods=['GET'])
+def baixar_resultado_tarefa(tarefa_id):
+    """Baixar o resultado de uma tarefa concluída"""
+    auth_error = require_auth()
+    if auth_error:
+        return auth_error
+    
+    try:
+        usuario_atual = get_current_user()
+        tarefa = tarefa_do_usuario(tarefa_id, usuario_atual) if usuario_atual else None
+        if not tarefa:
+            return jsonify({'error': 'Tarefa não encontrada'}), 404
+        if tarefa['status'] != 'concluida':
+            return jsonify({'error': 'Resultado indisponível', 'status': tarefa['status'], 'erro': tarefa['erro']}), 409
+        
+        extensao = tarefa['arquivo'].split('.')[-2]
+        nome_arquivo = f"relatorio_{tarefa['tipo']}_{datetime.utcfromtimestamp(tarefa['concluido_em']).strftime('%Y-%m-%d')}.{extensao}"
+        return tarefas_relatorio.responder_resultado(tarefa, nome_arquivo)
+        
+    except Exception as e:
+        return jsonify({'error': f'Erro interno: {str(e)}'}), 500
+
+@relatorios_bp.route('/relatorios/cache', methods=['GET'])
+def metricas_cache_relatorios():
+    """Acertos, faltas e ocupação do cache de relatórios do worker (apenas Super Admin)"""
     auth_error = require_auth()
     if auth_error:
         return auth_error
@@ -336,48 +634,24 @@ def metricas_empresa():
         if not usuario_atual or usuario_atual.perfil != 'super_admin':
             return jsonify({'error': 'Acesso negado - apenas Super Admin'}), 403
         
-        # Obter todas as empresas
-        empresas = Empresa.query.filter_by(status='ativa').all()
+        return jsonify(cache_relatorios.metricas()), 200
         
-        metricas = []
-        for empresa in empresas:
-            # Estatísticas da empresa
-            total_denuncias = Denuncia.query.filter_by(empresa_id=empresa.id).count()
-            total_usuarios = Usuario.query.filter_by(empresa_id=empresa.id, ativo=True).count()
-            
-            # Denúncias por status
-            status_counts = db.session.query(
-                Denuncia.status, 
-                func.count(Denuncia.id)
-            ).filter_by(empresa_id=empresa.id).group_by(Denuncia.status).all()
-            
-            status_stats = {status: count for status, count in status_counts}
-            
-            # Denúncias dos últimos 30 dias
-            data_limite = datetime.utcnow() - timedelta(days=30)
-            denuncias_recentes = Denuncia.query.filter(
-                and_(
-                    Denuncia.empresa_id == empresa.id,
-                    Denuncia.data_criacao >= data_limite
-                )
-            ).count()
-            
-            metricas.append({
-                'empresa': empresa.to_dict(),
-                'estatisticas': {
-                    'total_denuncias': total_denuncias,
-                    'total_usuarios': total_usuarios,
-                    'denuncias_30_dias': denuncias_recentes,
-                    'por_status': status_stats
-                }
-            })
+    except Exception as e:
+        return jsonify({'error': f'Erro interno: {str(e)}'}), 500
+
+@relatorios_bp.route('/relatorios/pool-conexoes', methods=['GET'])
+def pool_conexoes():
+    """Uso do pool de conexões do worker, capacidade frente ao max_connections e estado da réplica (apenas Super Admin)"""
+    auth_error = require_auth()
+    if auth_error:
+        return auth_error
+    
+    try:
+        usuario = get_current_user()
+        if not usuario or usuario.perfil != 'super_admin':
+            return jsonify({'error': 'Acesso negado - apenas Super Admin'}), 403
         
-        return jsonify({
-            'metricas_empresas': metricas,
-            'total_empresas': len(empresas),
-            'data_consulta': datetime.utcnow().isoformat()
-        }), 200
+        return jsonify(dict(relatorio_pool(current_app.config), replica=monitor_replica.estado())), 200
         
     except Exception as e:
         return jsonify({'error': f'Erro interno: {str(e)}'}), 500
-
@@ -0,0 +1,143 @@
+from flask import g, session, has_request_context
+from functools import wraps
+from sqlalchemy import event, func, select, text
+from src.database import db, BIND_REPLICA, SessaoRoteada
+from src.models.versao import VersaoDados
+from threading import Lock
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Atraso de replicação do PostgreSQL em segundos (0 quando já aplicou tudo o que recebeu;
+# NULL em um servidor que não é réplica)
+SQL_ATRASO_POSTGRES = """SELECT CASE
+    WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+END"""
+
+def total_versoes(conexao):
+    return conexao.execute(select(func.coalesce(func.sum(VersaoDados.versao), 0))).scalar()
+
+class MonitorReplica:
+    """Estado da réplica de leitura, verificado no máximo a cada REPLICA_INTERVALO_VERIFICACAO
+
+    A réplica é usada enquanto responde e está em dia: no PostgreSQL, com
+    atraso de replay até REPLICA_ATRASO_MAXIMO segundos; nos demais bancos
+    (ex.: dois arquivos SQLite em desenvolvimento), quando a soma das
+    versões de dados (VersaoDados) é igual à do primário. Fora disso as
+    leituras voltam para o primário até a próxima verificação.
+    """
+
+    def __init__(self):
+        self.ativa = False
+        self.disponivel = False
+        self.atraso = None
+        self.erro = None
+        self.verificado_em = None
+        self.intervalo = 5
+        self.atraso_maximo = 10
+        self.janela_escrita = 30
+        self.leituras = {'replica': 0, 'primario': 0}
+        self._lock = Lock()
+
+    def init_app(self, app):
+        self.ativa = bool(app.config.get('DATABASE_REPLICA_URL'))
+        self.intervalo = app.config.get('REPLICA_INTERVALO_VERIFICACAO', 5)
+        self.atraso_maximo = app.config.get('REPLICA_ATRASO_MAXIMO', 10)
+        self.janela_escrita = app.config.get('REPLICA_JANELA_ESCRITA', 30)
+        self.verificado_em = None
+        if self.ativa:
+            app.after_request(self.registrar_escrita)
+
+    def medir_atraso(self):
+        """Atraso da réplica em segundos (sem comparação de tempo fora do PostgreSQL: 0 ou infinito)"""
+        replica = db.engines[BIND_REPLICA]
+        with replica.connect() as conexao:
+            if replica.dialect.name == 'postgresql':
+                return float(conexao.execute(text(SQL_ATRASO_POSTGRES)).scalar() or 0)
+            versao_replica = total_versoes(conexao)
+        with db.engine.connect() as conexao:
+            versao_primario = total_versoes(conexao)
+        return 0.0 if versao_replica >= versao_primario else float('inf')
+
+    def verificar(self):
+        try:
+            self.atraso = self.medir_atraso()
+            self.erro = None
+            self.disponivel = self.atraso <= self.atraso_maximo
+        except Exception as e:
+            self.atraso = None
+            self.erro = str(e)
+            self.disponivel = False
+        if not self.disponivel:
+            logger.warning("Réplica indisponível (atraso=%s, erro=%s); lendo do primário", self.atraso, self.erro)
+        self.verificado_em = time.monotonic()
+
+    def em_dia(self):
+        """Réplica utilizável agora (verifica de novo quando o resultado anterior expirou)"""
+        if not self.ativa:
+            return False
+        if self.verificado_em is None or time.monotonic() - self.verificado_em >= self.intervalo:
+            with self._lock:
+                if self.verificado_em is None or time.monotonic() - self.verificado_em >= self.intervalo:
+                    self.verificar()
+        return self.disponivel
+
+    def escreveu_recentemente(self):
+        """O usuário gravou algo há menos de REPLICA_JANELA_ESCRITA: ler o que acabou de escrever"""
+        return time.time() - session.get('ultima_escrita', 0) < self.janela_escrita
+
+    def registrar_escrita(self, resposta):
+        if g.get('houve_escrita') and 'user_id' in session:
+            session['ultima_escrita'] = time.time()
+        return resposta
+
+    def estado(self):
+        return {
+            'ativa': self.ativa,
+            'disponivel': self.disponivel,
+            'atraso_segundos': self.atraso if self.atraso != float('inf') else None,
+            'erro': self.erro,
+            'leituras': dict(self.leituras),
+        }
+
+monitor_replica = MonitorReplica()
+
+def usar_replica():
+    """Rotear as consultas do contexto atual para a réplica, se ela estiver em dia"""
+    if not monitor_replica.ativa:
+        return False
+    if monitor_replica.em_dia():
+        g.banco_leitura = BIND_REPLICA
+        monitor_replica.leituras['replica'] += 1
+        return True
+    monitor_replica.leituras['primario'] += 1
+    return False
+
+def leitura_replica(view):
+    """Rota somente leitura: consultas na réplica quando ela está em dia
+
+    Requisições de quem escreveu há pouco continuam no primário, e qualquer
+    escrita feita pela rota vai sempre para o primário (SessaoRoteada).
+    """
+    @wraps(view)
+    def rota(*args, **kwargs):
+        if monitor_replica.ativa:
+            if monitor_replica.escreveu_recentemente():
+                monitor_replica.leituras['primario'] += 1
+            else:
+                usar_replica()
+        return view(*args, **kwargs)
+    return rota
+
+# Marcar a requisição que escreveu no primário (flush do ORM ou INSERT/UPDATE/DELETE diretos)
+@event.listens_for(SessaoRoteada, 'after_flush')
+def apos_flush(sessao, contexto):
+    if has_request_context():
+        g.houve_escrita = True
+
+@event.listens_for(SessaoRoteada, 'do_orm_execute')
+def ao_executar(estado):
+    if (estado.is_insert or estado.is_update or estado.is_delete) and has_request_context():
+        g.houve_escrita = True
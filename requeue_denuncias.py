@@ -0,0 +1,31 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from src.main import create_app
+from src.fila_denuncias import fila_denuncias, MAX_TENTATIVAS
+import argparse
+
+app = create_app(rotas=False)
+
+def requeue_denuncias(ids=None, apenas_listar=False):
+    """Devolver à fila as denúncias que esgotaram as tentativas de gravação"""
+    fila_denuncias.init_app(app, escritor=False)
+    falhas = fila_denuncias.listar_falhas()
+    for item_id, protocolo, tentativas, ultimo_erro in falhas:
+        print(f"Item {item_id} / {protocolo}: {tentativas} tentativa(s), último erro: {ultimo_erro}")
+    
+    if apenas_listar:
+        print(f"{len(falhas)} item(ns) com {MAX_TENTATIVAS} tentativas ou mais.")
+        return 0
+    
+    reenfileirados = fila_denuncias.reenfileirar_falhas(ids)
+    print(f"{reenfileirados} item(ns) devolvido(s) à fila.")
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Reenfileirar denúncias que falharam na fila de entrada')
+    parser.add_argument('ids', nargs='*', type=int, help='Ids dos itens (padrão: todos os que falharam)')
+    parser.add_argument('--listar', action='store_true', help='Apenas listar os itens que falharam')
+    args = parser.parse_args()
+    sys.exit(requeue_denuncias(args.ids, args.listar))
@@ -0,0 +1,133 @@
+from sqlalchemy import case, func, select
+from src.database import db
+from src.escopo import PERFIS_EMPRESA, AcessoNegado, consulta_escopo
+from src.models.denuncia import Denuncia, ResumoDiarioDenuncias, horas_resolucao
+from datetime import datetime, time, timedelta, timezone
+
+# Menor intervalo entre dois instantes gravados (fim exclusivo de um trecho bruto)
+MICROSSEGUNDO = timedelta(microseconds=1)
+
+def utc_sem_fuso(instante):
+    """Datas com fuso são convertidas para UTC sem fuso, como as gravadas nas denúncias"""
+    if instante is not None and instante.tzinfo is not None:
+        return instante.astimezone(timezone.utc).replace(tzinfo=None)
+    return instante
+
+def dividir_periodo(data_inicio=None, data_fim=None):
+    """Dividir o período [data_inicio, data_fim] em dias inteiros e trechos de borda
+
+    Retorna (dias, trechos): dias é (primeiro_dia, dia_final) com o dia
+    final exclusivo (None = sem limite), ou None se o período não contém
+    um dia inteiro; trechos são os intervalos [inicio, fim] (inclusivos)
+    que precisam ser lidos das denúncias.
+    """
+    data_inicio, data_fim = utc_sem_fuso(data_inicio), utc_sem_fuso(data_fim)
+    primeiro_dia = None
+    if data_inicio is not None:
+        primeiro_dia = data_inicio.date()
+        if data_inicio.time() != time.min:
+            primeiro_dia += timedelta(days=1)
+
+    # Um dia é inteiro quando o fim (inclusivo) alcança o último instante dele
+    dia_final = (data_fim + MICROSSEGUNDO).date() if data_fim is not None else None
+
+    if primeiro_dia and dia_final and primeiro_dia >= dia_final:
+        return None, [(data_inicio, data_fim)]
+
+    trechos = []
+    if data_inicio is not None and data_inicio.time() != time.min:
+        trechos.append((data_inicio, datetime.combine(primeiro_dia, time.min) - MICROSSEGUNDO))
+    if data_fim is not None and data_fim >= datetime.combine(dia_final, time.min):
+        trechos.append((datetime.combine(dia_final, time.min), data_fim))
+    return (primeiro_dia, dia_final), trechos
+
+def agregados_resumos(usuario, dias, empresa_id=None, status=None, categoria=None, prioridade=None):
+    """Totais por (status, categoria, prioridade) nos dias inteiros, lidos dos resumos diários"""
+    query = select(
+        ResumoDiarioDenuncias.status,
+        ResumoDiarioDenuncias.categoria,
+        ResumoDiarioDenuncias.prioridade,
+        func.sum(ResumoDiarioDenuncias.total),
+        func.sum(ResumoDiarioDenuncias.resolvidas),
+        func.sum(ResumoDiarioDenuncias.horas_resolucao)
+    )
+
+    if usuario.perfil == 'super_admin':
+        if empresa_id:
+            query = query.where(ResumoDiarioDenuncias.empresa_id == empresa_id)
+    elif usuario.perfil in PERFIS_EMPRESA:
+        query = query.where(ResumoDiarioDenuncias.empresa_id == usuario.empresa_id)
+    else:
+        raise AcessoNegado()
+
+    if status:
+        query = query.where(ResumoDiarioDenuncias.status == status)
+    if categoria:
+        query = query.where(ResumoDiarioDenuncias.categoria == categoria)
+    if prioridade:
+        query = query.where(ResumoDiarioDenuncias.prioridade == prioridade)
+
+    primeiro_dia, dia_final = dias
+    if primeiro_dia:
+        query = query.where(ResumoDiarioDenuncias.dia >= primeiro_dia)
+    if dia_final:
+        query = query.where(ResumoDiarioDenuncias.dia < dia_final)
+
+    query = query.group_by(
+        ResumoDiarioDenuncias.status, ResumoDiarioDenuncias.categoria, ResumoDiarioDenuncias.prioridade
+    )
+    # '' nos resumos corresponde a nulo nas denúncias
+    return [
+        (status_grupo or None, categoria_grupo, prioridade_grupo or None, total, resolvidas, horas)
+        for status_grupo, categoria_grupo, prioridade_grupo, total, resolvidas, horas in db.session.execute(query)
+    ]
+
+def agregados_denuncias(usuario, **escopo):
+    """Totais por (status, categoria, prioridade) lidos diretamente das denúncias"""
+    resolvida = (Denuncia.status == 'concluida') & Denuncia.data_resolucao.isnot(None)
+    horas = horas_resolucao()
+    query = consulta_escopo(
+        lambda: select(
+            Denuncia.status,
+            Denuncia.categoria,
+            Denuncia.prioridade,
+            func.count(Denuncia.id),
+            func.sum(case((resolvida, 1), else_=0)),
+            func.sum(case((resolvida, horas), else_=0.0))
+        ),
+        usuario,
+        **escopo
+    )
+    query += lambda s: s.group_by(Denuncia.status, Denuncia.categoria, Denuncia.prioridade)
+    return db.session.execute(query).all()
+
+def agregados_periodo(usuario, data_inicio=None, data_fim=None, **filtros):
+    """Totais por (status, categoria, prioridade) no período: (status, categoria,
+    prioridade, total, resolvidas, horas de resolução somadas)
+
+    Dias inteiros vêm dos resumos diários e apenas os trechos de borda das
+    denúncias. Clientes veem só as próprias denúncias, que os resumos não
+    distinguem: para eles a consulta é sempre direta.
+    """
+    data_inicio, data_fim = utc_sem_fuso(data_inicio), utc_sem_fuso(data_fim)
+    if usuario.perfil == 'cliente':
+        return agregados_denuncias(usuario, data_inicio=data_inicio, data_fim=data_fim, **filtros)
+
+    dias, trechos = dividir_periodo(data_inicio, data_fim)
+    partes = []
+    if dias:
+        partes.append(agregados_resumos(usuario, dias, **filtros))
+    for inicio, fim in trechos:
+        partes.append(agregados_denuncias(usuario, data_inicio=inicio, data_fim=fim, **filtros))
+
+    grupos = {}
+    for parte in partes:
+        for status, categoria, prioridade, total, resolvidas, horas in parte:
+            grupo = grupos.setdefault((status, categoria, prioridade), [0, 0, 0.0])
+            grupo[0] += total or 0
+            grupo[1] += resolvidas or 0
+            grupo[2] += float(horas or 0)
+    return [
+        (*chave, total, resolvidas, horas)
+        for chave, (total, resolvidas, horas) in grupos.items() if total
+    ]
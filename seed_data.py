@@ -3,7 +3,9 @@ import sys
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 from src.models.user import db, Usuario, Empresa, CategoriasDenuncia, SubcategoriasDenuncia
-from src.main import app
+from src.main import create_app
+
+app = create_app(rotas=False)
 
 def create_seed_data():
     """Criar dados de teste para o sistema"""
@@ -0,0 +1,93 @@
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from flask import current_app
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, generate_password_hash, check_password_hash
+from threading import BoundedSemaphore, Lock
+import multiprocessing
+import os
+
+class PoolSenhasSaturado(Exception):
+    """Todas as vagas de verificação de senha estão ocupadas (ou a operação excedeu SENHA_TIMEOUT)"""
+
+def prefixo_metodo(metodo):
+    """Prefixo "método:parâmetros" que o Werkzeug grava no hash para SENHA_METODO
+
+    Parâmetros omitidos recebem os mesmos padrões que generate_password_hash usa.
+    """
+    nome, *parametros = metodo.split(':')
+    if nome == 'scrypt':
+        n, r, p = parametros or (2 ** 15, 8, 1)
+        return f'scrypt:{int(n)}:{int(r)}:{int(p)}'
+    if nome == 'pbkdf2' and len(parametros) <= 2:
+        hash_nome = parametros[0] if parametros else 'sha256'
+        iteracoes = parametros[1] if len(parametros) == 2 else DEFAULT_PBKDF2_ITERATIONS
+        return f'pbkdf2:{hash_nome}:{int(iteracoes)}'
+    raise ValueError(f'SENHA_METODO inválido: {metodo}')
+
+class PoolSenhas:
+    """Executa hash e verificação de senhas em processos dedicados
+
+    O KDF roda fora do worker do gunicorn; um semáforo limita quantas
+    operações podem estar em andamento/na fila, e o excedente falha na hora
+    com PoolSenhasSaturado em vez de enfileirar as demais requisições.
+    """
+    
+    def __init__(self):
+        self._pid = None
+        self._executor = None
+        self._vagas = None
+        self._lock = Lock()
+    
+    def configuracao(self, chave, padrao):
+        return current_app.config.get(chave, padrao)
+    
+    def executor(self):
+        """Pool do processo atual (recriado após fork do gunicorn)"""
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    processos = self.configuracao('SENHA_PROCESSOS', 2)
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=processos,
+                        mp_context=multiprocessing.get_context('spawn')
+                    )
+                    self._vagas = BoundedSemaphore(self.configuracao('SENHA_CONCORRENCIA_MAXIMA', processos * 4))
+                    self._pid = os.getpid()
+        return self._executor
+    
+    def executar(self, funcao, *args):
+        """Executar no pool, falhando imediatamente se não houver vaga
+
+        A vaga só é devolvida quando a operação termina no processo do pool,
+        mesmo que a requisição já tenha desistido por SENHA_TIMEOUT.
+        """
+        executor = self.executor()
+        vagas = self._vagas
+        if not vagas.acquire(blocking=False):
+            raise PoolSenhasSaturado()
+        try:
+            futuro = executor.submit(funcao, *args)
+        except Exception:
+            vagas.release()
+            raise
+        futuro.add_done_callback(lambda _: vagas.release())
+        
+        try:
+            return futuro.result(timeout=self.configuracao('SENHA_TIMEOUT', 10))
+        except TimeoutError:
+            # Ainda na fila do pool: cancelar libera a vaga na hora
+            futuro.cancel()
+            raise PoolSenhasSaturado()
+    
+    def gerar_hash(self, senha):
+        """Gerar hash com os parâmetros configurados (SENHA_METODO)"""
+        return self.executar(generate_password_hash, senha, self.configuracao('SENHA_METODO', 'scrypt'))
+    
+    def verificar(self, senha_hash, senha):
+        """Verificar a senha contra o hash armazenado"""
+        return self.executar(check_password_hash, senha_hash, senha)
+    
+    def precisa_rehash(self, senha_hash):
+        """Indica se o hash foi gerado com parâmetros diferentes dos configurados"""
+        return senha_hash.split('$', 1)[0] != prefixo_metodo(self.configuracao('SENHA_METODO', 'scrypt'))
+
+pool_senhas = PoolSenhas()
@@ -0,0 +1,58 @@
+from flask import g, session, request, jsonify
+from sqlalchemy.orm import make_transient_to_detached
+from src.database import db
+from src.models.usuario import Usuario
+from src.cache import CacheLRU
+
+# Dados das colunas dos usuários autenticados, por id
+cache_usuarios = CacheLRU()
+
+def carregar_usuario(usuario_id):
+    """Obter usuário pelo id, consultando o banco apenas se não estiver em cache"""
+    dados = cache_usuarios.obter(usuario_id)
+    if dados is not None:
+        # Reanexar à sessão atual sem emitir SELECT
+        usuario = Usuario(**dados)
+        make_transient_to_detached(usuario)
+        return db.session.merge(usuario, load=False)
+    
+    usuario = Usuario.query.get(usuario_id)
+    if usuario:
+        cache_usuarios.guardar(usuario_id, {
+            coluna.key: getattr(usuario, coluna.key)
+            for coluna in Usuario.__mapper__.column_attrs
+        })
+    return usuario
+
+def invalidar_usuario(usuario_id):
+    """Invalidar o cache após atualizar ou desativar um usuário"""
+    cache_usuarios.invalidar(usuario_id)
+
+def carregar_usuario_atual():
+    """Resolver o usuário da sessão uma única vez por requisição"""
+    # Arquivos estáticos não precisam do usuário
+    if request.blueprint is None:
+        return
+    
+    if 'user_id' in session:
+        g.usuario_atual = carregar_usuario(session['user_id'])
+
+def require_auth():
+    """Decorator para verificar autenticação"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Usuário não autenticado'}), 401
+    return None
+
+def get_current_user():
+    """Obter usuário atual da sessão"""
+    if 'user_id' not in session:
+        return None
+    if 'usuario_atual' not in g:
+        g.usuario_atual = carregar_usuario(session['user_id'])
+    return g.usuario_atual
+
+def init_app(app):
+    """Configurar o cache e registrar o carregamento do usuário em cada requisição"""
+    cache_usuarios.max_itens = app.config.get('USUARIO_CACHE_MAX_ITENS', 1024)
+    cache_usuarios.ttl = app.config.get('USUARIO_CACHE_TTL', 60)
+    app.before_request(carregar_usuario_atual)
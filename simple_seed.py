@@ -2,14 +2,16 @@ import os
 import sys
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from src.main import app
+from src.main import create_app
 from src.database import db
 from src.models.usuario import Usuario
 from src.models.empresa import Empresa
-from src.models.denuncia import Denuncia, CategoriasDenuncia, SubcategoriasDenuncia
+from src.models.denuncia import Denuncia, ContadorDenuncias, ResumoDiarioDenuncias, CategoriasDenuncia, SubcategoriasDenuncia
 from werkzeug.security import generate_password_hash
 from datetime import datetime
 
+app = create_app(rotas=False)
+
 def seed_data():
     """Inserir dados de teste no banco de dados"""
     with app.app_context():
@@ -107,6 +109,9 @@ def seed_data():
             denuncia = Denuncia(**den_data)
             db.session.add(denuncia)
         
+        db.session.flush()
+        ContadorDenuncias.reconstruir()
+        ResumoDiarioDenuncias.reconstruir()
         db.session.commit()
         print("Dados de teste inseridos com sucesso!")
 
@@ -0,0 +1,313 @@
+from flask import Response, request, send_file
+from sqlalchemy import func, select
+from src.database import db
+from src.models.usuario import Usuario
+from src.replica import usar_replica
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from threading import Lock
+import gzip
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Status das tarefas que ainda vão produzir resultado
+STATUS_EM_ANDAMENTO = ('pendente', 'executando')
+# Intervalo mínimo entre limpezas de resultados expirados (segundos)
+INTERVALO_LIMPEZA = 60
+# Tamanho dos blocos lidos do arquivo comprimido no download sem gzip
+TAMANHO_BLOCO_RESULTADO = 64 * 1024
+
+DDL_TAREFAS = [
+    """CREATE TABLE IF NOT EXISTS tarefas (
+        id TEXT PRIMARY KEY,
+        chave TEXT NOT NULL,
+        tipo TEXT NOT NULL,
+        usuario_id INTEGER NOT NULL,
+        escopo TEXT,
+        parametros TEXT NOT NULL,
+        status TEXT NOT NULL,
+        criado_em REAL NOT NULL,
+        iniciado_em REAL,
+        concluido_em REAL,
+        expira_em REAL,
+        arquivo TEXT,
+        mimetype TEXT,
+        tamanho INTEGER,
+        erro TEXT
+    )""",
+    # No máximo uma tarefa em andamento por especificação, entre todos os workers
+    """CREATE UNIQUE INDEX IF NOT EXISTS ix_tarefas_em_andamento
+        ON tarefas (chave) WHERE status IN ('pendente', 'executando')""",
+    "CREATE INDEX IF NOT EXISTS ix_tarefas_usuario ON tarefas (usuario_id, criado_em)",
+]
+# Criado depois da coluna escopo, ausente nos índices de tarefas antigos
+DDL_INDICE_ESCOPO = "CREATE INDEX IF NOT EXISTS ix_tarefas_escopo ON tarefas (escopo, criado_em)"
+
+def chave_tarefa(tipo, escopo, versao, parametros):
+    """Identidade da especificação: mesmo tipo, mesmo escopo de dados na mesma versão e mesmos parâmetros"""
+    return hashlib.sha1(
+        json.dumps([tipo, escopo, versao, parametros], sort_keys=True, default=str).encode('utf-8')
+    ).hexdigest()
+
+def data_iso(instante):
+    return datetime.utcfromtimestamp(instante).isoformat() if instante else None
+
+class Tarefas:
+    """Tarefas de relatório executadas em segundo plano, com resultados em disco
+
+    O índice das tarefas fica em um SQLite local (compartilhado pelos
+    workers do servidor) e os resultados em arquivos gzip na mesma pasta.
+    Cada worker executa as tarefas que recebeu em um pool de threads.
+    Uma especificação idêntica (mesmo escopo de dados e versão, de
+    qualquer usuário desse escopo) em andamento ou já concluída devolve a
+    mesma tarefa. Resultados expiram após RELATORIOS_TAREFAS_TTL, e
+    tarefas paradas há mais de RELATORIOS_TAREFAS_TIMEOUT (worker
+    reiniciado) são marcadas como falhas; a limpeza roda nas leituras e
+    nos envios, no máximo a cada INTERVALO_LIMPEZA.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.pasta = None
+        self.arquivo = None
+        self.tipos = {}
+        self.threads = 2
+        self.ttl = 86400
+        self.timeout = 1800
+        self._executor = None
+        self._pid = None
+        self._lock = Lock()
+        self._ultima_limpeza = 0
+
+    def registrar(self, tipo, funcao):
+        """funcao(usuario, parametros, saida) grava o resultado em saida (texto) e devolve (extensão, mimetype)"""
+        self.tipos[tipo] = funcao
+
+    def conectar(self):
+        conexao = sqlite3.connect(self.arquivo, timeout=30, isolation_level=None)
+        conexao.row_factory = sqlite3.Row
+        conexao.execute("PRAGMA journal_mode=WAL")
+        return conexao
+
+    def init_app(self, app):
+        """Preparar a pasta de resultados e o índice das tarefas"""
+        self.app = app
+        self.pasta = app.config['RELATORIOS_TAREFAS_DIR']
+        self.arquivo = os.path.join(self.pasta, 'tarefas.db')
+        self.threads = app.config.get('RELATORIOS_TAREFAS_THREADS', 2)
+        self.ttl = app.config.get('RELATORIOS_TAREFAS_TTL', 86400)
+        self.timeout = app.config.get('RELATORIOS_TAREFAS_TIMEOUT', 1800)
+        os.makedirs(self.pasta, exist_ok=True)
+
+        conexao = self.conectar()
+        try:
+            for ddl in DDL_TAREFAS:
+                conexao.execute(ddl)
+            # Índices de tarefas criados antes da coluna escopo
+            colunas = [coluna[1] for coluna in conexao.execute("PRAGMA table_info(tarefas)")]
+            if 'escopo' not in colunas:
+                try:
+                    conexao.execute("ALTER TABLE tarefas ADD COLUMN escopo TEXT")
+                except sqlite3.OperationalError as e:
+                    # Outro worker acrescentou a coluna ao mesmo tempo
+                    if 'duplicate column' not in str(e):
+                        raise
+            conexao.execute(DDL_INDICE_ESCOPO)
+        finally:
+            conexao.close()
+
+    def executor(self):
+        """Pool de threads deste processo (threads não sobrevivem ao fork)"""
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='tarefa-relatorio')
+                    self._pid = os.getpid()
+        return self._executor
+
+    def enviar(self, tipo, usuario_id, parametros, escopo, versao):
+        """Criar a tarefa ou devolver a idêntica em andamento ou concluída; retorna (tarefa, nova)
+
+        escopo identifica os dados visíveis ao usuário (texto) e versao é a
+        versão atual deles: com dados alterados, a especificação é outra.
+        """
+        self.limpar()
+        chave = chave_tarefa(tipo, escopo, versao, parametros)
+        tarefa_id = uuid.uuid4().hex
+
+        conexao = self.conectar()
+        try:
+            existente = self.buscar_existente(conexao, chave)
+            nova = False
+            if existente is None:
+                cursor = conexao.execute(
+                    """INSERT OR IGNORE INTO tarefas (id, chave, tipo, usuario_id, escopo, parametros, status, criado_em)
+                       VALUES (?, ?, ?, ?, ?, ?, 'pendente', ?)""",
+                    (tarefa_id, chave, tipo, usuario_id, escopo, json.dumps(parametros), time.time())
+                )
+                nova = cursor.rowcount == 1
+                if not nova:
+                    # Outro worker criou a mesma tarefa ao mesmo tempo
+                    existente = self.buscar_existente(conexao, chave)
+            if not nova:
+                tarefa_id = existente
+        finally:
+            conexao.close()
+
+        if nova:
+            self.executor().submit(self.executar, tarefa_id)
+        return self.obter(tarefa_id), nova
+
+    def buscar_existente(self, conexao, chave):
+        """Id da tarefa com a mesma chave em andamento ou concluída e ainda válida, ou None"""
+        linha = conexao.execute(
+            """SELECT id FROM tarefas
+               WHERE chave = ? AND (status IN ('pendente', 'executando') OR (status = 'concluida' AND expira_em > ?))
+               ORDER BY criado_em DESC LIMIT 1""",
+            (chave, time.time())
+        ).fetchone()
+        return linha['id'] if linha else None
+
+    def obter(self, tarefa_id):
+        self.limpar()
+        conexao = self.conectar()
+        try:
+            linha = conexao.execute("SELECT * FROM tarefas WHERE id = ?", (tarefa_id,)).fetchone()
+        finally:
+            conexao.close()
+        return dict(linha) if linha else None
+
+    def listar(self, usuario_id, escopo=None, limite=50):
+        """Tarefas do usuário e as compartilhadas no mesmo escopo, mais recentes primeiro"""
+        self.limpar()
+        conexao = self.conectar()
+        try:
+            linhas = conexao.execute(
+                """SELECT * FROM tarefas WHERE usuario_id = ?
+                   UNION SELECT * FROM tarefas WHERE escopo = ?
+                   ORDER BY criado_em DESC LIMIT ?""",
+                (usuario_id, escopo, limite)
+            ).fetchall()
+        finally:
+            conexao.close()
+        return [dict(linha) for linha in linhas]
+
+    def atualizar(self, tarefa_id, condicao='', **campos):
+        conexao = self.conectar()
+        try:
+            cursor = conexao.execute(
+                f"UPDATE tarefas SET {', '.join(f'{campo} = ?' for campo in campos)} WHERE id = ? {condicao}",
+                (*campos.values(), tarefa_id)
+            )
+        finally:
+            conexao.close()
+        return cursor.rowcount == 1
+
+    def executar(self, tarefa_id):
+        """Executar a tarefa em uma thread do pool, com contexto da aplicação próprio"""
+        if not self.atualizar(tarefa_id, "AND status = 'pendente'", status='executando', iniciado_em=time.time()):
+            return
+        tarefa = self.obter(tarefa_id)
+        temporario = os.path.join(self.pasta, f'{tarefa_id}.tmp')
+
+        with self.app.app_context():
+            try:
+                usuario = db.session.get(Usuario, tarefa['usuario_id'])
+                if not usuario or not usuario.ativo:
+                    raise PermissionError('Usuário inativo')
+
+                # Relatórios longos: leitura na réplica (se em dia) e timeout próprio no PostgreSQL
+                usar_replica()
+                if db.engine.dialect.name == 'postgresql':
+                    timeout = int(self.app.config.get('RELATORIOS_TAREFAS_STATEMENT_TIMEOUT', 0))
+                    db.session.execute(select(func.set_config('statement_timeout', str(timeout), True)))
+
+                with gzip.open(temporario, 'wt', encoding='utf-8') as saida:
+                    extensao, mimetype = self.tipos[tarefa['tipo']](usuario, json.loads(tarefa['parametros']), saida)
+
+                arquivo = f'{tarefa_id}.{extensao}.gz'
+                os.replace(temporario, os.path.join(self.pasta, arquivo))
+                agora = time.time()
+                self.atualizar(
+                    tarefa_id, status='concluida', concluido_em=agora, expira_em=agora + self.ttl,
+                    arquivo=arquivo, mimetype=mimetype, tamanho=os.path.getsize(os.path.join(self.pasta, arquivo))
+                )
+            except Exception as e:
+                logger.exception("Falha na tarefa de relatório %s", tarefa_id)
+                if os.path.exists(temporario):
+                    os.remove(temporario)
+                agora = time.time()
+                self.atualizar(
+                    tarefa_id, status='falhou', concluido_em=agora, expira_em=agora + self.ttl, erro=str(e)[:500]
+                )
+            finally:
+                db.session.remove()
+
+    def limpar(self, forcar=False):
+        """Remover resultados expirados e encerrar tarefas abandonadas"""
+        if not forcar and time.monotonic() - self._ultima_limpeza < INTERVALO_LIMPEZA:
+            return
+        self._ultima_limpeza = time.monotonic()
+        agora = time.time()
+
+        conexao = self.conectar()
+        try:
+            conexao.execute(
+                """UPDATE tarefas SET status = 'falhou', erro = 'Tarefa abandonada', concluido_em = ?, expira_em = ?
+                   WHERE status IN ('pendente', 'executando') AND criado_em < ?""",
+                (agora, agora + self.ttl, agora - self.timeout)
+            )
+            expiradas = conexao.execute(
+                "SELECT id, arquivo FROM tarefas WHERE expira_em < ?", (agora,)
+            ).fetchall()
+            for tarefa in expiradas:
+                if tarefa['arquivo']:
+                    try:
+                        os.remove(os.path.join(self.pasta, tarefa['arquivo']))
+                    except FileNotFoundError:
+                        pass
+            conexao.executemany("DELETE FROM tarefas WHERE id = ?", [(tarefa['id'],) for tarefa in expiradas])
+        finally:
+            conexao.close()
+
+    def descrever(self, tarefa):
+        """Representação pública da tarefa"""
+        return {
+            'id': tarefa['id'],
+            'tipo': tarefa['tipo'],
+            'status': tarefa['status'],
+            'parametros': json.loads(tarefa['parametros']),
+            'criado_em': data_iso(tarefa['criado_em']),
+            'iniciado_em': data_iso(tarefa['iniciado_em']),
+            'concluido_em': data_iso(tarefa['concluido_em']),
+            'expira_em': data_iso(tarefa['expira_em']),
+            'tamanho_comprimido': tarefa['tamanho'],
+            'erro': tarefa['erro'],
+        }
+
+    def responder_resultado(self, tarefa, nome_arquivo):
+        """Enviar o resultado: o próprio arquivo gzip se o cliente aceitar, senão descomprimido em blocos"""
+        caminho = os.path.join(self.pasta, tarefa['arquivo'])
+        cabecalhos = {'Content-Disposition': f'attachment; filename="{nome_arquivo}"', 'Vary': 'Accept-Encoding'}
+
+        if 'gzip' in request.accept_encodings:
+            resposta = send_file(caminho, mimetype=tarefa['mimetype'], etag=tarefa['id'], conditional=True)
+            resposta.headers['Content-Encoding'] = 'gzip'
+            resposta.headers.update(cabecalhos)
+            return resposta
+
+        def gerar():
+            with gzip.open(caminho, 'rb') as entrada:
+                while bloco := entrada.read(TAMANHO_BLOCO_RESULTADO):
+                    yield bloco
+
+        return Response(gerar(), mimetype=tarefa['mimetype'], headers=cabecalhos)
+
+tarefas_relatorio = Tarefas()
@@ -0,0 +1,403 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from src.main import create_app
+from src.database import db
+from src.models.usuario import Usuario
+from src.models.empresa import Empresa
+from src.models.denuncia import Denuncia, ResumoDiarioDenuncias
+from src.migracoes import aplicar_migracoes
+from sqlalchemy import create_engine, event
+import re
+import shutil
+import tempfile
+import time
+import unittest
+
+class TesteApi(unittest.TestCase):
+    """Aplicação com banco SQLite temporário, uma empresa e usuários de cada perfil"""
+
+    def setUp(self):
+        self.pasta = tempfile.mkdtemp()
+        self.app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(self.pasta, 'app.db')}",
+            'RELATORIOS_TAREFAS_DIR': os.path.join(self.pasta, 'relatorios'),
+            'FILA_DENUNCIAS_ATIVA': False,
+            'PROTOCOLO_CHAVE': 'teste',
+        })
+        with self.app.app_context():
+            db.create_all()
+            empresa = Empresa(nome='Empresa', cnpj='00000000000100')
+            db.session.add(empresa)
+            db.session.flush()
+            self.empresa_id = empresa.id
+            self.usuarios = {}
+            for perfil in ('super_admin', 'admin_cliente', 'cliente'):
+                # Hash fixo: os testes não fazem login por senha
+                usuario = Usuario(
+                    email=f'{perfil}@teste', nome=perfil, perfil=perfil, senha_hash='-',
+                    empresa_id=None if perfil == 'super_admin' else empresa.id
+                )
+                db.session.add(usuario)
+                db.session.flush()
+                self.usuarios[perfil] = usuario.id
+            db.session.commit()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            for engine in db.engines.values():
+                engine.dispose()
+        shutil.rmtree(self.pasta, ignore_errors=True)
+
+    def cliente(self, perfil):
+        """Cliente de teste com sessão autenticada no perfil informado"""
+        cliente = self.app.test_client()
+        with cliente.session_transaction() as sessao:
+            sessao['user_id'] = self.usuarios[perfil]
+        return cliente
+
+    def criar_denuncias(self, quantidade):
+        with self.app.app_context():
+            Denuncia.inserir_em_lote([
+                {
+                    'protocolo': f'TESTE{i:06d}',
+                    'titulo': f'Denúncia {i}',
+                    'descricao': 'Descrição',
+                    'categoria': 'Outros',
+                    'empresa_id': self.empresa_id,
+                }
+                for i in range(quantidade)
+            ])
+            db.session.commit()
+
+class TestePaginacaoDenuncias(TesteApi):
+
+    def setUp(self):
+        super().setUp()
+        self.criar_denuncias(5)
+        self.api = self.cliente('admin_cliente')
+
+    def test_per_page_zero_usa_minimo(self):
+        for modo in ('', '&paginacao=cursor'):
+            resposta = self.api.get(f'/api/denuncias?per_page=0{modo}')
+            self.assertEqual(resposta.status_code, 200)
+            self.assertEqual(resposta.get_json()['per_page'], 1)
+            self.assertEqual(len(resposta.get_json()['denuncias']), 1)
+
+    def test_per_page_negativo_usa_minimo(self):
+        resposta = self.api.get('/api/denuncias?per_page=-5')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.get_json()['per_page'], 1)
+        self.assertEqual(resposta.get_json()['pages'], 5)
+
+    def test_per_page_acima_do_limite(self):
+        resposta = self.api.get('/api/denuncias?per_page=1000&paginacao=cursor')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.get_json()['per_page'], 100)
+
+    def test_page_menor_que_um(self):
+        resposta = self.api.get('/api/denuncias?page=-3&per_page=2')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.get_json()['current_page'], 1)
+        self.assertEqual(len(resposta.get_json()['denuncias']), 2)
+
+    def test_valores_nao_inteiros(self):
+        for parametros in ('per_page=abc', 'page=1.5', 'per_page=abc&paginacao=cursor'):
+            resposta = self.api.get(f'/api/denuncias?{parametros}')
+            self.assertEqual(resposta.status_code, 400, parametros)
+            self.assertIn('error', resposta.get_json())
+
+    def test_metricas_empresa_limites(self):
+        api = self.cliente('super_admin')
+        resposta = api.get('/api/relatorios/metricas-empresa?page=0&per_page=-1')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.get_json()['current_page'], 1)
+        self.assertEqual(resposta.get_json()['per_page'], 1)
+        resposta = api.get('/api/relatorios/metricas-empresa?per_page=1000')
+        self.assertEqual(resposta.get_json()['per_page'], 100)
+        self.assertEqual(api.get('/api/relatorios/metricas-empresa?page=x').status_code, 400)
+
+class TesteResolucaoDenuncias(TesteApi):
+
+    def setUp(self):
+        super().setUp()
+        self.criar_denuncias(1)
+        with self.app.app_context():
+            self.denuncia_id = Denuncia.query.one().id
+        self.api = self.cliente('admin_cliente')
+
+    def alterar_status(self, status):
+        resposta = self.api.put(f'/api/denuncias/{self.denuncia_id}/status', json={'status': status})
+        self.assertEqual(resposta.status_code, 200)
+        return resposta.get_json()['denuncia']
+
+    def resumo(self):
+        """(status, total) das linhas não vazias e a soma de resolvidas e horas nos resumos"""
+        with self.app.app_context():
+            self.assertEqual(ResumoDiarioDenuncias.divergencias(), [])
+            resumos = ResumoDiarioDenuncias.query.all()
+            return (
+                sorted((resumo.status, resumo.total) for resumo in resumos if resumo.total),
+                sum(resumo.resolvidas for resumo in resumos),
+                sum(resumo.horas_resolucao for resumo in resumos)
+            )
+
+    def estatisticas(self):
+        resposta = self.api.get('/api/relatorios/detalhado')
+        self.assertEqual(resposta.status_code, 200)
+        return resposta.get_json()['estatisticas']
+
+    def test_concluir_registra_resolucao(self):
+        denuncia = self.alterar_status('concluida')
+        self.assertIsNotNone(denuncia['data_resolucao'])
+
+        linhas, resolvidas, horas = self.resumo()
+        self.assertEqual(linhas, [('concluida', 1)])
+        self.assertEqual(resolvidas, 1)
+        self.assertGreater(horas, 0)
+
+        estatisticas = self.estatisticas()
+        self.assertEqual(estatisticas['por_status'], {'concluida': 1})
+        self.assertIsNotNone(estatisticas['tempo_medio_resolucao_horas'])
+        self.assertAlmostEqual(estatisticas['tempo_medio_resolucao_horas'], horas)
+
+    def test_reabrir_remove_resolucao(self):
+        self.alterar_status('concluida')
+        denuncia = self.alterar_status('em_analise')
+        self.assertIsNone(denuncia['data_resolucao'])
+
+        linhas, resolvidas, horas = self.resumo()
+        self.assertEqual(linhas, [('em_analise', 1)])
+        self.assertEqual(resolvidas, 0)
+        self.assertAlmostEqual(horas, 0)
+
+        estatisticas = self.estatisticas()
+        self.assertEqual(estatisticas['por_status'], {'em_analise': 1})
+        self.assertIsNone(estatisticas['tempo_medio_resolucao_horas'])
+
+class TesteConsultaProtocolo(TesteApi):
+
+    def test_chave_obrigatoria(self):
+        with self.assertRaises(RuntimeError):
+            create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'PROTOCOLO_CHAVE': None})
+
+    def test_limite_por_ip(self):
+        self.criar_denuncias(1)
+        self.app.config.update({'PROTOCOLO_LIMITE_REQUISICOES': 2, 'PROTOCOLO_LIMITE_JANELA': 60})
+        cliente = self.app.test_client()
+        ip = {'REMOTE_ADDR': '203.0.113.7'}
+        for _ in range(2):
+            self.assertEqual(cliente.get('/api/protocolo/TESTE000000', environ_base=ip).status_code, 200)
+        resposta = cliente.get('/api/protocolo/TESTE000000', environ_base=ip)
+        self.assertEqual(resposta.status_code, 429)
+        self.assertGreater(int(resposta.headers['Retry-After']), 0)
+        # Outro IP não é afetado
+        resposta = cliente.get('/api/protocolo/TESTE000000', environ_base={'REMOTE_ADDR': '203.0.113.8'})
+        self.assertEqual(resposta.status_code, 200)
+
+class TesteResumosDiarios(TesteApi):
+
+    def linhas(self):
+        return sorted(
+            tuple(getattr(resumo, campo) for campo in ResumoDiarioDenuncias.DIMENSOES + ResumoDiarioDenuncias.METRICAS)
+            for resumo in ResumoDiarioDenuncias.query.all() if resumo.total
+        )
+
+    def test_nulos_normalizados_como_no_reconstruir(self):
+        with self.app.app_context():
+            # Colunas vazias na inserção em lote recebem o default do modelo
+            Denuncia.inserir_em_lote([{
+                'protocolo': 'NULOS1', 'titulo': 'Nulos', 'descricao': 'Descrição', 'categoria': 'Outros',
+                'empresa_id': self.empresa_id, 'subcategoria': None, 'status': None, 'prioridade': None, 'origem': None,
+            }])
+            # Colunas gravadas como nulas
+            denuncia = Denuncia.query.filter_by(protocolo='NULOS1').one()
+            ResumoDiarioDenuncias.ajustar([denuncia], -1)
+            denuncia.prioridade = None
+            denuncia.origem = None
+            db.session.flush()
+            ResumoDiarioDenuncias.ajustar([denuncia])
+            db.session.commit()
+
+            self.assertEqual(ResumoDiarioDenuncias.divergencias(), [])
+            incrementais = self.linhas()
+            self.assertEqual([linha[2:7] for linha in incrementais], [('Outros', '', 'recebida', '', '')])
+            ResumoDiarioDenuncias.reconstruir()
+            db.session.commit()
+            self.assertEqual(self.linhas(), incrementais)
+
+class TesteTarefasRelatorio(TesteApi):
+
+    def setUp(self):
+        super().setUp()
+        self.criar_denuncias(3)
+        # Segundo admin da mesma empresa
+        with self.app.app_context():
+            colega = Usuario(
+                email='colega@teste', nome='colega', perfil='admin_cliente', senha_hash='-', empresa_id=self.empresa_id
+            )
+            db.session.add(colega)
+            db.session.commit()
+            self.usuarios['colega'] = colega.id
+
+    def enviar(self, perfil):
+        resposta = self.cliente(perfil).post('/api/relatorios/tarefas', json={'tipo': 'detalhado'})
+        self.assertEqual(resposta.status_code, 202, resposta.get_json())
+        return resposta.get_json()
+
+    def aguardar(self, perfil, tarefa_id):
+        for _ in range(100):
+            tarefa = self.cliente(perfil).get(f'/api/relatorios/tarefas/{tarefa_id}').get_json()
+            if tarefa['status'] not in ('pendente', 'executando'):
+                return tarefa
+            time.sleep(0.05)
+        self.fail('tarefa não terminou')
+
+    def test_mesmo_escopo_e_versao_compartilham_a_tarefa(self):
+        primeira = self.enviar('admin_cliente')
+        self.assertTrue(primeira['nova'])
+        self.assertEqual(self.aguardar('admin_cliente', primeira['id'])['status'], 'concluida')
+
+        # Colega do mesmo escopo recebe a tarefa concluída, e pode consultá-la e listá-la
+        segunda = self.enviar('colega')
+        self.assertFalse(segunda['nova'])
+        self.assertEqual(segunda['id'], primeira['id'])
+        self.assertEqual(self.cliente('colega').get(f"/api/relatorios/tarefas/{primeira['id']}").status_code, 200)
+        listadas = self.cliente('colega').get('/api/relatorios/tarefas').get_json()['tarefas']
+        self.assertEqual([tarefa['id'] for tarefa in listadas], [primeira['id']])
+
+        # Outro escopo (cliente) não compartilha nem vê a tarefa
+        self.assertNotEqual(self.enviar('cliente')['id'], primeira['id'])
+        self.assertEqual(self.cliente('cliente').get(f"/api/relatorios/tarefas/{primeira['id']}").status_code, 404)
+
+    def test_nova_versao_dos_dados_gera_nova_tarefa(self):
+        primeira = self.enviar('admin_cliente')
+        self.aguardar('admin_cliente', primeira['id'])
+        resposta = self.cliente('admin_cliente').post('/api/denuncias', json={
+            'titulo': 'Nova', 'descricao': 'Descrição', 'categoria': 'Outros'
+        })
+        self.assertEqual(resposta.status_code, 201, resposta.get_json())
+        self.assertTrue(self.enviar('colega')['nova'])
+
+class TesteMigracoes(TesteApi):
+
+    def esquema(self, engine):
+        """DDL de tabelas e índices (sem o índice de busca textual), com espaços normalizados"""
+        with engine.connect() as conexao:
+            return {
+                nome: ' '.join(sql.split())
+                for nome, sql in conexao.exec_driver_sql(
+                    "SELECT name, sql FROM sqlite_master WHERE sql IS NOT NULL "
+                    "AND name NOT LIKE 'denuncias_fts%' AND name != 'versao_esquema'"
+                )
+            }
+
+    def test_migracoes_geram_o_esquema_dos_modelos(self):
+        engine = create_engine(f"sqlite:///{os.path.join(self.pasta, 'migrado.db')}")
+        try:
+            aplicar_migracoes(engine)
+            migrado = self.esquema(engine)
+        finally:
+            engine.dispose()
+        with self.app.app_context():
+            self.assertEqual(migrado, self.esquema(db.engine))
+
+class TestePlanosConsultas(TesteApi):
+    """Planos (EXPLAIN QUERY PLAN) das consultas que as rotas realmente executam
+
+    Os comandos são capturados do engine durante a requisição, com os
+    mesmos parâmetros, e cada cenário indica o índice esperado na tabela
+    principal da consulta.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.criar_denuncias(30)
+
+    def comandos_da_rota(self, perfil, url):
+        """SELECTs executados pela rota: [(sql, parâmetros)]"""
+        comandos = []
+        with self.app.app_context():
+            engine = db.engine
+
+        def capturar(conexao, cursor, sql, parametros, contexto, executemany):
+            if sql.lstrip().upper().startswith('SELECT'):
+                comandos.append((sql, parametros))
+
+        event.listen(engine, 'before_cursor_execute', capturar)
+        try:
+            resposta = self.cliente(perfil).get(url)
+        finally:
+            event.remove(engine, 'before_cursor_execute', capturar)
+        self.assertEqual(resposta.status_code, 200, resposta.get_json())
+        return comandos
+
+    def plano(self, sql, parametros):
+        with self.app.app_context():
+            with db.engine.connect() as conexao:
+                return [linha[-1] for linha in conexao.exec_driver_sql(f'EXPLAIN QUERY PLAN {sql}', parametros)]
+
+    def verificar(self, perfil, url, *esperados):
+        """Cada (tabela, índice, trecho do SQL) esperado: as consultas da rota na tabela que contêm
+        o trecho usam o índice, sem varredura nem ordenação temporária"""
+        executados = self.comandos_da_rota(perfil, url)
+        for tabela, indice, trecho_sql in esperados:
+            comandos = [
+                (sql, parametros) for sql, parametros in executados
+                if re.search(rf'\bFROM {tabela}\b', sql) and trecho_sql in sql
+            ]
+            self.assertTrue(comandos, f'{url}: nenhuma consulta em {tabela}')
+            for sql, parametros in comandos:
+                plano = self.plano(sql, parametros)
+                detalhes = '\n'.join(plano)
+                self.assertTrue(
+                    any(re.match(rf'SEARCH {tabela} USING (COVERING )?INDEX {indice}\b', linha) for linha in plano),
+                    f'{url}: {indice} não usado\n{sql}\n{detalhes}'
+                )
+                self.assertFalse(
+                    any(linha.startswith(f'SCAN {tabela}') for linha in plano), f'{url}: varredura\n{detalhes}'
+                )
+                self.assertNotIn('USE TEMP B-TREE FOR ORDER BY', detalhes, f'{url}: ordenação temporária')
+
+    def test_listagem_empresa(self):
+        self.verificar('admin_cliente', '/api/denuncias', ('denuncias', 'ix_denuncias_empresa_data', 'LIMIT'))
+
+    def test_listagem_empresa_por_status(self):
+        self.verificar(
+            'admin_cliente', '/api/denuncias?status=recebida',
+            ('denuncias', 'ix_denuncias_empresa_status_data', 'LIMIT')
+        )
+
+    def test_listagem_cursor(self):
+        primeira = self.cliente('admin_cliente').get('/api/denuncias?paginacao=cursor&per_page=5').get_json()
+        self.verificar(
+            'admin_cliente', f"/api/denuncias?cursor={primeira['next_cursor']}&per_page=5",
+            ('denuncias', 'ix_denuncias_empresa_data', 'LIMIT')
+        )
+
+    def test_listagem_cliente(self):
+        self.verificar('cliente', '/api/denuncias', ('denuncias', 'ix_denuncias_usuario_data', 'LIMIT'))
+
+    def test_estatisticas_por_contadores(self):
+        self.verificar(
+            'admin_cliente', '/api/denuncias/estatisticas',
+            ('contadores_denuncias', 'sqlite_autoindex_contadores_denuncias_1', '')
+        )
+
+    def test_detalhado_por_resumos_diarios(self):
+        url = '/api/relatorios/detalhado?data_inicio=2024-01-01T10:00:00&data_fim=2024-12-31T12:00:00'
+        self.verificar(
+            'admin_cliente', url,
+            ('resumos_diarios_denuncias', 'ix_resumos_diarios_empresa_dia', ''),
+            # Dias de borda lidos das denúncias
+            ('denuncias', 'ix_denuncias_empresa_data', 'GROUP BY')
+        )
+
+    def test_consulta_por_protocolo(self):
+        self.verificar('super_admin', '/api/protocolo/TESTE000001', ('denuncias', 'sqlite_autoindex_denuncias_1', ''))
+
+if __name__ == '__main__':
+    unittest.main()
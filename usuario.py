@@ -1,5 +1,5 @@
 from src.database import db
-from werkzeug.security import generate_password_hash, check_password_hash
+from src.senhas import pool_senhas
 from datetime import datetime
 
 class Usuario(db.Model):
@@ -17,12 +17,16 @@ class Usuario(db.Model):
     ultimo_login = db.Column(db.DateTime)
     
     def set_senha(self, senha):
-        """Define a senha do usuário (hash)"""
-        self.senha_hash = generate_password_hash(senha)
+        """Define a senha do usuário (hash, calculado no pool de senhas)"""
+        self.senha_hash = pool_senhas.gerar_hash(senha)
     
     def check_senha(self, senha):
-        """Verifica se a senha está correta"""
-        return check_password_hash(self.senha_hash, senha)
+        """Verifica se a senha está correta (no pool de senhas)"""
+        return pool_senhas.verificar(self.senha_hash, senha)
+    
+    def senha_precisa_rehash(self):
+        """Indica se o hash usa parâmetros diferentes dos configurados"""
+        return pool_senhas.precisa_rehash(self.senha_hash)
     
     def can_view_denuncia(self, denuncia):
         """Verificar se o usuário pode visualizar uma denúncia específica"""
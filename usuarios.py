@@ -1,23 +1,15 @@
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, request, jsonify
 from src.database import db
+from src.sessao import require_auth, get_current_user, invalidar_usuario
+from src.senhas import PoolSenhasSaturado
+from src.projecao import campos_solicitados, colunas, serializar
 from src.models.usuario import Usuario
 from src.models.empresa import Empresa
 from datetime import datetime
+from sqlalchemy import select
 
 usuarios_bp = Blueprint('usuarios', __name__)
 
-def require_auth():
-    """Decorator para verificar autenticação"""
-    if 'user_id' not in session:
-        return jsonify({'error': 'Usuário não autenticado'}), 401
-    return None
-
-def get_current_user():
-    """Obter usuário atual da sessão"""
-    if 'user_id' not in session:
-        return None
-    return Usuario.query.get(session['user_id'])
-
 @usuarios_bp.route('/usuarios', methods=['GET'])
 def listar_usuarios():
     """Listar usuários baseado no perfil do usuário logado"""
@@ -30,17 +22,26 @@ def listar_usuarios():
         if not usuario_atual:
             return jsonify({'error': 'Usuário não encontrado'}), 404
         
+        # Campos devolvidos (?fields=), lidos como linhas simples sem instanciar o modelo
+        try:
+            campos = campos_solicitados(Usuario, request.args.get('fields'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        query = select(*colunas(Usuario, campos))
+        
         # Super Admin pode ver todos os usuários
         if usuario_atual.perfil == 'super_admin':
-            usuarios = Usuario.query.all()
+            pass
         # Admin do Cliente pode ver usuários de sua empresa
         elif usuario_atual.perfil == 'admin_cliente':
-            usuarios = Usuario.query.filter_by(empresa_id=usuario_atual.empresa_id).all()
+            query = query.where(Usuario.empresa_id == usuario_atual.empresa_id)
         else:
             return jsonify({'error': 'Acesso negado'}), 403
         
+        usuarios = db.session.execute(query).all()
+        
         return jsonify({
-            'usuarios': [usuario.to_dict() for usuario in usuarios]
+            'usuarios': [serializar(usuario, campos) for usuario in usuarios]
         }), 200
         
     except Exception as e:
@@ -110,6 +111,9 @@ def criar_usuario():
             'usuario': novo_usuario.to_dict()
         }), 201
         
+    except PoolSenhasSaturado:
+        db.session.rollback()
+        return jsonify({'error': 'Serviço de senhas ocupado, tente novamente'}), 503
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': f'Erro interno: {str(e)}'}), 500
@@ -170,12 +174,16 @@ def atualizar_usuario(usuario_id):
         
         usuario.data_atualizacao = datetime.utcnow()
         db.session.commit()
+        invalidar_usuario(usuario.id)
         
         return jsonify({
             'message': 'Usuário atualizado com sucesso',
             'usuario': usuario.to_dict()
         }), 200
         
+    except PoolSenhasSaturado:
+        db.session.rollback()
+        return jsonify({'error': 'Serviço de senhas ocupado, tente novamente'}), 503
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': f'Erro interno: {str(e)}'}), 500
@@ -217,6 +225,7 @@ def deletar_usuario(usuario_id):
         usuario.ativo = False
         usuario.data_atualizacao = datetime.utcnow()
         db.session.commit()
+        invalidar_usuario(usuario.id)
         
         return jsonify({
             'message': 'Usuário desativado com sucesso'
@@ -0,0 +1,36 @@
+from src.database import db, insert_com_conflito
+
+# Prefixo das versões por empresa dos dados de denúncias (dashboard, relatórios)
+PREFIXO_VERSAO_DENUNCIAS = 'denuncias:'
+
+def chave_denuncias_empresa(empresa_id):
+    """Chave da versão das denúncias de uma empresa"""
+    return f'{PREFIXO_VERSAO_DENUNCIAS}{empresa_id}'
+
+class VersaoDados(db.Model):
+    """Contador de versão de um conjunto de dados, incrementado a cada escrita"""
+    __tablename__ = 'versoes_dados'
+    
+    chave = db.Column(db.String(100), primary_key=True)  # ex.: categorias
+    versao = db.Column(db.Integer, nullable=False, default=0)
+    
+    @classmethod
+    def incrementar(cls, chave):
+        """Incrementar a versão (upsert), na transação da sessão atual"""
+        insert = insert_com_conflito()
+        stmt = insert(cls).values(chave=chave, versao=1)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['chave'],
+            set_={'versao': cls.versao + 1}
+        )
+        db.session.execute(stmt)
+    
+    @classmethod
+    def obter(cls, chave):
+        """Versão atual da chave (0 se nunca foi alterada)"""
+        return db.session.query(cls.versao).filter(cls.chave == chave).scalar() or 0
+    
+    @classmethod
+    def somar(cls, prefixo):
+        """Soma das versões das chaves com o prefixo (cresce a cada incremento de qualquer uma)"""
+        return db.session.query(db.func.sum(cls.versao)).filter(cls.chave.startswith(prefixo)).scalar() or 0